@@ -0,0 +1,800 @@
+import json
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+import calendar
+
+USER_STATS_COLUMNS = ('total_trades', 'winning_trades', 'losing_trades', 'breakeven_trades',
+                      'total_pnl', 'win_pnl', 'loss_pnl')
+
+# Fresh per-user aggregate straight from the trades table (used to rebuild
+# and verify user_stats, which the trades triggers normally keep up to date)
+AGGREGATE_USER_STATS_SQL = '''
+    SELECT user_id,
+           COUNT(*) AS total_trades,
+           SUM(account_pnl > 0) AS winning_trades,
+           SUM(account_pnl < 0) AS losing_trades,
+           SUM(account_pnl = 0) AS breakeven_trades,
+           TOTAL(account_pnl) AS total_pnl,
+           TOTAL(MAX(account_pnl, 0)) AS win_pnl,
+           TOTAL(MIN(account_pnl, 0)) AS loss_pnl
+    FROM trades
+    GROUP BY user_id
+'''
+
+# Tolerance when comparing incrementally maintained P&L sums with a fresh sum
+PNL_TOLERANCE = 1e-6
+
+
+def load_user_stats(conn, user_id):
+    return conn.execute('SELECT * FROM user_stats WHERE user_id = ?', (user_id,)).fetchone()
+
+
+# Dashboard summary derived from a user_stats row (None means no trades yet)
+def summary_stats(row):
+    total_trades = row['total_trades'] if row else 0
+    winning_trades = row['winning_trades'] if row else 0
+    losing_trades = row['losing_trades'] if row else 0
+    breakeven_trades = row['breakeven_trades'] if row else 0
+    total_pnl = row['total_pnl'] if row else 0
+
+    # Calculate rates
+    win_rate = (winning_trades / total_trades * 100) if total_trades > 0 else 0
+    be_rate = (breakeven_trades / total_trades * 100) if total_trades > 0 else 0
+    loss_rate = (losing_trades / total_trades * 100) if total_trades > 0 else 0
+
+    # Calculate P&L metrics
+    avg_win = row['win_pnl'] / winning_trades if winning_trades > 0 else 0
+    avg_loss = row['loss_pnl'] / losing_trades if losing_trades > 0 else 0
+
+    # Calculate Risk-Reward Ratio (Average Win : Average Loss)
+    if avg_loss != 0:
+        risk_reward_ratio = abs(avg_win / avg_loss)  # Use absolute value since avg_loss is negative
+    else:
+        risk_reward_ratio = avg_win if avg_win > 0 else 0
+
+    return {
+        'total_trades': total_trades,
+        'winning_trades': winning_trades,
+        'losing_trades': losing_trades,
+        'breakeven_trades': breakeven_trades,
+        'win_rate': round(win_rate, 1),
+        'be_rate': round(be_rate, 1),
+        'loss_rate': round(loss_rate, 1),
+        'total_pnl': round(total_pnl, 2),
+        'avg_win': round(avg_win, 2),
+        'avg_loss': round(avg_loss, 2),
+        'risk_reward_ratio': round(risk_reward_ratio, 2)
+    }
+
+
+# Compare user_stats with a fresh aggregate; returns (user_id, column, stored, actual)
+def user_stats_drift(conn):
+    actual = {row['user_id']: row for row in conn.execute(AGGREGATE_USER_STATS_SQL)}
+    stored = {row['user_id']: row for row in conn.execute('SELECT * FROM user_stats')}
+
+    drift = []
+    for user_id in sorted(set(actual) | set(stored)):
+        for column in USER_STATS_COLUMNS:
+            expected = actual[user_id][column] if user_id in actual else 0
+            current = stored[user_id][column] if user_id in stored else 0
+            if abs(expected - current) > PNL_TOLERANCE:
+                drift.append((user_id, column, current, expected))
+    return drift
+
+
+# Recompute user_stats from scratch in one transaction
+def rebuild_user_stats(conn):
+    with conn:
+        conn.execute('DELETE FROM user_stats')
+        seed_user_stats(conn)
+
+
+# Fill an empty user_stats from trades inside the caller's transaction
+def seed_user_stats(conn):
+    conn.execute(f'''
+        INSERT INTO user_stats (user_id, {', '.join(USER_STATS_COLUMNS)})
+        SELECT user_id, {', '.join(USER_STATS_COLUMNS)}
+        FROM ({AGGREGATE_USER_STATS_SQL})
+    ''')
+
+
+# Daily P&L rollup.  daily_pnl holds one row per user and trading day and is
+# kept current by triggers on trades, so the calendar, the heatmap and the
+# monthly breakdown read a few hundred rows instead of aggregating trades.
+DAILY_PNL_COLUMNS = ('total_pnl', 'trade_count', 'winning_trades', 'losing_trades')
+
+AGGREGATE_DAILY_PNL_SQL = '''
+    SELECT user_id, date,
+           TOTAL(account_pnl) AS total_pnl,
+           COUNT(*) AS trade_count,
+           SUM(account_pnl > 0) AS winning_trades,
+           SUM(account_pnl < 0) AS losing_trades
+    FROM trades
+    GROUP BY user_id, date
+'''
+
+
+# Compare daily_pnl with a fresh aggregate; returns (user_id, date, column, stored, actual)
+def daily_pnl_drift(conn):
+    actual = {(row['user_id'], row['date']): row for row in conn.execute(AGGREGATE_DAILY_PNL_SQL)}
+    stored = {(row['user_id'], row['date']): row for row in conn.execute('SELECT * FROM daily_pnl')}
+
+    drift = []
+    for key in sorted(set(actual) | set(stored)):
+        for column in DAILY_PNL_COLUMNS:
+            expected = actual[key][column] if key in actual else 0
+            current = stored[key][column] if key in stored else 0
+            if abs(expected - current) > PNL_TOLERANCE:
+                drift.append(key + (column, current, expected))
+    return drift
+
+
+def rebuild_daily_pnl(conn):
+    with conn:
+        conn.execute('DELETE FROM daily_pnl')
+        seed_daily_pnl(conn)
+
+
+def seed_daily_pnl(conn):
+    conn.execute(f'''
+        INSERT INTO daily_pnl (user_id, date, {', '.join(DAILY_PNL_COLUMNS)})
+        SELECT user_id, date, {', '.join(DAILY_PNL_COLUMNS)}
+        FROM ({AGGREGATE_DAILY_PNL_SQL})
+    ''')
+
+
+# Rollup rows for start <= date < end, oldest first
+def load_daily_pnl(conn, user_id, start, end):
+    return conn.execute('''
+        SELECT date, total_pnl, trade_count, winning_trades, losing_trades
+        FROM daily_pnl
+        WHERE user_id = ? AND date >= ? AND date < ?
+        ORDER BY date
+    ''', (user_id, start, end)).fetchall()
+
+
+# Monthly performance, newest month first, summed from the daily rollup
+def monthly_performance(conn, user_id):
+    rows = conn.execute('''
+        SELECT substr(date, 1, 7) AS month,
+               SUM(trade_count) AS total_trades,
+               SUM(winning_trades) AS winning_trades,
+               TOTAL(total_pnl) AS total_pnl
+        FROM daily_pnl
+        WHERE user_id = ?
+        GROUP BY month
+        ORDER BY month DESC
+    ''', (user_id,))
+
+    monthly = {}
+    for row in rows:
+        count = row['total_trades']
+        if not count:
+            continue
+        year, month = int(row['month'][:4]), int(row['month'][5:7])
+        monthly[row['month']] = {
+            'month_name': f"{calendar.month_name[month]} {year}",
+            'total_trades': count,
+            'win_rate': round((row['winning_trades'] / count) * 100, 1),
+            'total_pnl': round(row['total_pnl'], 2),
+            'avg_trade': round(row['total_pnl'] / count, 2)
+        }
+    return monthly
+
+
+# Heatmap intensity: 0 for no trades, otherwise 1-4 scaled against the
+# largest absolute daily P&L in range, signed by the day's result
+HEATMAP_LEVELS = 4
+# Longest ?start=&end= range the heatmap draws, a leap year's worth of days
+HEATMAP_MAX_DAYS = 366
+
+
+# Week columns (Monday first) covering [start, end) for the year heatmap, plus totals
+def heatmap_grid(rows, start, end):
+    days = {row['date']: row for row in rows}
+    scale = max((abs(row['total_pnl']) for row in rows), default=0)
+
+    first = start - timedelta(days=start.weekday())
+    weeks = []
+    day = first
+    while day < end:
+        week = {'month_label': None, 'days': []}
+        for _ in range(7):
+            if start <= day < end:
+                key = day.isoformat()
+                row = days.get(key)
+                level = 0
+                if row and row['trade_count']:
+                    level = max(1, round(abs(row['total_pnl']) / scale * HEATMAP_LEVELS)) if scale else 1
+                    if row['total_pnl'] < 0:
+                        level = -level
+                week['days'].append({
+                    'date': key,
+                    'pnl': round(row['total_pnl'], 2) if row else 0,
+                    'count': row['trade_count'] if row else 0,
+                    'level': level,
+                })
+                if day.day == 1 or (day == start and not weeks):
+                    week['month_label'] = calendar.month_abbr[day.month]
+            else:
+                week['days'].append(None)
+            day += timedelta(days=1)
+        weeks.append(week)
+
+    traded = [row for row in rows if row['trade_count']]
+    best = max(traded, key=lambda row: row['total_pnl'], default=None)
+    worst = min(traded, key=lambda row: row['total_pnl'], default=None)
+    summary = {
+        'total_pnl': round(sum(row['total_pnl'] for row in traded), 2),
+        'trade_count': sum(row['trade_count'] for row in traded),
+        'trading_days': len(traded),
+        'green_days': sum(1 for row in traded if row['total_pnl'] > 0),
+        'red_days': sum(1 for row in traded if row['total_pnl'] < 0),
+        'best_day': {'date': best['date'], 'pnl': round(best['total_pnl'], 2)} if best else None,
+        'worst_day': {'date': worst['date'], 'pnl': round(worst['total_pnl'], 2)} if worst else None,
+    }
+    return weeks, summary
+
+
+# Equity curve trade by trade, in the order the trades were taken (date,
+# then created_at, then id).  equity[k] is the cumulative P&L after the
+# first k trades (equity[0] = 0), with matching prefix sums of wins, losses
+# and distinct trading days, so totals for any date window are two bisects
+# and a subtraction.  Max drawdown isn't decomposable that way, so a segment
+# tree over equity stores (max, min, max drawdown) per node and answers a
+# window in O(log n) as well.  Going per trade rather than per day keeps
+# intraday drawdowns, which a daily rollup nets away.
+EQUITY_CHART_POINTS = 500
+
+
+class EquitySeries:
+    def __init__(self, rows):
+        self.dates = []
+        self.equity = array('d', [0.0])
+        self.wins = array('l', [0])
+        self.losses = array('l', [0])
+        self.days = array('l', [0])
+        for day, pnl in rows:
+            self.days.append(self.days[-1] + (not self.dates or self.dates[-1] != day))
+            self.dates.append(day)
+            self.equity.append(self.equity[-1] + pnl)
+            self.wins.append(self.wins[-1] + (pnl > 0))
+            self.losses.append(self.losses[-1] + (pnl < 0))
+        self._build_tree()
+
+    def __len__(self):
+        return len(self.dates)
+
+    def _build_tree(self):
+        size = 1
+        while size < len(self.equity):
+            size *= 2
+        self.size = size
+        self.tree_max = [float('-inf')] * (2 * size)
+        self.tree_min = [float('inf')] * (2 * size)
+        self.tree_dd = [0.0] * (2 * size)
+        for i, value in enumerate(self.equity):
+            self.tree_max[size + i] = self.tree_min[size + i] = value
+        for node in range(size - 1, 0, -1):
+            left, right = 2 * node, 2 * node + 1
+            self.tree_max[node] = max(self.tree_max[left], self.tree_max[right])
+            self.tree_min[node] = min(self.tree_min[left], self.tree_min[right])
+            self.tree_dd[node] = max(self.tree_dd[left], self.tree_dd[right],
+                                     self.tree_max[left] - self.tree_min[right])
+
+    # Largest peak-to-trough fall of equity[lo..hi] (inclusive), peak first
+    def max_drawdown(self, lo, hi):
+        # Left and right partial results are combined in order, since a
+        # drawdown needs its peak before its trough
+        left = (float('-inf'), float('inf'), 0.0)
+        right = (float('-inf'), float('inf'), 0.0)
+        lo += self.size
+        hi += self.size + 1
+        while lo < hi:
+            if lo & 1:
+                left = combine_drawdown(left, (self.tree_max[lo], self.tree_min[lo], self.tree_dd[lo]))
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                right = combine_drawdown((self.tree_max[hi], self.tree_min[hi], self.tree_dd[hi]), right)
+            lo //= 2
+            hi //= 2
+        return combine_drawdown(left, right)[2]
+
+    # Equity index range covering trades dated start <= date <= end (ISO strings, either may be None)
+    def bounds(self, start=None, end=None):
+        lo = bisect_left(self.dates, start) if start else 0
+        hi = bisect_right(self.dates, end) if end else len(self.dates)
+        return lo, max(lo, hi)
+
+    def window(self, start=None, end=None):
+        lo, hi = self.bounds(start, end)
+        trades = hi - lo
+        wins = self.wins[hi] - self.wins[lo]
+        return {
+            'trading_days': self.days[hi] - self.days[lo],
+            'total_trades': trades,
+            'winning_trades': wins,
+            'losing_trades': self.losses[hi] - self.losses[lo],
+            'win_rate': round(wins / trades * 100, 1) if trades else 0,
+            'total_pnl': round(self.equity[hi] - self.equity[lo], 2),
+            'max_drawdown': round(self.max_drawdown(lo, hi), 2),
+            'first_day': self.dates[lo] if hi > lo else None,
+            'last_day': self.dates[hi - 1] if hi > lo else None,
+        }
+
+    # (date, equity, drawdown) after each trade in the window, equity relative
+    # to the start of the window; long windows are thinned to about `limit` points
+    def curve(self, start=None, end=None, limit=EQUITY_CHART_POINTS):
+        lo, hi = self.bounds(start, end)
+        step = max(1, -(-(hi - lo) // limit))
+        base = self.equity[lo]
+        peak = 0.0
+        points = []
+        for k in range(lo + 1, hi + 1):
+            value = self.equity[k] - base
+            peak = max(peak, value)
+            if (k - lo) % step == 0 or k == hi:
+                points.append((self.dates[k - 1], round(value, 2), round(peak - value, 2)))
+        return points
+
+
+def combine_drawdown(left, right):
+    return (max(left[0], right[0]), min(left[1], right[1]),
+            max(left[2], right[2], left[0] - right[1]))
+
+
+# Read straight off idx_trades_user_date, which already holds the rows in
+# (date, created_at, id) order
+def load_equity_series(conn, user_id):
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute('''
+        SELECT date, account_pnl
+        FROM trades
+        WHERE user_id = ?
+        ORDER BY date, created_at, id
+    ''', (user_id,))
+    return EquitySeries(cursor)
+
+
+# SVG coordinates for the equity line and the drawdown area under zero
+def equity_chart(points, width=800, height=240, padding=10):
+    if not points:
+        return None
+    values = [value for _, value, _ in points] + [0.0]
+    drawdowns = [-drawdown for _, _, drawdown in points]
+    top = max(values)
+    bottom = min(values + drawdowns)
+    span = (top - bottom) or 1.0
+    x_step = (width - 2 * padding) / max(len(points) - 1, 1)
+
+    def x(i):
+        return round(padding + i * x_step, 1)
+
+    def y(value):
+        return round(padding + (top - value) / span * (height - 2 * padding), 1)
+
+    equity_line = ' '.join(f'{x(i)},{y(value)}' for i, (_, value, _) in enumerate(points))
+    drawdown_area = ' '.join([f'{x(0)},{y(0)}']
+                             + [f'{x(i)},{y(-drawdown)}' for i, (_, _, drawdown) in enumerate(points)]
+                             + [f'{x(len(points) - 1)},{y(0)}'])
+    return {
+        'width': width,
+        'height': height,
+        'equity': equity_line,
+        'drawdown': drawdown_area,
+        'zero': y(0),
+        'top': round(top, 2),
+        'bottom': round(bottom, 2),
+        'first_day': points[0][0],
+        'last_day': points[-1][0],
+    }
+
+
+# Columnar trade engine for advanced stats.  A user's trades are loaded once
+# into flat arrays (P&L as doubles, dates as proleptic ordinals, categorical
+# columns as integer codes into small lookup lists) and every breakdown is
+# accumulated from those arrays, instead of re-filtering lists of rows.  The
+# accumulation is one plain-Python pass rather than numpy: it is a fraction
+# of the load's cost and the result is cached per data version.
+
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+
+class TradeColumns:
+    def __init__(self):
+        self.pnl = array('d')
+        self.day = array('l')        # date.toordinal()
+        self.reason = array('l')     # index into self.reasons
+        self.ticker = array('l')     # index into self.tickers
+        self.direction = array('l')  # index into self.directions
+        self.reasons = []
+        self.tickers = []
+        self.directions = []
+
+    def __len__(self):
+        return len(self.pnl)
+
+
+# Trades come back in dashboard order, newest first by (date, created_at, id)
+def load_trade_columns(conn, user_id):
+    columns = TradeColumns()
+    reason_codes, ticker_codes, direction_codes = {}, {}, {}
+    parsed_dates = {}
+
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute('''
+        SELECT account_pnl, date, close_reason, ticker, direction
+        FROM trades
+        WHERE user_id = ?
+        ORDER BY date DESC, created_at DESC, id DESC
+    ''', (user_id,))
+
+    for pnl, day, reason, ticker, direction in cursor:
+        ordinal = parsed_dates.get(day)
+        if ordinal is None:
+            ordinal = parsed_dates[day] = datetime.strptime(day, '%Y-%m-%d').toordinal()
+
+        columns.pnl.append(pnl)
+        columns.day.append(ordinal)
+        columns.reason.append(reason_codes.setdefault(reason, len(reason_codes)))
+        columns.ticker.append(ticker_codes.setdefault(ticker, len(ticker_codes)))
+        columns.direction.append(direction_codes.setdefault(direction, len(direction_codes)))
+
+    columns.reasons = list(reason_codes)
+    columns.tickers = list(ticker_codes)
+    columns.directions = list(direction_codes)
+    return columns
+
+
+# Exit reason, weekday and streak stats in the shape advanced_stats.html
+# expects (the monthly breakdown comes from the daily rollup instead)
+def compute_advanced_stats(columns):
+    total = len(columns)
+    pnl = columns.pnl
+
+    reason_count = [0] * len(columns.reasons)
+    reason_wins = [0] * len(columns.reasons)
+    reason_losses = [0] * len(columns.reasons)
+    reason_pnl = [0] * len(columns.reasons)
+    weekday_count = [0] * 7
+    weekday_wins = [0] * 7
+    weekday_pnl = [0] * 7
+
+    # Single pass over the arrays for every per-group accumulator
+    for i in range(total):
+        value = pnl[i]
+        win = value > 0
+        reason = columns.reason[i]
+        weekday = (columns.day[i] - 1) % 7
+
+        reason_count[reason] += 1
+        reason_pnl[reason] += value
+        if win:
+            reason_wins[reason] += 1
+        elif value < 0:
+            reason_losses[reason] += 1
+
+        weekday_count[weekday] += 1
+        weekday_wins[weekday] += win
+        weekday_pnl[weekday] += value
+
+    # Exit Reason Analysis (reasons keep their first-seen order, newest trade first)
+    exit_stats = {}
+    for code, reason in enumerate(columns.reasons):
+        count = reason_count[code]
+        exit_stats[reason] = {
+            'avg_return': round(reason_pnl[code] / count, 2),
+            'win_rate': round((reason_wins[code] / count) * 100, 1),
+            'frequency': round((count / total) * 100, 1),
+            'count': count,
+            'wins': reason_wins[code],
+            'losses': reason_losses[code],
+            'breakevens': count - reason_wins[code] - reason_losses[code],
+            'total_pnl': round(reason_pnl[code], 2)
+        }
+
+    # Day of week performance
+    daily_performance = {}
+    for weekday, day in enumerate(WEEKDAYS):
+        count = weekday_count[weekday]
+        daily_performance[day] = {
+            'total_trades': count,
+            'win_rate': round((weekday_wins[weekday] / count) * 100, 1) if count else 0,
+            'total_pnl': round(weekday_pnl[weekday], 2) if count else 0,
+            'avg_trade': round(weekday_pnl[weekday] / count, 2) if count else 0
+        }
+
+    return exit_stats, {
+        'daily': daily_performance,
+        'streaks': compute_streaks(columns)
+    }
+
+
+# Win/loss streaks in chronological order, the (date, created_at, id) order
+# the equity curve and the leaderboard use too.  Rows are stored newest first
+# in that order, so walk them backwards.  Breakevens neither extend nor break a streak.
+def compute_streaks(columns):
+    pnl = columns.pnl
+    win_streak = loss_streak = 0
+    longest_win = longest_loss = 0
+    last = 0
+
+    for i in range(len(pnl) - 1, -1, -1):
+        last = pnl[i]
+        if last > 0:
+            win_streak += 1
+            loss_streak = 0
+            longest_win = max(longest_win, win_streak)
+        elif last < 0:
+            loss_streak += 1
+            win_streak = 0
+            longest_loss = max(longest_loss, loss_streak)
+
+    # Current streak (last trade determines)
+    if last > 0:
+        current = win_streak
+    elif last < 0:
+        current = -loss_streak
+    else:
+        current = 0
+
+    return {
+        'current': current,
+        'longest_win': longest_win,
+        'longest_loss': longest_loss
+    }
+
+
+# Leaderboard columns that /compare can sort by (all descending)
+LEADERBOARD_SORTS = ('total_pnl', 'win_rate', 'risk_reward_ratio', 'total_trades',
+                     'current_streak', 'longest_win')
+
+# Summary counters and win/loss streaks for every user in one statement.
+# Trades are reached through users so each user's trades are an index range
+# on (user_id, date), which also makes a date range cheap.  Streaks follow
+# compute_streaks (same chronological order, breakevens neither extend nor
+# break a run) and come from a single window pass: every trade of a winning
+# run has seen the same number of losses so far, and every trade of a losing
+# run the same number of wins, so those running counts identify the runs.
+# {range} takes the optional date filters.
+LEADERBOARD_SQL = '''
+    WITH ranged AS (
+        SELECT trades.user_id, trades.account_pnl,
+               (trades.account_pnl > 0) - (trades.account_pnl < 0) AS outcome,
+               ROW_NUMBER() OVER chronological AS position,
+               SUM(trades.account_pnl > 0) OVER chronological AS wins_so_far,
+               SUM(trades.account_pnl < 0) OVER chronological AS losses_so_far
+        FROM users
+        CROSS JOIN trades ON trades.user_id = users.id{range}
+        WINDOW chronological AS (
+            PARTITION BY trades.user_id
+            ORDER BY trades.date, trades.created_at, trades.id
+            ROWS UNBOUNDED PRECEDING
+        )
+    ),
+    totals AS (
+        -- last_outcome is a bare column, so it comes from the row with MAX(position)
+        SELECT user_id,
+               COUNT(*) AS total_trades,
+               SUM(outcome = 1) AS winning_trades,
+               SUM(outcome = -1) AS losing_trades,
+               SUM(outcome = 0) AS breakeven_trades,
+               TOTAL(account_pnl) AS total_pnl,
+               TOTAL(CASE WHEN outcome = 1 THEN account_pnl END) AS win_pnl,
+               TOTAL(CASE WHEN outcome = -1 THEN account_pnl END) AS loss_pnl,
+               outcome AS last_outcome,
+               MAX(position) AS last_position
+        FROM ranged
+        GROUP BY user_id
+    ),
+    streaks AS (
+        SELECT user_id, outcome,
+               CASE WHEN outcome = 1 THEN losses_so_far ELSE wins_so_far END AS run,
+               COUNT(*) AS length
+        FROM ranged
+        WHERE outcome != 0
+        GROUP BY user_id, outcome, run
+    ),
+    longest AS (
+        SELECT user_id,
+               MAX(CASE WHEN outcome = 1 THEN length ELSE 0 END) AS longest_win,
+               MAX(CASE WHEN outcome = -1 THEN length ELSE 0 END) AS longest_loss
+        FROM streaks
+        GROUP BY user_id
+    )
+    SELECT users.id, users.username, users.display_name,
+           totals.total_trades, totals.winning_trades, totals.losing_trades, totals.breakeven_trades,
+           totals.total_pnl, totals.win_pnl, totals.loss_pnl,
+           COALESCE(totals.last_outcome * latest.length, 0) AS current_streak,
+           COALESCE(longest.longest_win, 0) AS longest_win,
+           COALESCE(longest.longest_loss, 0) AS longest_loss
+    FROM users
+    LEFT JOIN totals ON totals.user_id = users.id
+    LEFT JOIN longest ON longest.user_id = users.id
+    -- The run the last trade belongs to, when that trade was a win or a loss
+    LEFT JOIN streaks AS latest
+        ON latest.user_id = users.id
+        AND latest.outcome = totals.last_outcome
+        AND latest.run = CASE WHEN totals.last_outcome = 1 THEN totals.losing_trades ELSE totals.winning_trades END
+    ORDER BY users.display_name
+'''
+
+
+def leaderboard_query(start=None, end=None):
+    range_sql = ''
+    params = []
+    if start:
+        range_sql += ' AND trades.date >= ?'
+        params.append(start)
+    if end:
+        range_sql += ' AND trades.date <= ?'
+        params.append(end)
+    return LEADERBOARD_SQL.format(range=range_sql), params
+
+
+# One summary_stats() dict per user (plus who it is and their streaks),
+# in display name order
+def load_leaderboard(conn, start=None, end=None):
+    sql, params = leaderboard_query(start, end)
+    board = []
+    for row in conn.execute(sql, params):
+        stats = summary_stats(row if row['total_trades'] else None)
+        stats.update({
+            'user_id': row['id'],
+            'username': row['username'],
+            'display_name': row['display_name'],
+            'current_streak': row['current_streak'],
+            'longest_win': row['longest_win'],
+            'longest_loss': row['longest_loss']
+        })
+        board.append(stats)
+    return board
+
+
+def sort_leaderboard(board, key):
+    return sorted(board, key=lambda stats: stats[key], reverse=True)
+
+
+# Event impact: how trades taken around economic events compare with trades
+# on normal days.  A trade is "around" an event when its date falls within
+# `before` days before to `after` days after it.
+EVENT_WINDOW_MAX = 10
+EVENT_TYPE_ORDER = ('FOMC', 'NFP', 'WASDE', 'Petroleum', 'Other')
+IMPORTANCE_ORDER = ('High', 'Medium', 'Low')
+
+# Everything comes from one statement.  One-off events are read through the
+# (user_id, event_date) index and recurring occurrences, which are expanded
+# in Python, arrive as a JSON array, so the page needs no temp table and
+# never takes the write lock.  Each event window is an index range on
+# trades (user_id, date); the CROSS JOIN keeps the few windows as the outer
+# loop.  A trade counts once per (event_type, importance) group however many
+# windows of that group overlap it, and once in the "near" baseline.
+# {range} takes the optional trade date filters.
+EVENT_IMPACT_SQL = '''
+    WITH events AS MATERIALIZED (
+        SELECT event_date, event_type, importance FROM economic_events
+        WHERE user_id = :user_id AND event_date >= :events_start AND event_date <= :events_end
+        UNION ALL
+        SELECT value ->> 0, value ->> 1, value ->> 2 FROM json_each(:occurrences)
+    ),
+    windows AS MATERIALIZED (
+        SELECT DISTINCT event_type, importance,
+               date(event_date, :before) AS window_start, date(event_date, :after) AS window_end
+        FROM events
+    ),
+    event_trades AS MATERIALIZED (
+        SELECT DISTINCT windows.event_type, windows.importance, trades.id, trades.account_pnl, trades.close_reason
+        FROM windows
+        CROSS JOIN trades ON trades.user_id = :user_id
+            AND trades.date >= windows.window_start AND trades.date <= windows.window_end{range}
+    )
+    SELECT 'event' AS scope, event_type, importance, close_reason,
+           COUNT(*) AS trades, SUM(account_pnl > 0) AS wins, TOTAL(account_pnl) AS total_pnl
+    FROM event_trades
+    GROUP BY event_type, importance, close_reason
+    UNION ALL
+    SELECT CASE WHEN trades.id IN (SELECT id FROM event_trades) THEN 'near' ELSE 'normal' END,
+           NULL, NULL, trades.close_reason,
+           COUNT(*), SUM(trades.account_pnl > 0), TOTAL(trades.account_pnl)
+    FROM trades
+    WHERE trades.user_id = :user_id{range}
+    GROUP BY 1, trades.close_reason
+    UNION ALL
+    SELECT 'count', event_type, importance, NULL, COUNT(*), 0, 0
+    FROM events
+    GROUP BY event_type, importance
+'''
+
+
+# First and last trade date of a user, each a single index seek
+def trade_date_span(conn, user_id):
+    row = conn.execute('''
+        SELECT (SELECT MIN(date) FROM trades WHERE user_id = ?) AS first,
+               (SELECT MAX(date) FROM trades WHERE user_id = ?) AS last
+    ''', (user_id, user_id)).fetchone()
+    return row['first'], row['last']
+
+
+def event_impact_query(start=None, end=None):
+    range_sql = ''
+    params = {}
+    if start:
+        range_sql += ' AND trades.date >= :start'
+        params['start'] = start
+    if end:
+        range_sql += ' AND trades.date <= :end'
+        params['end'] = end
+    return EVENT_IMPACT_SQL.format(range=range_sql), params
+
+
+# Win rate, average P&L and exit reason mix of a group of trades from its
+# rows of (close_reason, trades, wins, total_pnl)
+def impact_stats(rows):
+    trades = sum(row['trades'] for row in rows)
+    wins = sum(row['wins'] for row in rows)
+    total_pnl = sum(row['total_pnl'] for row in rows)
+    exits = {}
+    for row in sorted(rows, key=lambda row: row['trades'], reverse=True):
+        exits[row['close_reason']] = {
+            'count': row['trades'],
+            'share': round(row['trades'] / trades * 100, 1),
+        }
+    return {
+        'trades': trades,
+        'win_rate': round(wins / trades * 100, 1) if trades else 0,
+        'avg_pnl': round(total_pnl / trades, 2) if trades else 0,
+        'total_pnl': round(total_pnl, 2),
+        'exits': exits,
+    }
+
+
+# occurrences are (event_date, event_type, importance) of recurring events
+# between events_start and events_end, which must cover the trade range
+# widened by the window.  Returns the baselines and one entry per event type
+# and importance with its difference from normal days.
+def load_event_impact(conn, user_id, occurrences, events_start, events_end, before=0, after=0,
+                      start=None, end=None):
+    sql, params = event_impact_query(start, end)
+    params.update({
+        'user_id': user_id,
+        'occurrences': json.dumps(occurrences),
+        'events_start': events_start,
+        'events_end': events_end,
+        'before': f'-{before} days',
+        'after': f'+{after} days',
+    })
+
+    rows = {}
+    for row in conn.execute(sql, params):
+        rows.setdefault((row['scope'], row['event_type'], row['importance']), []).append(row)
+
+    normal = impact_stats(rows.get(('normal', None, None), []))
+    groups = []
+    for (scope, event_type, importance), group_rows in rows.items():
+        if scope != 'count':
+            continue
+        stats = impact_stats(rows.get(('event', event_type, importance), []))
+        stats.update({
+            'event_type': event_type,
+            'importance': importance,
+            'events': group_rows[0]['trades'],
+            'win_rate_change': round(stats['win_rate'] - normal['win_rate'], 1) if stats['trades'] else None,
+            'avg_pnl_change': round(stats['avg_pnl'] - normal['avg_pnl'], 2) if stats['trades'] else None,
+        })
+        groups.append(stats)
+    groups.sort(key=lambda group: (sort_position(EVENT_TYPE_ORDER, group['event_type']),
+                                   sort_position(IMPORTANCE_ORDER, group['importance'])))
+
+    return {
+        'event_days': impact_stats(rows.get(('near', None, None), [])),
+        'normal_days': normal,
+        'groups': groups,
+    }
+
+
+def sort_position(order, value):
+    return (order.index(value), '') if value in order else (len(order), value or '')
@@ -1,11 +1,47 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from flask import Flask, render_template, request, redirect, url_for, flash, session, g, jsonify, make_response, abort, send_from_directory, Response
+from flask import before_render_template, template_rendered
 from datetime import datetime, timedelta
 import sqlite3
 import os
 import secrets
+import base64
+import io
+import hashlib
+import csv
+import hmac
+import gzip
+import mimetypes
+import time
+import shutil
+import tempfile
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 from functools import wraps
 import calendar as cal
+import click
+from database import ConnectionPool, connect
+from cache import StatsCache
+from metrics import Metrics, InstrumentedConnection, RequestProfiler
+from screenshots import (ScreenshotProcessor, make_variants, original_screenshots, variant_path, variant_filename,
+                         stage_upload, commit_upload, sweep_orphans)
+from analytics import (load_user_stats, summary_stats, rebuild_user_stats, user_stats_drift,
+                       load_trade_columns, compute_advanced_stats, rebuild_daily_pnl, daily_pnl_drift,
+                       load_daily_pnl, monthly_performance, heatmap_grid, HEATMAP_MAX_DAYS, load_equity_series,
+                       equity_chart, LEADERBOARD_SORTS, load_leaderboard, sort_leaderboard, EVENT_WINDOW_MAX,
+                       load_event_impact, trade_date_span)
+from importer import import_trades, connection_writer
+from writer import WriteQueue, WRITE_BATCH_SIZE
+from migrations import migrate, schema_version, table_exists
+from recurrence import (build_series_rule, describe_series, is_occurrence, load_exceptions, load_series,
+                        make_occurrence, month_dates, month_range, parse_date, series_key, series_occurrences)
+from search import SEARCH_PAGE_SIZE, SEARCH_RANK_POOL, search_journal, search_series
+from assets import (AssetManifest, ASSET_MAX_AGE, COMPRESSIBLE_MIMETYPES, COMPRESS_MIN_SIZE, COMPRESS_LEVEL,
+                    asset_variant, available_encodings, compress_assets, is_asset)
+from exporter import (EXPORT_FORMATS, TRADE_EXPORT_COLUMNS, EVENT_EXPORT_COLUMNS, EXPORT_OCCURRENCE_DAYS,
+                      trade_export_query, event_export_query, iter_row_batches, merge_occurrence_rows, export_chunks)
+import snapshots
+from snapshots import (SNAPSHOT_FORMATS, snapshot_path, snapshot_lock, update_snapshot, read_snapshot,
+                       snapshot_bytes, export_snapshot_table)
 
 app = Flask(__name__)
 
@@ -16,116 +52,313 @@ app.secret_key = os.environ.get('SECRET_KEY', 'my_trading_journal_secret_key_202
 UPLOAD_FOLDER = 'static/screenshots'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB max file size
+SCREENSHOT_MAX_AGE = 7 * 24 * 3600  # variants are never rewritten for the same upload
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
+# Database configuration
+app.config['DATABASE'] = os.environ.get('DATABASE_PATH', 'trading_journal.db')
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 8))
+
+# Pooled connections time every statement for the request metrics
+db_pool = ConnectionPool(app.config['DATABASE'], size=app.config['DB_POOL_SIZE'], factory=InstrumentedConnection)
+
+# Request, SQL and template timings for /metrics.  Setting ENABLE_PROFILING=1
+# lets a request with an X-Profile header get a cProfile report back instead
+# of its normal response.
+app.config['PROFILING'] = os.environ.get('ENABLE_PROFILING') == '1'
+PROFILE_SORT_KEYS = ('cumulative', 'tottime', 'calls')
+
+# /metrics is only served to scrapers presenting METRICS_TOKEN as a bearer
+# token; without one configured the endpoint doesn't exist
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+
+metrics = Metrics()
+before_render_template.connect(metrics.template_started, app)
+template_rendered.connect(metrics.template_finished, app)
+
+# Stats cache configuration; BUILD_ID is part of every page ETag so a deploy
+# with new templates never answers 304 for HTML rendered by the old ones
+app.config['STATS_CACHE_SIZE'] = int(os.environ.get('STATS_CACHE_SIZE', 256))
+app.config['BUILD_ID'] = os.environ.get('BUILD_ID', secrets.token_hex(8))
+
+stats_cache = StatsCache(maxsize=app.config['STATS_CACHE_SIZE'])
+
+# Rule dates of recurring event series, one entry per (series, month); see
+# cached_month_dates()
+app.config['OCCURRENCE_CACHE_SIZE'] = int(os.environ.get('OCCURRENCE_CACHE_SIZE', 1024))
+occurrence_cache = StatsCache(maxsize=app.config['OCCURRENCE_CACHE_SIZE'])
+
+# Trade and event writes are applied by one writer thread per process that
+# group-commits whatever has queued up; see writer.py
+app.config['WRITE_BATCH_SIZE'] = int(os.environ.get('WRITE_BATCH_SIZE', WRITE_BATCH_SIZE))
+write_queue = WriteQueue(app.config['DATABASE'], batch_size=app.config['WRITE_BATCH_SIZE'],
+                         factory=InstrumentedConnection)
+
+# Columnar (Arrow/Parquet) snapshots need pyarrow; see snapshots.py
+app.config['SNAPSHOT_FOLDER'] = os.environ.get('SNAPSHOT_FOLDER', 'snapshots')
+app.config['SNAPSHOTS_ENABLED'] = snapshots.pa is not None
+
+# Compact JSON for the API, keeping computed dicts in their display order
+app.json.compact = True
+app.json.sort_keys = False
+
 # Ensure upload directory exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Thumbnails and display copies are produced in the background after upload
+screenshot_processor = ScreenshotProcessor(UPLOAD_FOLDER, app.config['DATABASE'],
+                                           workers=int(os.environ.get('SCREENSHOT_WORKERS', 2)))
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# CSS and JS are linked by content fingerprint and served precompressed; see
+# static_file() and assets.py
+asset_manifest = AssetManifest(app.static_folder)
+
+@app.template_global()
+def asset_url(filename):
+    return url_for('static', filename=filename, v=asset_manifest.fingerprint(filename))
+
+# URL of a screenshot variant ('thumb' or 'display'); see screenshot_variant()
+@app.template_global()
+def screenshot_url(filename, variant):
+    return url_for('screenshot_variant', variant=variant, filename=filename)
+
 # Authentication decorator
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
+            if request.path.startswith('/api/'):
+                return jsonify(error='Login required'), 401
             return redirect(url_for('login'))
         return f(*args, **kwargs)
     return decorated_function
 
-# Database migration function to add user_id to existing trades
-def migrate_existing_trades():
-    conn = get_db_connection()
-    
-    # Check if trades table has user_id column
-    cursor = conn.execute("PRAGMA table_info(trades)")
-    columns = [column[1] for column in cursor.fetchall()]
-    
-    if 'user_id' not in columns:
-        # Add user_id column to existing trades table
-        conn.execute('ALTER TABLE trades ADD COLUMN user_id INTEGER DEFAULT 1')
-        print("Added user_id column to existing trades")
-    
-    # Ensure all existing trades are assigned to Darren (user_id = 1)
-    conn.execute('UPDATE trades SET user_id = 1 WHERE user_id IS NULL OR user_id = 0')
-    conn.commit()
-    conn.close()
-
-# Database setup
+# Bring the schema up to date.  Only migrations the database hasn't seen run
+# (see migrations.py), so on a current database this is a single pragma read
+# whatever its size; the time it took is reported either way.
 def init_db():
-    conn = sqlite3.connect('trading_journal.db')
-    cursor = conn.cursor()
-    
-    # Users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            display_name TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Trades table (create new or update existing)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS trades (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER DEFAULT 1,
-            ticker TEXT NOT NULL,
-            direction TEXT NOT NULL,
-            date TEXT NOT NULL,
-            outcome TEXT NOT NULL,
-            close_reason TEXT NOT NULL,
-            account_pnl REAL NOT NULL,
-            notes TEXT,
-            screenshot_filename TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    # Economic events table (NEW)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS economic_events (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            event_type TEXT NOT NULL,
-            event_date DATE NOT NULL,
-            title TEXT NOT NULL,
-            description TEXT,
-            importance TEXT DEFAULT 'Medium',
-            source_url TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    # Create default users
-    users = [
-        ('darren', 'darren', 'Darren'),
-        ('likith', 'likith', 'Likith'),
-        ('tanish', 'tanish', 'Tanish')
-    ]
-    
-    for username, password, display_name in users:
-        cursor.execute('''
-            INSERT OR IGNORE INTO users (username, password, display_name)
-            VALUES (?, ?, ?)
-        ''', (username, password, display_name))
-    
-    conn.commit()
-    conn.close()
-    
-    # Migrate existing trades
-    migrate_existing_trades()
+    started = time.perf_counter()
+    conn = connect(app.config['DATABASE'])
+    try:
+        applied = migrate(conn, app.config)
+        version = schema_version(conn)
+        app.config['SEARCH_ENABLED'] = table_exists(conn, 'trades_fts')
+    finally:
+        conn.close()
+    elapsed = (time.perf_counter() - started) * 1000
 
+    for name, step_ms in applied:
+        print(f"Applied migration {name} ({step_ms:.1f}ms)")
+    if applied:
+        print(f"Database schema migrated to version {version} in {elapsed:.1f}ms")
+    else:
+        print(f"Database schema is current (version {version}); startup check took {elapsed:.1f}ms")
+
+def data_version(conn, user_id):
+    row = conn.execute('SELECT version FROM data_versions WHERE user_id = ?', (user_id,)).fetchone()
+    return row['version'] if row else 0
+
+# Version of the whole journal for pages that cover every user.  Each user's
+# version only ever grows, so their sum changes with any trade or event
+# change; the user count covers new accounts.
+def journal_version(conn):
+    row = conn.execute('''
+        SELECT (SELECT TOTAL(version) FROM data_versions) AS version,
+               (SELECT COUNT(*) FROM users) AS users
+    ''').fetchone()
+    return f"{int(row['version'])}.{row['users']}"
+
+# Weak ETag for a rendered page.  Besides the data version it covers the
+# viewer (navbar, edit rights), the full URL and the build, since all of
+# those change the HTML.  Pages with pending flash messages get no ETag
+# because the message is rendered into them.
+def page_etag(version):
+    if '_flashes' in session:
+        return None
+    return data_etag(version)
+
+def data_etag(version):
+    raw = f"{app.config['BUILD_ID']}|{session['user_id']}|{request.full_path}|{version}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+# 304 response if the browser already holds this page
+def not_modified(etag):
+    if etag is None or not request.if_none_match.contains_weak(etag):
+        return None
+    return cacheable(make_response('', 304), etag)
+
+def cacheable(response, etag):
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# Half-open [first day, first day of next month) bounds for date range queries
+def month_bounds(year, month):
+    start = f"{year:04d}-{month:02d}-01"
+    if month == 12:
+        end = f"{year + 1:04d}-01-01"
+    else:
+        end = f"{year:04d}-{month + 1:02d}-01"
+    return start, end
+
+# Dashboard trade list pagination
+TRADE_PAGE_SIZE = 50
+MAX_TRADE_PAGE_SIZE = 200
+
+# ?limit= outside 1..MAX_TRADE_PAGE_SIZE (or not a number) is a bad request
+def trade_page_size():
+    limit = request.args.get('limit', TRADE_PAGE_SIZE)
+    try:
+        limit = int(limit)
+    except ValueError:
+        abort(400)
+    if not 1 <= limit <= MAX_TRADE_PAGE_SIZE:
+        abort(400)
+    return limit
+
+# Keyset cursor: the (date, created_at, id) of the last trade on the previous page
+def encode_cursor(trade):
+    raw = f"{trade['date']}|{trade['created_at']}|{trade['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+# A cursor that doesn't decode to one of ours is a bad request, not page one
+def decode_cursor(value):
+    if not value:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)).decode()
+        date, created_at, trade_id = raw.split('|')
+        datetime.strptime(date, '%Y-%m-%d')
+        return date, created_at, int(trade_id)
+    except ValueError:
+        abort(400)
+
+# One page of a user's trades, newest first.  idx_trades_user_date is on
+# (user_id, date, created_at) with the rowid after it, so the index already
+# holds (date, created_at, id) order: the cursor predicate seeks straight to
+# the next row and the page is read off in order, instead of skipping rows
+# with OFFSET
+def fetch_trade_page(conn, user_id, cursor, limit):
+    if cursor:
+        trades = conn.execute('''
+            SELECT * FROM trades
+            WHERE user_id = ? AND (date, created_at, id) < (?, ?, ?)
+            ORDER BY date DESC, created_at DESC, id DESC
+            LIMIT ?
+        ''', (user_id, *cursor, limit + 1)).fetchall()
+    else:
+        trades = conn.execute('''
+            SELECT * FROM trades
+            WHERE user_id = ?
+            ORDER BY date DESC, created_at DESC, id DESC
+            LIMIT ?
+        ''', (user_id, limit + 1)).fetchall()
+    
+    next_cursor = encode_cursor(trades[limit - 1]) if len(trades) > limit else None
+    return trades[:limit], next_cursor
+
+@app.before_request
+def start_request_metrics():
+    metrics.begin_request()
+    if app.config['PROFILING'] and request.headers.get('X-Profile'):
+        g.profiler = RequestProfiler()
+        g.profiler.start()
+
+@app.after_request
+def record_request_metrics(response):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        sort = request.headers['X-Profile']
+        report = profiler.report(sort if sort in PROFILE_SORT_KEYS else 'cumulative')
+        response = make_response(report, 200, {'Content-Type': 'text/plain; charset=utf-8'})
+    metrics.end_request(request.endpoint or 'unmatched', request.method, response.status_code)
+    return response
+
+# Gzip HTML and JSON on the fly for clients that accept it.  Streamed
+# responses (exports) and files are left alone; ETags are weak, so they
+# still match whichever encoding the browser cached.
+@app.after_request
+def compress_response(response):
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    if not request.accept_encodings.quality('gzip'):
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=COMPRESS_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+# Requests that raised never reach after_request
+@app.teardown_request
+def record_failed_request(exception):
+    if exception is not None:
+        metrics.end_request(request.endpoint or 'unmatched', request.method, 500)
+
+# Request-scoped connection: the first call in an app context borrows a
+# connection from the pool and close_db() hands it back on teardown, so
+# routes never have to close it themselves (even on early returns).
 def get_db_connection():
-    conn = sqlite3.connect('trading_journal.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+    if 'db' not in g:
+        g.db = db_pool.acquire()
+    return g.db
+
+@app.teardown_appcontext
+def close_db(exception):
+    conn = g.pop('db', None)
+    if conn is not None:
+        db_pool.release(conn)
+
+# Single-statement write for the writer queue, returning the affected row count
+def execute_write(conn, sql, params):
+    return conn.execute(sql, params).rowcount
+
+# Liveness/readiness probe for the load balancer; runs a real query so a
+# missing or locked database file shows up as unhealthy
+@app.route('/healthz')
+def healthz():
+    try:
+        get_db_connection().execute('SELECT COUNT(*) FROM users').fetchone()
+    except sqlite3.Error as e:
+        response = jsonify(status='error', error=str(e))
+        response.status_code = 503
+    else:
+        response = jsonify(status='ok')
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/metrics')
+def metrics_view():
+    token = app.config['METRICS_TOKEN']
+    if not token:
+        abort(404)
+    presented = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(presented.encode(), f'Bearer {token}'.encode()):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain',
+                        headers={'WWW-Authenticate': 'Bearer realm="metrics"'})
+    body = metrics.render({
+        'journal_db_pool': ('Connection pool counters.', db_pool.stats()),
+        'journal_stats_cache': ('Stats cache counters.', stats_cache.stats()),
+        'journal_occurrence_cache': ('Recurring event expansion cache counters.', occurrence_cache.stats()),
+        'journal_write_queue': ('Writer queue depth, batching and throughput.', write_queue.stats()),
+    })
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+@app.route('/status')
+@login_required
+def status():
+    return jsonify(db_pool=db_pool.stats(), stats_cache=stats_cache.stats(),
+                   occurrence_cache=occurrence_cache.stats(), write_queue=write_queue.stats())
 
 # Authentication routes
 @app.route('/login', methods=['GET', 'POST'])
@@ -139,7 +372,6 @@ def login():
             'SELECT * FROM users WHERE username = ? AND password = ?',
             (username, password)
         ).fetchone()
-        conn.close()
         
         if user:
             session['user_id'] = user['id']
@@ -177,63 +409,49 @@ def index():
         flash('User not found', 'error')
         return redirect(url_for('index'))
     
+    # Nothing to render if the user's trades haven't changed since the browser's copy
+    version = data_version(conn, view_user_id)
+    etag = page_etag(version)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    
     # Get all users for profile switcher
     all_users = conn.execute('SELECT id, username, display_name FROM users ORDER BY display_name').fetchall()
     
-    trades = conn.execute('''
-        SELECT * FROM trades 
-        WHERE user_id = ?
-        ORDER BY date DESC, created_at DESC
-    ''', (view_user_id,)).fetchall()
-    
-    # Calculate summary stats for viewed user
-    total_trades = len(trades)
-    winning_trades = len([t for t in trades if t['account_pnl'] > 0])
-    losing_trades = len([t for t in trades if t['account_pnl'] < 0])
-    breakeven_trades = len([t for t in trades if t['account_pnl'] == 0])
-    
-    # Calculate rates
-    win_rate = (winning_trades / total_trades * 100) if total_trades > 0 else 0
-    be_rate = (breakeven_trades / total_trades * 100) if total_trades > 0 else 0
-    loss_rate = (losing_trades / total_trades * 100) if total_trades > 0 else 0
-    
-    # Calculate P&L metrics
-    total_pnl = sum([t['account_pnl'] for t in trades])
-    avg_win = sum([t['account_pnl'] for t in trades if t['account_pnl'] > 0]) / winning_trades if winning_trades > 0 else 0
-    avg_loss = sum([t['account_pnl'] for t in trades if t['account_pnl'] < 0]) / losing_trades if losing_trades > 0 else 0
-    
-    # Calculate Risk-Reward Ratio (Average Win : Average Loss)
-    if avg_loss != 0:
-        risk_reward_ratio = abs(avg_win / avg_loss)  # Use absolute value since avg_loss is negative
-    else:
-        risk_reward_ratio = avg_win if avg_win > 0 else 0
+    # First page of trades; later pages are fetched from trade_rows()
+    page_size = trade_page_size()
+    trades, next_cursor = fetch_trade_page(conn, view_user_id, decode_cursor(request.args.get('cursor')), page_size)
     
-    conn.close()
-    
-    stats = {
-        'total_trades': total_trades,
-        'winning_trades': winning_trades,
-        'losing_trades': losing_trades,
-        'breakeven_trades': breakeven_trades,
-        'win_rate': round(win_rate, 1),
-        'be_rate': round(be_rate, 1),
-        'loss_rate': round(loss_rate, 1),
-        'total_pnl': round(total_pnl, 2),
-        'avg_win': round(avg_win, 2),
-        'avg_loss': round(avg_loss, 2),
-        'risk_reward_ratio': round(risk_reward_ratio, 2)
-    }
+    # Summary stats for viewed user come from the trigger-maintained user_stats row
+    stats = cached_summary_stats(conn, view_user_id, version)
     
     # Check if current user can edit (only their own trades)
     can_edit = (view_user_id == session['user_id'])
     
-    return render_template('index.html', 
+    return cacheable(make_response(render_template('index.html', 
                          trades=trades, 
+                         next_cursor=next_cursor,
+                         page_size=page_size,
                          stats=stats, 
                          viewed_user=viewed_user,
                          all_users=all_users,
                          can_edit=can_edit,
-                         current_view_user_id=view_user_id)
+                         current_view_user_id=view_user_id)), etag)
+
+# Next page of trade rows for the dashboard's infinite scroll
+@app.route('/trades')
+@login_required
+def trade_rows():
+    view_user_id = request.args.get('user', session['user_id'], type=int)
+    conn = get_db_connection()
+    trades, next_cursor = fetch_trade_page(conn, view_user_id, decode_cursor(request.args.get('cursor')), trade_page_size())
+    
+    response = make_response(render_template('_trade_rows.html',
+                                             trades=trades,
+                                             can_edit=(view_user_id == session['user_id'])))
+    response.headers['X-Next-Cursor'] = next_cursor or ''
+    return response
 
 @app.route('/add_trade', methods=['GET', 'POST'])
 @login_required
@@ -252,38 +470,145 @@ def add_trade():
             flash('All required fields must be filled out.', 'error')
             return render_template('add_trade.html')
         
-        # Handle file upload
-        screenshot_filename = None
+        # Stream the upload to a temp file while hashing it; it's moved into
+        # content-addressed storage inside the insert transaction below
+        staged = None
         if 'screenshot' in request.files:
             file = request.files['screenshot']
             if file and file.filename != '' and allowed_file(file.filename):
-                # Create unique filename with user prefix
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                original_extension = file.filename.rsplit('.', 1)[1].lower()
-                filename = f"{session['username']}_{ticker}_{date}_{timestamp}.{original_extension}"
-                filename = secure_filename(filename)
-                
                 try:
-                    file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                    screenshot_filename = filename
+                    staged = stage_upload(app.config['UPLOAD_FOLDER'], file.stream, file.filename.rsplit('.', 1)[1])
                 except Exception as e:
                     flash(f'Error uploading screenshot: {str(e)}', 'error')
                     return render_template('add_trade.html')
         
         # Insert into database with user_id
-        conn = get_db_connection()
-        conn.execute('''
-            INSERT INTO trades (user_id, ticker, direction, date, outcome, close_reason, account_pnl, notes, screenshot_filename)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (session['user_id'], ticker, direction, date, outcome, close_reason, account_pnl, notes, screenshot_filename))
-        conn.commit()
-        conn.close()
+        user_id = session['user_id']
+        def write(conn):
+            screenshot_filename = commit_upload(conn, app.config['UPLOAD_FOLDER'], staged) if staged else None
+            conn.execute('''
+                INSERT INTO trades (user_id, ticker, direction, date, outcome, close_reason, account_pnl, notes, screenshot_filename)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (user_id, ticker, direction, date, outcome, close_reason, account_pnl, notes, screenshot_filename))
+            return screenshot_filename
+        screenshot_filename = write_queue.execute(write)
+        
+        # Thumbnail/display versions are made on a worker thread; don't wait for them
+        screenshot_processor.submit(screenshot_filename)
         
         flash(f'Trade {ticker} added successfully!', 'success')
         return redirect(url_for('index'))
     
     return render_template('add_trade.html')
 
+@app.route('/import_trades', methods=['GET', 'POST'])
+@login_required
+def import_trades_view():
+    if request.method == 'POST':
+        # Uploads are capped at MAX_CONTENT_LENGTH like screenshots, so very
+        # large files (a million rows and up) go through `flask import-trades`
+        try:
+            file = request.files.get('file')
+        except RequestEntityTooLarge:
+            flash(f'Files over {MAX_FILE_SIZE // (1024 * 1024)} MB can\'t be uploaded; '
+                  f'import them with the import-trades command instead.', 'error')
+            return render_template('import_trades.html'), 413
+        if not file or file.filename == '':
+            flash('Choose a CSV file to import.', 'error')
+            return render_template('import_trades.html')
+        
+        # Werkzeug spools large uploads to disk; read it back as text row by
+        # row.  Chunks are committed by the writer queue like any other write.
+        stream = io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline='')
+        try:
+            report = import_trades(write_queue.execute, session['user_id'], stream)
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            flash(f'Could not import {file.filename}: {str(e)}', 'error')
+            return render_template('import_trades.html')
+        
+        if report.imported:
+            flash(f'Imported {report.imported} trades from {file.filename}.', 'success')
+        if report.stopped:
+            flash(f'Import stopped after {report.imported} trades were saved: {report.stopped}', 'error')
+        if report.unconfirmed:
+            flash(f'Import stopped waiting for the database after {report.imported} trades were saved. '
+                  f'The last {report.unconfirmed} may still be being written; check your journal before '
+                  f'importing {file.filename} again.', 'error')
+        if report.error_count:
+            flash(f'{report.error_count} rows were skipped because of errors.', 'error')
+        return render_template('import_trades.html', report=report)
+    
+    return render_template('import_trades.html')
+
+# Optional YYYY-MM-DD query parameter; anything else is a bad request
+def date_arg(name):
+    value = request.args.get(name, '').strip()
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        abort(400)
+
+@app.route('/export/<any(trades, events):kind>')
+@login_required
+def export_data(kind):
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        abort(400)
+    
+    start, end = date_arg('start'), date_arg('end')
+    if kind == 'trades':
+        columns = TRADE_EXPORT_COLUMNS
+        sql, params = trade_export_query(session['user_id'], start, end,
+                                         ticker=request.args.get('ticker'),
+                                         close_reason=request.args.get('close_reason'))
+    else:
+        columns = EVENT_EXPORT_COLUMNS
+        sql, params = event_export_query(session['user_id'], start, end)
+    
+    # The generator reads from its own connection, so nothing here depends on
+    # the request context once streaming starts
+    batches = iter_row_batches(app.config['DATABASE'], sql, params)
+    if kind == 'events':
+        occurrences = load_export_occurrences(get_db_connection(), session['user_id'], start, end)
+        batches = merge_occurrence_rows(batches, [tuple(event.get(column) for column in EVENT_EXPORT_COLUMNS)
+                                                  for event in occurrences])
+    response = Response(export_chunks(fmt, columns, batches), mimetype=EXPORT_FORMATS[fmt])
+    filename = f"{kind}-{datetime.now().strftime('%Y-%m-%d')}.{fmt}"
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+# The user's trades or events as one typed, columnar file for notebooks:
+# Arrow IPC (memory-mappable) or Parquet.  The user's snapshot is updated
+# first, which only reads rows changed since the last download.  Events are
+# the one-off ones (see snapshots.py); /export/events includes recurring ones.
+@app.route('/export/snapshot/<any(trades, events):kind>')
+@login_required
+def export_snapshot(kind):
+    fmt = request.args.get('format', 'arrow')
+    if fmt not in SNAPSHOT_FORMATS:
+        abort(400)
+    if not app.config['SNAPSHOTS_ENABLED']:
+        abort(501, 'Snapshots need pyarrow, which is not installed on this server.')
+    
+    conn = get_db_connection()
+    etag = data_etag(data_version(conn, session['user_id']))
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    
+    path = snapshot_path(app.config['SNAPSHOT_FOLDER'], session['user_id'])
+    with snapshot_lock(path):
+        update_snapshot(conn, path, session['user_id'])
+        data = snapshot_bytes(read_snapshot(path, kind), fmt)
+    
+    response = Response(data, mimetype=SNAPSHOT_FORMATS[fmt])
+    filename = f"{kind}-{datetime.now().strftime('%Y-%m-%d')}.{fmt}"
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return cacheable(response, etag)
+
 @app.route('/edit_trade/<int:trade_id>', methods=['GET', 'POST'])
 @login_required
 def edit_trade(trade_id):
@@ -307,40 +632,36 @@ def edit_trade(trade_id):
         screenshot_filename = current_trade['screenshot_filename']
         
         # Handle file upload
+        staged = None
         if 'screenshot' in request.files:
             file = request.files['screenshot']
             if file and file.filename != '' and allowed_file(file.filename):
-                # Delete old screenshot if exists
-                if screenshot_filename:
-                    old_path = os.path.join(app.config['UPLOAD_FOLDER'], screenshot_filename)
-                    if os.path.exists(old_path):
-                        os.remove(old_path)
-                
-                # Save new screenshot
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                original_extension = file.filename.rsplit('.', 1)[1].lower()
-                filename = f"{session['username']}_{ticker}_{date}_{timestamp}.{original_extension}"
-                filename = secure_filename(filename)
-                
                 try:
-                    file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                    screenshot_filename = filename
+                    staged = stage_upload(app.config['UPLOAD_FOLDER'], file.stream, file.filename.rsplit('.', 1)[1])
                 except Exception as e:
                     flash(f'Error uploading screenshot: {str(e)}', 'error')
         
-        conn.execute('''
-            UPDATE trades 
-            SET ticker=?, direction=?, date=?, outcome=?, close_reason=?, account_pnl=?, notes=?, screenshot_filename=?
-            WHERE id=? AND user_id=?
-        ''', (ticker, direction, date, outcome, close_reason, account_pnl, notes, screenshot_filename, trade_id, session['user_id']))
-        conn.commit()
-        conn.close()
+        user_id = session['user_id']
+        def write(conn, screenshot_filename):
+            if staged:
+                screenshot_filename = commit_upload(conn, app.config['UPLOAD_FOLDER'], staged)
+            conn.execute('''
+                UPDATE trades 
+                SET ticker=?, direction=?, date=?, outcome=?, close_reason=?, account_pnl=?, notes=?, screenshot_filename=?
+                WHERE id=? AND user_id=?
+            ''', (ticker, direction, date, outcome, close_reason, account_pnl, notes, screenshot_filename, trade_id, user_id))
+            return screenshot_filename
+        screenshot_filename = write_queue.execute(write, screenshot_filename)
+        
+        # The old screenshot lost a reference; its blob goes away only if no other trade uses it
+        if screenshot_filename != current_trade['screenshot_filename']:
+            screenshot_processor.release([current_trade['screenshot_filename']])
+            screenshot_processor.submit(screenshot_filename)
         
         flash('Trade updated successfully!', 'success')
         return redirect(url_for('index'))
     
     trade = conn.execute('SELECT * FROM trades WHERE id = ? AND user_id = ?', (trade_id, session['user_id'])).fetchone()
-    conn.close()
     
     if trade is None:
         flash('Trade not found or access denied.', 'error')
@@ -360,15 +681,11 @@ def delete_trade(trade_id):
         flash('Trade not found or access denied.', 'error')
         return redirect(url_for('index'))
     
-    if trade['screenshot_filename']:
-        # Delete screenshot file
-        screenshot_path = os.path.join(app.config['UPLOAD_FOLDER'], trade['screenshot_filename'])
-        if os.path.exists(screenshot_path):
-            os.remove(screenshot_path)
+    write_queue.execute(execute_write, 'DELETE FROM trades WHERE id = ? AND user_id = ?', (trade_id, session['user_id']))
     
-    conn.execute('DELETE FROM trades WHERE id = ? AND user_id = ?', (trade_id, session['user_id']))
-    conn.commit()
-    conn.close()
+    # Dropping the trade decremented the screenshot's reference count; the
+    # file is deleted in the background if that was the last reference
+    screenshot_processor.release([trade['screenshot_filename']])
     
     flash('Trade deleted successfully!', 'success')
     return redirect(url_for('index'))
@@ -378,7 +695,6 @@ def delete_trade(trade_id):
 def trade_detail(trade_id):
     conn = get_db_connection()
     trade = conn.execute('SELECT * FROM trades WHERE id = ? AND user_id = ?', (trade_id, session['user_id'])).fetchone()
-    conn.close()
     
     if trade is None:
         flash('Trade not found or access denied.', 'error')
@@ -386,6 +702,61 @@ def trade_detail(trade_id):
     
     return render_template('trade_detail.html', trade=trade)
 
+# Expanded detail panel for one dashboard row, loaded when the row is opened.
+# Like the dashboard itself, any user's trade can be viewed but only the owner can edit.
+@app.route('/trade_detail/<int:trade_id>/panel')
+@login_required
+def trade_detail_panel(trade_id):
+    conn = get_db_connection()
+    trade = conn.execute('SELECT * FROM trades WHERE id = ?', (trade_id,)).fetchone()
+    
+    if trade is None:
+        abort(404)
+    
+    return render_template('_trade_details.html',
+                         trade=trade,
+                         can_edit=(trade['user_id'] == session['user_id']))
+
+# Serves a screenshot's thumbnail/display version, falling back to the
+# original upload while the background worker hasn't produced it yet
+@app.route('/screenshots/<any(thumb, display):variant>/<path:filename>')
+@login_required
+def screenshot_variant(variant, filename):
+    filename = secure_filename(filename)
+    folder = app.config['UPLOAD_FOLDER']
+    if os.path.exists(variant_path(folder, variant, filename)):
+        response = send_from_directory(os.path.join(folder, variant), variant_filename(filename))
+        response.headers['Cache-Control'] = f'private, max-age={SCREENSHOT_MAX_AGE}'
+        return response
+    
+    if not os.path.exists(os.path.join(folder, filename)):
+        abort(404)
+    
+    # Not ready yet (or never queued, e.g. older uploads): queue it and serve the original uncached
+    screenshot_processor.submit(filename)
+    response = send_from_directory(folder, filename)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# Replaces Flask's static view.  CSS and JS go out as their brotli or gzip
+# copy when one exists and the client accepts it, and a URL carrying the
+# file's current fingerprint (see asset_url()) may be cached for a year.
+# Anything else, including old fingerprints, is revalidated as before.
+def static_file(filename):
+    folder = app.static_folder
+    encoding, served = asset_variant(folder, filename, request.accept_encodings)
+    response = send_from_directory(folder, served, mimetype=mimetypes.guess_type(filename)[0])
+    if is_asset(filename):
+        response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    version = request.args.get('v')
+    if version and version == asset_manifest.fingerprint(filename):
+        response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    return response
+
+app.view_functions['static'] = static_file
+
 @app.route('/advanced_stats')
 @login_required
 def advanced_stats():
@@ -401,203 +772,159 @@ def advanced_stats():
         view_user_id = session['user_id']
         viewed_user = conn.execute('SELECT * FROM users WHERE id = ?', (view_user_id,)).fetchone()
     
+    version = data_version(conn, view_user_id)
+    etag = page_etag(version)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    
     # Get all users for profile switcher
     all_users = conn.execute('SELECT id, username, display_name FROM users ORDER BY display_name').fetchall()
     
-    trades = conn.execute('''
-        SELECT * FROM trades 
-        WHERE user_id = ?
-        ORDER BY date DESC, created_at DESC
-    ''', (view_user_id,)).fetchall()
-    conn.close()
+    trade_count, exit_stats, performance_trends = cached_advanced_stats(conn, view_user_id, version)
     
-    if not trades:
-        return render_template('advanced_stats.html', 
-                             trades=[], 
-                             exit_stats={}, 
-                             performance_trends={},
-                             viewed_user=viewed_user,
-                             all_users=all_users,
-                             current_view_user_id=view_user_id)
-    
-    # Exit Reason Analysis
-    exit_reasons = {}
-    for trade in trades:
-        reason = trade['close_reason']
-        if reason not in exit_reasons:
-            exit_reasons[reason] = {'trades': [], 'total_pnl': 0, 'count': 0}
-        
-        exit_reasons[reason]['trades'].append(trade)
-        exit_reasons[reason]['total_pnl'] += trade['account_pnl']
-        exit_reasons[reason]['count'] += 1
-    
-    # Calculate exit reason stats
-    exit_stats = {}
-    for reason, data in exit_reasons.items():
-        wins = len([t for t in data['trades'] if t['account_pnl'] > 0])
-        losses = len([t for t in data['trades'] if t['account_pnl'] < 0])
-        breakevens = len([t for t in data['trades'] if t['account_pnl'] == 0])
-        
-        exit_stats[reason] = {
-            'avg_return': round(data['total_pnl'] / data['count'], 2),
-            'win_rate': round((wins / data['count']) * 100, 1),
-            'frequency': round((data['count'] / len(trades)) * 100, 1),
-            'count': data['count'],
-            'wins': wins,
-            'losses': losses,
-            'breakevens': breakevens,
-            'total_pnl': round(data['total_pnl'], 2)
-        }
-    
-    # Performance Trends calculation
-    from datetime import datetime
-    import calendar
+    # Equity curve and window stats for the optional ?start=&end= range
+    start, end = date_arg('start'), date_arg('end')
+    equity = cached_equity_series(conn, view_user_id, version)
     
-    # Monthly performance
-    monthly_stats = {}
-    daily_stats = {'Monday': [], 'Tuesday': [], 'Wednesday': [], 'Thursday': [], 'Friday': [], 'Saturday': [], 'Sunday': []}
-    
-    for trade in trades:
-        # Monthly stats
-        trade_date = datetime.strptime(trade['date'], '%Y-%m-%d')
-        month_key = trade_date.strftime('%Y-%m')
-        month_name = trade_date.strftime('%B %Y')
-        
-        if month_key not in monthly_stats:
-            monthly_stats[month_key] = {'trades': [], 'month_name': month_name}
-        monthly_stats[month_key]['trades'].append(trade)
-        
-        # Daily stats
-        day_name = trade_date.strftime('%A')
-        daily_stats[day_name].append(trade)
-    
-    # Calculate monthly performance
-    monthly_performance = {}
-    for month_key, data in monthly_stats.items():
-        trades_list = data['trades']
-        wins = len([t for t in trades_list if t['account_pnl'] > 0])
-        total_pnl = sum([t['account_pnl'] for t in trades_list])
-        
-        monthly_performance[month_key] = {
-            'month_name': data['month_name'],
-            'total_trades': len(trades_list),
-            'win_rate': round((wins / len(trades_list)) * 100, 1) if trades_list else 0,
-            'total_pnl': round(total_pnl, 2),
-            'avg_trade': round(total_pnl / len(trades_list), 2) if trades_list else 0
-        }
-    
-    # Calculate daily performance
-    daily_performance = {}
-    for day, trades_list in daily_stats.items():
-        if trades_list:
-            wins = len([t for t in trades_list if t['account_pnl'] > 0])
-            total_pnl = sum([t['account_pnl'] for t in trades_list])
-            
-            daily_performance[day] = {
-                'total_trades': len(trades_list),
-                'win_rate': round((wins / len(trades_list)) * 100, 1),
-                'total_pnl': round(total_pnl, 2),
-                'avg_trade': round(total_pnl / len(trades_list), 2)
-            }
-        else:
-            daily_performance[day] = {
-                'total_trades': 0,
-                'win_rate': 0,
-                'total_pnl': 0,
-                'avg_trade': 0
-            }
-    
-    # Calculate streaks
-    current_streak = 0
-    longest_win_streak = 0
-    longest_loss_streak = 0
-    temp_win_streak = 0
-    temp_loss_streak = 0
-    
-    # Sort trades by date for streak calculation
-    sorted_trades = sorted(trades, key=lambda x: x['date'])
-    
-    for trade in sorted_trades:
-        if trade['account_pnl'] > 0:  # Win
-            temp_win_streak += 1
-            temp_loss_streak = 0
-            longest_win_streak = max(longest_win_streak, temp_win_streak)
-        elif trade['account_pnl'] < 0:  # Loss
-            temp_loss_streak += 1
-            temp_win_streak = 0
-            longest_loss_streak = max(longest_loss_streak, temp_loss_streak)
-        # Breakeven doesn't break streaks in this logic
-    
-    # Current streak (last trade determines)
-    if sorted_trades:
-        if sorted_trades[-1]['account_pnl'] > 0:
-            current_streak = temp_win_streak
-        elif sorted_trades[-1]['account_pnl'] < 0:
-            current_streak = -temp_loss_streak
-        else:
-            current_streak = 0
-    
-    performance_trends = {
-        'monthly': dict(sorted(monthly_performance.items(), reverse=True)),
-        'daily': daily_performance,
-        'streaks': {
-            'current': current_streak,
-            'longest_win': longest_win_streak,
-            'longest_loss': longest_loss_streak
-        }
-    }
-    
-    return render_template('advanced_stats.html', 
-                         trades=trades, 
+    return cacheable(make_response(render_template('advanced_stats.html', 
+                         trade_count=trade_count, 
                          exit_stats=exit_stats, 
                          performance_trends=performance_trends,
+                         equity_window=equity.window(start, end),
+                         equity_chart=equity_chart(equity.curve(start, end)),
+                         start=start,
+                         end=end,
                          viewed_user=viewed_user,
                          all_users=all_users,
-                         current_view_user_id=view_user_id)
+                         current_view_user_id=view_user_id)), etag)
 
-# NEW CALENDAR ROUTES
+# Load the user's trades once into columns and derive every breakdown from them
+def load_advanced_stats(conn, user_id):
+    columns = load_trade_columns(conn, user_id)
+    if not columns:
+        return 0, {}, {}
+    exit_stats, performance_trends = compute_advanced_stats(columns)
+    performance_trends['monthly'] = monthly_performance(conn, user_id)
+    return len(columns), exit_stats, performance_trends
 
-@app.route('/calendar')
-@login_required
-def calendar_view():
-    # Get current month/year from query params or default to current
-    year = request.args.get('year', datetime.now().year, type=int)
-    month = request.args.get('month', datetime.now().month, type=int)
-    
-    # Handle month/year navigation
+# Computed data shared by the HTML pages and the JSON API, cached per data
+# version so polling either one never recomputes an unchanged result
+def cached_summary_stats(conn, user_id, version):
+    return stats_cache.get_or_compute(('summary', user_id, version),
+                                      lambda: summary_stats(load_user_stats(conn, user_id)))
+
+def cached_advanced_stats(conn, user_id, version):
+    return stats_cache.get_or_compute(('advanced', user_id, version),
+                                      lambda: load_advanced_stats(conn, user_id))
+
+def cached_equity_series(conn, user_id, version):
+    return stats_cache.get_or_compute(('equity', user_id, version), lambda: load_equity_series(conn, user_id))
+
+def cached_leaderboard(conn, version, start, end):
+    return stats_cache.get_or_compute(('leaderboard', version, start, end),
+                                      lambda: load_leaderboard(conn, start, end))
+
+def cached_heatmap(conn, user_id, version, start, end):
+    return stats_cache.get_or_compute(('heatmap', user_id, version, start, end),
+                                      lambda: heatmap_grid(load_daily_pnl(conn, user_id, start.isoformat(), end.isoformat()),
+                                                           start, end))
+
+def cached_calendar_month(conn, user_id, version, year, month):
+    return stats_cache.get_or_compute(('calendar', user_id, version, year, month),
+                                      lambda: load_calendar_month(conn, user_id, year, month))
+
+# A series' rule dates depend only on the rule, so they are cached per
+# (series, month) across data versions; editing other events or trades
+# never recomputes them
+def cached_month_dates(series, year, month):
+    return occurrence_cache.get_or_compute(('occurrences', series_key(series), year, month),
+                                           lambda: month_dates(series, year, month))
+
+# Occurrences of the user's recurring events in start <= day < end (dates)
+def load_occurrences(conn, user_id, start, end):
+    return series_occurrences(load_series(conn, user_id),
+                              load_exceptions(conn, user_id, start.isoformat(), end.isoformat()),
+                              start, end, expand=cached_month_dates)
+
+# Occurrences for an event export, from ?start= (or the earliest date one
+# can fall on) through ?end=, but never past EXPORT_OCCURRENCE_DAYS from
+# today.  Expanded without the occurrence cache so a long export doesn't
+# evict the calendar's months.
+def load_export_occurrences(conn, user_id, start, end):
+    first = conn.execute('''
+        SELECT MIN(day) FROM (
+            SELECT start_date AS day FROM event_series WHERE user_id = ?
+            UNION ALL
+            SELECT event_exceptions.event_date FROM event_series
+            JOIN event_exceptions ON event_exceptions.series_id = event_series.id
+            WHERE event_series.user_id = ?
+        )
+    ''', (user_id, user_id)).fetchone()[0]
+    if first is None:
+        return []
+    horizon = datetime.now().date() + timedelta(days=EXPORT_OCCURRENCE_DAYS)
+    range_start = max(parse_date(start), parse_date(first)) if start else parse_date(first)
+    range_end = min(parse_date(end) + timedelta(days=1), horizon) if end else horizon
+    if range_start >= range_end:
+        return []
+    return series_occurrences(load_series(conn, user_id),
+                              load_exceptions(conn, user_id, range_start.isoformat(), range_end.isoformat()),
+                              range_start, range_end)
+
+def cached_event_impact(conn, user_id, version, before, after, start, end):
+    return stats_cache.get_or_compute(('event_impact', user_id, version, before, after, start, end),
+                                      lambda: load_user_event_impact(conn, user_id, before, after, start, end))
+
+# Event impact over the user's trades between start and end (inclusive,
+# either optional).  Only events whose window can reach one of those trades
+# are read, and recurring events are expanded for just that span.
+def load_user_event_impact(conn, user_id, before, after, start, end):
+    first, last = trade_date_span(conn, user_id)
+    occurrences, events_start, events_end = [], '', ''
+    if first is not None:
+        events_from = parse_date(start or first) - timedelta(days=after)
+        events_to = parse_date(end or last) + timedelta(days=before)
+        if events_from <= events_to:
+            events_start, events_end = events_from.isoformat(), events_to.isoformat()
+            occurrences = [(event['event_date'], event['event_type'], event['importance'])
+                           for event in load_occurrences(conn, user_id, events_from, events_to + timedelta(days=1))]
+    return load_event_impact(conn, user_id, occurrences, events_start, events_end, before, after, start, end)
+
+# ?before=&after= window in days around each event
+def event_window_args():
+    before = request.args.get('before', 0, type=int)
+    after = request.args.get('after', 0, type=int)
+    if not (0 <= before <= EVENT_WINDOW_MAX and 0 <= after <= EVENT_WINDOW_MAX):
+        abort(400)
+    return before, after
+
+# Wrap month navigation that stepped past either end of the year
+def normalize_month(year, month):
     if month < 1:
-        month = 12
-        year -= 1
-    elif month > 12:
-        month = 1
-        year += 1
-    
-    conn = get_db_connection()
-    
+        return year - 1, 12
+    if month > 12:
+        return year + 1, 1
+    return year, month
+
+# Events grouped by date and daily P&L for one calendar month
+def load_calendar_month(conn, user_id, year, month):
+    month_start, month_end = month_bounds(year, month)
+
     # Get all economic events for the current month
     events = conn.execute('''
-        SELECT * FROM economic_events 
-        WHERE user_id = ? AND strftime('%Y-%m', event_date) = ?
+        SELECT * FROM economic_events
+        WHERE user_id = ? AND event_date >= ? AND event_date < ?
         ORDER BY event_date ASC
-    ''', (session['user_id'], f"{year:04d}-{month:02d}")).fetchall()
-    
-    # Get trading days with P&L for the month
-    trades = conn.execute('''
-        SELECT date, SUM(account_pnl) as daily_pnl, COUNT(*) as trade_count
-        FROM trades 
-        WHERE user_id = ? AND strftime('%Y-%m', date) = ?
-        GROUP BY date
-        ORDER BY date ASC
-    ''', (session['user_id'], f"{year:04d}-{month:02d}")).fetchall()
-    
-    conn.close()
-    
-    # Create calendar data structure
-    month_calendar = cal.monthcalendar(year, month)
+    ''', (user_id, month_start, month_end)).fetchall()
+
+    # Trading days with P&L for the month, from the daily rollup
+    trades = load_daily_pnl(conn, user_id, month_start, month_end)
     
-    # Convert events to dict by date for easy lookup
+    # Convert events to dict by date for easy lookup; occurrences of
+    # recurring events follow the one-off events of the same day
     events_by_date = {}
-    for event in events:
+    for event in [dict(event) for event in events] + load_occurrences(conn, user_id, *month_range(year, month)):
         event_date = event['event_date']
         if event_date not in events_by_date:
             events_by_date[event_date] = []
@@ -607,9 +934,29 @@ def calendar_view():
     trades_by_date = {}
     for trade in trades:
         trades_by_date[trade['date']] = {
-            'pnl': round(trade['daily_pnl'], 2),  # Round to 2 decimal places
+            'pnl': round(trade['total_pnl'], 2),  # Round to 2 decimal places
             'count': trade['trade_count']
         }
+    return events_by_date, trades_by_date
+
+# NEW CALENDAR ROUTES
+
+@app.route('/calendar')
+@login_required
+def calendar_view():
+    # Get current month/year from query params or default to current
+    year = request.args.get('year', datetime.now().year, type=int)
+    month = request.args.get('month', datetime.now().month, type=int)
+    
+    # Handle month/year navigation
+    year, month = normalize_month(year, month)
+    
+    conn = get_db_connection()
+    events_by_date, trades_by_date = cached_calendar_month(conn, session['user_id'],
+                                                          data_version(conn, session['user_id']), year, month)
+    
+    # Create calendar data structure
+    month_calendar = cal.monthcalendar(year, month)
     
     # Calculate navigation dates
     prev_month = month - 1 if month > 1 else 12
@@ -630,6 +977,219 @@ def calendar_view():
                          next_year=next_year,
                          today=datetime.now().date())
 
+# Ranked full-text search over the logged-in user's trades and events
+@app.route('/search')
+@login_required
+def search():
+    text = request.args.get('q', '').strip()
+    kind = request.args.get('kind', 'trades')
+    if kind not in ('trades', 'events'):
+        abort(400)
+    page = max(request.args.get('page', 1, type=int), 1)
+    
+    if not app.config.get('SEARCH_ENABLED', True):
+        flash('Search is not available on this server.', 'error')
+        return render_template('search.html', q=text, kind=kind, hits=[], series_hits=[], total=0, limited=False,
+                               page=1, pages=0)
+    
+    conn = get_db_connection()
+    version = data_version(conn, session['user_id'])
+    etag = page_etag(version)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    
+    hits, total = search_journal(conn, session['user_id'], kind, text, page)
+    # Matching recurring events are listed above the first page of events
+    series_hits = search_series(conn, session['user_id'], text) if kind == 'events' and page == 1 else []
+    for hit in series_hits:
+        hit['schedule'] = describe_series(hit)
+    return cacheable(make_response(render_template('search.html',
+                         q=text,
+                         kind=kind,
+                         hits=hits,
+                         series_hits=series_hits,
+                         total=total,
+                         limited=total >= SEARCH_RANK_POOL,
+                         page=page,
+                         pages=-(-total // SEARCH_PAGE_SIZE))), etag)
+
+# How trades around economic events compare with trades on normal days
+@app.route('/event_impact')
+@login_required
+def event_impact():
+    before, after = event_window_args()
+    start, end = date_arg('start'), date_arg('end')
+    
+    conn = get_db_connection()
+    version = data_version(conn, session['user_id'])
+    etag = page_etag(version)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    
+    impact = cached_event_impact(conn, session['user_id'], version, before, after, start, end)
+    return cacheable(make_response(render_template('event_impact.html',
+                         impact=impact,
+                         before=before,
+                         after=after,
+                         window_max=EVENT_WINDOW_MAX,
+                         start=start,
+                         end=end)), etag)
+
+# Every user's stats side by side, over an optional ?start=&end= range
+@app.route('/compare')
+@login_required
+def compare():
+    start, end = date_arg('start'), date_arg('end')
+    sort = request.args.get('sort', 'total_pnl')
+    if sort not in LEADERBOARD_SORTS:
+        abort(400)
+    
+    conn = get_db_connection()
+    version = journal_version(conn)
+    etag = page_etag(version)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    
+    board = sort_leaderboard(cached_leaderboard(conn, version, start, end), sort)
+    return cacheable(make_response(render_template('compare.html',
+                         board=board,
+                         sort=sort,
+                         start=start,
+                         end=end)), etag)
+
+# Year-at-a-glance P&L heatmap, or any ?start=&end= range (end inclusive)
+@app.route('/heatmap')
+@login_required
+def heatmap():
+    view_user_id = request.args.get('user', session['user_id'], type=int)
+    conn = get_db_connection()
+    viewed_user = conn.execute('SELECT * FROM users WHERE id = ?', (view_user_id,)).fetchone()
+    if not viewed_user:
+        flash('User not found', 'error')
+        return redirect(url_for('heatmap'))
+    
+    # A year outside what dates can hold, or one that isn't a number, is a bad
+    # request; a range longer than HEATMAP_MAX_DAYS is cut short so the grid
+    # stays a bounded size
+    start, end = date_arg('start'), date_arg('end')
+    try:
+        if start:
+            start = datetime.strptime(start, '%Y-%m-%d').date()
+            end = datetime.strptime(end, '%Y-%m-%d').date() + timedelta(days=1) if end else start + timedelta(days=365)
+            year = None
+        else:
+            year = int(request.args.get('year', datetime.now().year))
+            start, end = datetime(year, 1, 1).date(), datetime(year + 1, 1, 1).date()
+        if end <= start:
+            abort(400)
+        end = min(end, start + timedelta(days=HEATMAP_MAX_DAYS))
+    except (ValueError, OverflowError):
+        abort(400)
+    
+    version = data_version(conn, view_user_id)
+    etag = page_etag(version)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    
+    all_users = conn.execute('SELECT id, username, display_name FROM users ORDER BY display_name').fetchall()
+    weeks, summary = cached_heatmap(conn, view_user_id, version, start, end)
+    
+    return cacheable(make_response(render_template('heatmap.html',
+                         weeks=weeks,
+                         summary=summary,
+                         year=year,
+                         start=start,
+                         end=end - timedelta(days=1),
+                         viewed_user=viewed_user,
+                         all_users=all_users,
+                         current_view_user_id=view_user_id)), etag)
+
+# Read-only JSON API.  Each endpoint returns the same cached data the
+# matching page renders and answers conditional GETs from the data version.
+def api_user_id(conn):
+    user_id = request.args.get('user', session['user_id'], type=int)
+    if not conn.execute('SELECT 1 FROM users WHERE id = ?', (user_id,)).fetchone():
+        abort(404)
+    return user_id
+
+def api_response(version, build):
+    etag = data_etag(version)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    return cacheable(jsonify(build()), etag)
+
+@app.route('/api/trades')
+@login_required
+def api_trades():
+    conn = get_db_connection()
+    user_id = api_user_id(conn)
+    
+    def build():
+        trades, next_cursor = fetch_trade_page(conn, user_id, decode_cursor(request.args.get('cursor')),
+                                               trade_page_size())
+        return {'trades': [dict(trade) for trade in trades], 'next_cursor': next_cursor}
+    return api_response(data_version(conn, user_id), build)
+
+@app.route('/api/stats')
+@login_required
+def api_stats():
+    conn = get_db_connection()
+    user_id = api_user_id(conn)
+    version = data_version(conn, user_id)
+    return api_response(version, lambda: cached_summary_stats(conn, user_id, version))
+
+@app.route('/api/advanced_stats')
+@login_required
+def api_advanced_stats():
+    conn = get_db_connection()
+    user_id = api_user_id(conn)
+    version = data_version(conn, user_id)
+    
+    def build():
+        trade_count, exit_stats, performance_trends = cached_advanced_stats(conn, user_id, version)
+        start, end = date_arg('start'), date_arg('end')
+        equity = cached_equity_series(conn, user_id, version)
+        return {'trade_count': trade_count, 'exit_stats': exit_stats, **performance_trends,
+                'equity': {**equity.window(start, end), 'curve': equity.curve(start, end)}}
+    return api_response(version, build)
+
+@app.route('/api/calendar')
+@login_required
+def api_calendar():
+    year, month = normalize_month(request.args.get('year', datetime.now().year, type=int),
+                                  request.args.get('month', datetime.now().month, type=int))
+    conn = get_db_connection()
+    version = data_version(conn, session['user_id'])
+    
+    def build():
+        events_by_date, trades_by_date = cached_calendar_month(conn, session['user_id'], version, year, month)
+        return {'year': year, 'month': month, 'events': events_by_date, 'days': trades_by_date}
+    return api_response(version, build)
+
+@app.route('/api/event_impact')
+@login_required
+def api_event_impact():
+    before, after = event_window_args()
+    start, end = date_arg('start'), date_arg('end')
+    conn = get_db_connection()
+    version = data_version(conn, session['user_id'])
+    return api_response(version, lambda: cached_event_impact(conn, session['user_id'], version,
+                                                             before, after, start, end))
+
+# Official schedule for each event type
+EVENT_SOURCE_URLS = {
+    'FOMC': 'https://www.federalreserve.gov/monetarypolicy/fomccalendars.htm',
+    'NFP': 'https://www.bls.gov/schedule/news_release/empsit.htm',
+    'WASDE': 'https://www.usda.gov/about-usda/general-information/staff-offices/office-chief-economist/commodity-markets/wasde-report',
+    'Petroleum': 'https://www.eia.gov/petroleum/supply/weekly/schedule.php',
+    'Other': ''
+}
+
 @app.route('/add_event', methods=['GET', 'POST'])
 @login_required
 def add_event():
@@ -641,30 +1201,40 @@ def add_event():
         importance = request.form['importance']
         
         # Get source URL based on event type
-        source_urls = {
-            'FOMC': 'https://www.federalreserve.gov/monetarypolicy/fomccalendars.htm',
-            'NFP': 'https://www.bls.gov/schedule/news_release/empsit.htm',
-            'WASDE': 'https://www.usda.gov/about-usda/general-information/staff-offices/office-chief-economist/commodity-markets/wasde-report',
-            'Petroleum': 'https://www.eia.gov/petroleum/supply/weekly/schedule.php',
-            'Other': ''
-        }
-        source_url = source_urls.get(event_type, '')
+        source_url = EVENT_SOURCE_URLS.get(event_type, '')
         
         # Validate required fields
         if not all([event_type, event_date, title]):
             flash('Event type, date, and title are required.', 'error')
-            return render_template('add_event.html')
+            return render_template('add_event.html', selected_date=event_date)
+        
+        # A repeating event is stored once as a series and expanded when
+        # the calendar is shown
+        repeat = request.form.get('repeat', '')
+        if repeat:
+            try:
+                rule = build_series_rule(repeat, event_date, request.form.get('interval'),
+                                         request.form.get('repeat_until'), request.form.get('dates', ''))
+            except ValueError as e:
+                flash(str(e), 'error')
+                return render_template('add_event.html', selected_date=event_date)
         
         # Insert into database
-        conn = get_db_connection()
-        conn.execute('''
-            INSERT INTO economic_events (user_id, event_type, event_date, title, description, importance, source_url)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (session['user_id'], event_type, event_date, title, description, importance, source_url))
-        conn.commit()
-        conn.close()
+        if repeat:
+            write_queue.execute(execute_write, '''
+                INSERT INTO event_series (user_id, event_type, title, description, importance, source_url,
+                                          rule, start_date, end_date, interval, week_of_month, dates)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (session['user_id'], event_type, title, description, importance, source_url, rule['rule'],
+                  rule['start_date'], rule['end_date'], rule['interval'], rule['week_of_month'], rule['dates']))
+            event_date = rule['start_date']
+        else:
+            write_queue.execute(execute_write, '''
+                INSERT INTO economic_events (user_id, event_type, event_date, title, description, importance, source_url)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (session['user_id'], event_type, event_date, title, description, importance, source_url))
         
-        flash(f'Event "{title}" added successfully!', 'success')
+        flash(f'{"Recurring event" if repeat else "Event"} "{title}" added successfully!', 'success')
         
         # Extract year and month from event_date to redirect to correct month
         event_datetime = datetime.strptime(event_date, '%Y-%m-%d')
@@ -688,22 +1258,13 @@ def edit_event(event_id):
         importance = request.form['importance']
         
         # Get source URL based on event type
-        source_urls = {
-            'FOMC': 'https://www.federalreserve.gov/monetarypolicy/fomccalendars.htm',
-            'NFP': 'https://www.bls.gov/schedule/news_release/empsit.htm',
-            'WASDE': 'https://www.usda.gov/about-usda/general-information/staff-offices/office-chief-economist/commodity-markets/wasde-report',
-            'Petroleum': 'https://www.eia.gov/petroleum/supply/weekly/schedule.php',
-            'Other': ''
-        }
-        source_url = source_urls.get(event_type, '')
+        source_url = EVENT_SOURCE_URLS.get(event_type, '')
         
-        conn.execute('''
+        write_queue.execute(execute_write, '''
             UPDATE economic_events 
             SET event_type=?, event_date=?, title=?, description=?, importance=?, source_url=?
             WHERE id=? AND user_id=?
         ''', (event_type, event_date, title, description, importance, source_url, event_id, session['user_id']))
-        conn.commit()
-        conn.close()
         
         flash('Event updated successfully!', 'success')
         
@@ -712,7 +1273,6 @@ def edit_event(event_id):
         return redirect(url_for('calendar_view', year=event_datetime.year, month=event_datetime.month))
     
     event = conn.execute('SELECT * FROM economic_events WHERE id = ? AND user_id = ?', (event_id, session['user_id'])).fetchone()
-    conn.close()
     
     if event is None:
         flash('Event not found or access denied.', 'error')
@@ -735,13 +1295,391 @@ def delete_event(event_id):
     # Extract year and month from event_date for redirect
     event_datetime = datetime.strptime(event['event_date'], '%Y-%m-%d')
     
-    conn.execute('DELETE FROM economic_events WHERE id = ? AND user_id = ?', (event_id, session['user_id']))
-    conn.commit()
-    conn.close()
+    write_queue.execute(execute_write, 'DELETE FROM economic_events WHERE id = ? AND user_id = ?', (event_id, session['user_id']))
     
     flash(f'Event "{event["title"]}" deleted successfully!', 'success')
     return redirect(url_for('calendar_view', year=event_datetime.year, month=event_datetime.month))
 
+# The logged-in user's series and one of its occurrences, or a redirect to
+# the calendar when either doesn't exist
+def find_occurrence(conn, series_id, occurrence_date):
+    series = conn.execute('SELECT * FROM event_series WHERE id = ? AND user_id = ?',
+                          (series_id, session['user_id'])).fetchone()
+    try:
+        valid = series is not None and is_occurrence(series, parse_date(occurrence_date))
+    except ValueError:
+        valid = False
+    if not valid:
+        flash('Event not found or access denied.', 'error')
+        return None, redirect(url_for('calendar_view'))
+    return series, None
+
+def calendar_redirect(event_date):
+    try:
+        event_datetime = datetime.strptime(event_date, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return redirect(url_for('calendar_view'))
+    return redirect(url_for('calendar_view', year=event_datetime.year, month=event_datetime.month))
+
+# Edit one occurrence of a recurring event, or with scope=series the title,
+# type, description and importance of every occurrence
+@app.route('/edit_occurrence/<int:series_id>/<occurrence_date>', methods=['GET', 'POST'])
+@login_required
+def edit_occurrence(series_id, occurrence_date):
+    conn = get_db_connection()
+    series, missing = find_occurrence(conn, series_id, occurrence_date)
+    if missing:
+        return missing
+    exception = conn.execute('SELECT * FROM event_exceptions WHERE series_id = ? AND occurrence_date = ?',
+                             (series_id, occurrence_date)).fetchone()
+    
+    if request.method == 'POST':
+        event_date = request.form['event_date']
+        title = request.form['title'].strip()
+        description = request.form.get('description', '').strip()
+        importance = request.form['importance']
+        if not all([event_date, title]):
+            flash('Date and title are required.', 'error')
+            return redirect(url_for('edit_occurrence', series_id=series_id, occurrence_date=occurrence_date))
+        try:
+            event_date = datetime.strptime(event_date, '%Y-%m-%d').strftime('%Y-%m-%d')
+        except ValueError:
+            flash('Event date must be a valid YYYY-MM-DD date.', 'error')
+            return redirect(url_for('edit_occurrence', series_id=series_id, occurrence_date=occurrence_date))
+        
+        if request.form.get('scope') == 'series':
+            event_type = request.form['event_type']
+            write_queue.execute(execute_write, '''
+                UPDATE event_series SET event_type=?, title=?, description=?, importance=?, source_url=?
+                WHERE id=? AND user_id=?
+            ''', (event_type, title, description, importance, EVENT_SOURCE_URLS.get(event_type, ''),
+                  series_id, session['user_id']))
+            flash('Recurring event updated successfully!', 'success')
+            event_date = exception['event_date'] if exception and exception['event_date'] else occurrence_date
+        else:
+            # Only what differs from the series is stored, so later edits to
+            # the series still reach the fields this occurrence kept
+            overrides = [None if value == series[column] else value for column, value in
+                         (('title', title), ('description', description), ('importance', importance))]
+            write_queue.execute(execute_write, '''
+                INSERT INTO event_exceptions (series_id, occurrence_date, cancelled, event_date, title, description, importance)
+                VALUES (?, ?, 0, ?, ?, ?, ?)
+                ON CONFLICT (series_id, occurrence_date) DO UPDATE SET
+                    cancelled = 0, event_date = excluded.event_date, title = excluded.title,
+                    description = excluded.description, importance = excluded.importance
+            ''', (series_id, occurrence_date, None if event_date == occurrence_date else event_date, *overrides))
+            flash('Event updated successfully!', 'success')
+        return calendar_redirect(event_date)
+    
+    return render_template('edit_occurrence.html',
+                         event=make_occurrence(series, occurrence_date, exception),
+                         series=series,
+                         rule_text=describe_series(series))
+
+# Cancel one occurrence of a recurring event
+@app.route('/delete_occurrence/<int:series_id>/<occurrence_date>')
+@login_required
+def delete_occurrence(series_id, occurrence_date):
+    conn = get_db_connection()
+    series, missing = find_occurrence(conn, series_id, occurrence_date)
+    if missing:
+        return missing
+    
+    write_queue.execute(execute_write, '''
+        INSERT INTO event_exceptions (series_id, occurrence_date, cancelled) VALUES (?, ?, 1)
+        ON CONFLICT (series_id, occurrence_date) DO UPDATE SET cancelled = 1
+    ''', (series_id, occurrence_date))
+    
+    flash(f'Event "{series["title"]}" on {occurrence_date} deleted successfully!', 'success')
+    return calendar_redirect(occurrence_date)
+
+# Delete a recurring event with all its occurrences
+@app.route('/delete_series/<int:series_id>')
+@login_required
+def delete_series(series_id):
+    conn = get_db_connection()
+    series = conn.execute('SELECT title, start_date FROM event_series WHERE id = ? AND user_id = ?',
+                          (series_id, session['user_id'])).fetchone()
+    if not series:
+        flash('Event not found or access denied.', 'error')
+        return redirect(url_for('calendar_view'))
+    
+    write_queue.execute(execute_write, 'DELETE FROM event_series WHERE id = ? AND user_id = ?', (series_id, session['user_id']))
+    
+    flash(f'Recurring event "{series["title"]}" deleted successfully!', 'success')
+    return redirect(url_for('calendar_view'))
+
+# Maintenance commands (run with `flask --app app <command>`)
+
+QUERY_PLAN_TABLES = ('trades', 'economic_events', 'daily_pnl')
+# Logging out would end the session the check renders pages with
+QUERY_PLAN_SKIP = ('static', 'logout')
+
+@app.cli.command('check-query-plans')
+def check_query_plans():
+    """Render every GET route against a copy of the database and fail if a query scans one of the journal tables or only half-uses an index for its ORDER BY."""
+    init_db()
+    # Some GET routes change data (delete_trade, export_snapshot, ...), so
+    # the routes run against a throwaway copy of the database with its own
+    # upload and snapshot folders; the real journal is only read once, by
+    # the backup
+    live_config = {key: app.config[key] for key in ('DATABASE', 'UPLOAD_FOLDER', 'SNAPSHOT_FOLDER')}
+    workdir = tempfile.mkdtemp(prefix='query-plans-')
+    path = os.path.join(workdir, 'journal.db')
+    source, copy = connect(live_config['DATABASE']), sqlite3.connect(path)
+    try:
+        source.backup(copy)
+    finally:
+        source.close()
+        copy.close()
+    create_app({'DATABASE': path, 'UPLOAD_FOLDER': os.path.join(workdir, 'screenshots'),
+                'SNAPSHOT_FOLDER': os.path.join(workdir, 'snapshots')})
+    os.makedirs(app.config['UPLOAD_FOLDER'])
+    try:
+        failures = trace_query_plans(path)
+    finally:
+        write_queue.shutdown(wait=True)
+        screenshot_processor.shutdown(wait=True)
+        create_app(live_config)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if failures:
+        raise click.ClickException(f'{failures} queries scan or partly sort {"/".join(QUERY_PLAN_TABLES)}')
+    print('No route scans or partly sorts trades, economic_events or daily_pnl')
+
+# Request every GET route as the busiest user and print the plan of each
+# query that touches a journal table; returns how many of them scan one or
+# sort the "right part" of an ORDER BY (an index matched only its prefix)
+def trace_query_plans(path):
+    conn = connect(path)
+    user = conn.execute('''
+        SELECT users.* FROM users LEFT JOIN trades ON trades.user_id = users.id
+        GROUP BY users.id ORDER BY COUNT(trades.id) DESC LIMIT 1
+    ''').fetchone()
+    sample_args = {
+        'trade_id': conn.execute('SELECT id FROM trades WHERE user_id = ? LIMIT 1', (user['id'],)).fetchone(),
+        'event_id': conn.execute('SELECT id FROM economic_events WHERE user_id = ? LIMIT 1', (user['id'],)).fetchone(),
+        'series_id': conn.execute('SELECT id FROM event_series WHERE user_id = ? ORDER BY id LIMIT 1', (user['id'],)).fetchone(),
+        'occurrence_date': conn.execute('SELECT start_date FROM event_series WHERE user_id = ? ORDER BY id LIMIT 1',
+                                        (user['id'],)).fetchone(),
+        'kind': ('trades',),
+    }
+
+    # Capture the fully bound SQL of every statement the routes execute
+    statements = []
+    def trace(conn):
+        conn.set_trace_callback(statements.append)
+    db_pool.reset()
+    db_pool.on_connect.append(trace)
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user['id']
+        sess['username'] = user['username']
+        sess['display_name'] = user['display_name']
+
+    # Deleting routes go last so the others still find the sample rows
+    rules = sorted(app.url_map.iter_rules(), key=lambda rule: rule.endpoint.startswith('delete_'))
+    try:
+        for rule in rules:
+            if 'GET' not in rule.methods or rule.endpoint in QUERY_PLAN_SKIP:
+                continue
+            values = {}
+            for arg in rule.arguments:
+                row = sample_args.get(arg)
+                if row is None:
+                    break
+                values[arg] = row[0]
+            else:
+                with app.test_request_context():
+                    url = url_for(rule.endpoint, **values)
+                client.get(url).close()
+    finally:
+        db_pool.on_connect.remove(trace)
+        db_pool.reset()
+
+    failures = 0
+    for sql in dict.fromkeys(statements):
+        if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+            continue
+        plan = [row['detail'] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql)]
+        steps = [detail.split() for detail in plan if detail.startswith(('SCAN ', 'SEARCH '))]
+        if not any(step[1] in QUERY_PLAN_TABLES for step in steps):
+            continue
+        scans = [step for step in steps if step[0] == 'SCAN' and step[1] in QUERY_PLAN_TABLES]
+        partial_sorts = [detail for detail in plan if 'RIGHT PART OF ORDER BY' in detail]
+        failed = bool(scans or partial_sorts)
+        print(('FAIL ' if failed else 'ok   ') + ' '.join(sql.split()))
+        for detail in plan:
+            print('       ' + detail)
+        failures += failed
+    conn.close()
+    return failures
+
+@app.cli.command('compress-assets')
+def compress_assets_command():
+    """Write precompressed copies of the static CSS and JS next to the originals."""
+    written, skipped = compress_assets(app.static_folder)
+    encodings = ', '.join(encoding for encoding, _ in available_encodings())
+    print(f'Wrote {written} compressed files ({encodings}); {skipped} were already up to date')
+
+@app.cli.command('rebuild-user-stats')
+@click.option('--check', is_flag=True, help='Only verify user_stats and daily_pnl against the trades table.')
+def rebuild_user_stats_command(check):
+    """Recompute the user_stats and daily_pnl summary tables from the trades table."""
+    init_db()
+    conn = connect(app.config['DATABASE'])
+    drift = user_stats_drift(conn)
+    for user_id, column, stored, actual in drift:
+        print(f'user {user_id}: {column} is {stored}, trades say {actual}')
+
+    if check:
+        daily_drift = daily_pnl_drift(conn)
+        conn.close()
+        for user_id, day, column, stored, actual in daily_drift:
+            print(f'user {user_id} on {day}: {column} is {stored}, trades say {actual}')
+        if drift or daily_drift:
+            raise click.ClickException(
+                f'Summary tables are out of date ({len(drift) + len(daily_drift)} values differ)')
+        print('user_stats and daily_pnl are consistent with trades')
+        return
+
+    rebuild_user_stats(conn)
+    remaining = user_stats_drift(conn)
+    users = conn.execute('SELECT COUNT(*) FROM user_stats').fetchone()[0]
+    if remaining:
+        conn.close()
+        raise click.ClickException(f'{len(remaining)} values still differ after rebuild')
+    print(f'Rebuilt user_stats for {users} users ({len(drift)} values corrected)')
+    
+    daily_drift = daily_pnl_drift(conn)
+    rebuild_daily_pnl(conn)
+    days = conn.execute('SELECT COUNT(*) FROM daily_pnl').fetchone()[0]
+    conn.close()
+    print(f'Rebuilt daily_pnl with {days} days ({len(daily_drift)} values corrected)')
+
+@app.cli.command('backfill-thumbnails')
+@click.option('--force', is_flag=True, help='Regenerate variants that already exist.')
+def backfill_thumbnails(force):
+    """Create thumbnail and display versions for existing screenshots."""
+    if not screenshot_processor.enabled:
+        raise click.ClickException('Pillow is not installed')
+    
+    folder = app.config['UPLOAD_FOLDER']
+    processed = skipped = failed = 0
+    for filename in original_screenshots(folder, ALLOWED_EXTENSIONS):
+        try:
+            if make_variants(folder, filename, force=force):
+                processed += 1
+            else:
+                skipped += 1
+        except Exception as e:
+            failed += 1
+            print(f'{filename}: {e}')
+    print(f'Processed {processed} screenshots ({skipped} already done, {failed} failed)')
+
+@app.cli.command('sweep-screenshots')
+@click.option('--dry-run', is_flag=True, help='Report what would be deleted without deleting it.')
+@click.option('--grace-minutes', default=60, show_default=True, help='Skip files modified more recently than this.')
+def sweep_screenshots(dry_run, grace_minutes):
+    """Delete screenshot files that no trade references."""
+    init_db()
+    conn = connect(app.config['DATABASE'])
+    report = sweep_orphans(conn, app.config['UPLOAD_FOLDER'], ALLOWED_EXTENSIONS,
+                           grace_seconds=grace_minutes * 60, dry_run=dry_run)
+    conn.close()
+    
+    verb = 'Would reclaim' if dry_run else 'Reclaimed'
+    print(f"Scanned {report['scanned']} files in {report['seconds']}s")
+    print(f"{verb} {report['reclaimed_bytes']} bytes from {report['orphans']} orphaned files")
+    print(f"Dropped {report['dead_blobs']} unreferenced blobs, corrected {report['corrected_counts']} reference counts")
+    for name in report['missing']:
+        print(f'Missing: {name} is referenced by a trade but not on disk')
+
+@app.cli.command('import-trades')
+@click.argument('file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user', 'username', required=True, help='Username whose journal receives the trades.')
+@click.option('--chunk-size', default=5000, show_default=True, help='Rows inserted per transaction.')
+def import_trades_command(file, username, chunk_size):
+    """Bulk import trades from a CSV file."""
+    init_db()
+    conn = connect(app.config['DATABASE'])
+    user = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
+    if not user:
+        raise click.ClickException(f'No user named {username}')
+    
+    def progress(report):
+        print(f'{report.imported} trades imported ({report.rows_per_second} rows/s)')
+    
+    with open(file, encoding='utf-8-sig', newline='') as stream:
+        try:
+            report = import_trades(connection_writer(conn), user['id'], stream, chunk_size=chunk_size, on_chunk=progress)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        finally:
+            conn.close()
+    
+    print(f'Imported {report.imported} of {report.rows} rows in {report.seconds:.2f}s ({report.rows_per_second} rows/s)')
+    for line, message in report.errors:
+        print(f'Line {line}: {message}')
+    if report.error_count > len(report.errors):
+        print(f'... and {report.error_count - len(report.errors)} more errors')
+    if report.stopped:
+        raise click.ClickException(f'Import stopped after {report.imported} trades were saved: {report.stopped}')
+
+@app.cli.command('snapshot')
+@click.option('--user', 'username', default=None, help='Snapshot one user instead of the whole journal.')
+@click.option('--full', is_flag=True, help='Rebuild from scratch instead of appending changed rows.')
+@click.option('--compact', is_flag=True, help='Merge each table into a single memory-mappable file.')
+@click.option('--parquet', is_flag=True, help='Also write each table as one Parquet file.')
+def snapshot_command(username, full, compact, parquet):
+    """Write Arrow snapshots of trades and economic events, appending only what changed."""
+    if not app.config['SNAPSHOTS_ENABLED']:
+        raise click.ClickException('Snapshots need pyarrow (pip install pyarrow)')
+    init_db()
+    conn = connect(app.config['DATABASE'])
+    user_id = None
+    if username:
+        user = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
+        if not user:
+            raise click.ClickException(f'No user named {username}')
+        user_id = user['id']
+    
+    path = snapshot_path(app.config['SNAPSHOT_FOLDER'], user_id)
+    started = time.perf_counter()
+    try:
+        with snapshot_lock(path):
+            written = update_snapshot(conn, path, user_id, full=full, compact=compact)
+            for name in written:
+                table = read_snapshot(path, name)
+                print(f'{name}: {written[name]} rows written, {table.num_rows} rows in snapshot')
+                if parquet:
+                    export_snapshot_table(table, 'parquet', os.path.join(path, f'{name}.parquet'))
+    finally:
+        conn.close()
+    print(f'Snapshot in {path} updated in {(time.perf_counter() - started) * 1000:.0f}ms')
+
+# Application factory for WSGI servers (see wsgi.py).  Applies config
+# overrides and points the pool and background workers at the configured
+# database; schema setup stays in init_db(), which the server runs once
+# before forking workers.
+def create_app(config=None):
+    if config:
+        app.config.update(config)
+    db_pool.reset(app.config['DATABASE'])
+    screenshot_processor.database = app.config['DATABASE']
+    screenshot_processor.folder = app.config['UPLOAD_FOLDER']
+    write_queue.shutdown(wait=True)
+    write_queue.database = app.config['DATABASE']
+    return app
+
+# Let queued writes and screenshot jobs finish and close pooled connections
+# when a worker exits
+def shutdown_app():
+    write_queue.shutdown(wait=True)
+    screenshot_processor.shutdown(wait=True)
+    db_pool.close_all()
+
 if __name__ == '__main__':
     init_db()
     print(f"Starting Trading Journal App...")
@@ -0,0 +1,149 @@
+import gzip
+import hashlib
+import os
+import threading
+
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # in requirements.txt, but without it only gzip variants are built
+    brotli = None
+
+# Fingerprinted, precompressed static assets.  Templates link CSS and JS
+# through asset_url(), which appends a hash of the file's contents, so the
+# response for a fingerprinted URL never changes and browsers may keep it for
+# a year without revalidating.  compress_assets() writes .br and .gz copies
+# next to each file once, and the static route picks the best one the
+# client accepts.
+ASSET_DIRECTORIES = ('css', 'js')
+ASSET_EXTENSIONS = ('.css', '.js')
+ASSET_MAX_AGE = 365 * 24 * 3600
+FINGERPRINT_LENGTH = 12
+
+# Precompressed variants in order of preference: (Content-Encoding, suffix)
+ASSET_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Dynamic responses that are gzipped on the fly when the client accepts it;
+# anything shorter than COMPRESS_MIN_SIZE isn't worth a gzip header
+COMPRESSIBLE_MIMETYPES = ('text/html', 'application/json')
+COMPRESS_MIN_SIZE = 500
+COMPRESS_LEVEL = 6
+
+
+class AssetManifest:
+    # Content hashes of static files, keyed by path under the folder.  A hash
+    # is recomputed only when the file's size or mtime changes, so editing an
+    # asset during development still produces a new URL.
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    def fingerprint(self, filename):
+        path = safe_join(self.folder, filename)
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            cached = self._hashes.get(filename)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:FINGERPRINT_LENGTH]
+        with self._lock:
+            self._hashes[filename] = (key, digest)
+        return digest
+
+
+def is_asset(filename):
+    return filename.endswith(ASSET_EXTENSIONS)
+
+
+# Best precompressed copy of filename for the client: (encoding, filename of
+# the copy), or (None, filename) for the file itself.  A copy older than
+# its source is ignored, so a stale variant can never be served.
+def asset_variant(folder, filename, accept_encodings):
+    if not is_asset(filename):
+        return None, filename
+    path = safe_join(folder, filename)
+    if path is None:
+        return None, filename
+    try:
+        source_mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None, filename
+
+    for encoding, suffix in ASSET_ENCODINGS:
+        if not accept_encodings.quality(encoding):
+            continue
+        try:
+            if os.stat(path + suffix).st_mtime_ns >= source_mtime:
+                return encoding, filename + suffix
+        except OSError:
+            continue
+    return None, filename
+
+
+# Encodings compress_assets() can produce here
+def available_encodings():
+    return [(encoding, suffix) for encoding, suffix in ASSET_ENCODINGS
+            if encoding != 'br' or brotli is not None]
+
+
+def compress_asset(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+# Write .br (when brotli is installed) and .gz copies of every asset in the
+# ASSET_DIRECTORIES of folder whose copies are missing or older than the
+# source.  Returns (written, skipped).
+def compress_assets(folder):
+    encodings = available_encodings()
+    written = skipped = 0
+    for directory in ASSET_DIRECTORIES:
+        for root, _, names in os.walk(os.path.join(folder, directory)):
+            for name in names:
+                if is_asset(name):
+                    done, fresh = compress_file(os.path.join(root, name), encodings)
+                    written += done
+                    skipped += fresh
+    return written, skipped
+
+
+# Copies that wouldn't be smaller than the source aren't written
+def compress_file(path, encodings):
+    source_mtime = os.stat(path).st_mtime_ns
+    data = None
+    written = skipped = 0
+
+    for encoding, suffix in encodings:
+        target = path + suffix
+        if os.path.exists(target) and os.stat(target).st_mtime_ns >= source_mtime:
+            skipped += 1
+            continue
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        compressed = compress_asset(data, encoding)
+        if len(compressed) >= len(data):
+            continue
+
+        # Write next to the target and swap it in, so a request never sees a
+        # half-written file
+        temp = target + '.tmp'
+        with open(temp, 'wb') as f:
+            f.write(compressed)
+        os.replace(temp, target)
+        written += 1
+
+    return written, skipped
@@ -0,0 +1,104 @@
+import random
+from datetime import date, datetime, timedelta
+
+# Synthetic journals for benchmarking.  The shape roughly follows real use:
+# a handful of users with very different activity, trades only on weekdays,
+# a long tail of tickers, exits that correlate with the outcome, and a
+# monthly set of economic events per user.
+TICKERS = ['SPY', 'QQQ', 'AAPL', 'TSLA', 'NVDA', 'AMD', 'MSFT', 'META', 'AMZN', 'GOOGL',
+           'NFLX', 'PLTR', 'SOFI', 'COIN', 'MARA', 'RIOT', 'SMCI', 'ARM', 'TMC', 'IWM']
+CLOSE_REASONS = {
+    'Win': (['TP', 'Other', 'No Momentum'], [0.8, 0.1, 0.1]),
+    'Loss': (['Stop Loss', 'Earnings Fail', 'No Momentum', 'Other'], [0.6, 0.15, 0.15, 0.1]),
+    'Breakeven': (['No Momentum', 'Other', 'Stop Loss'], [0.6, 0.2, 0.2]),
+}
+# The event types the add-event form offers
+EVENT_TYPES = [('FOMC', 'FOMC Meeting', 'High'), ('NFP', 'Non-Farm Payroll (NFP)', 'High'),
+               ('WASDE', 'WASDE Report', 'Medium'), ('Petroleum', 'Weekly Petroleum Report', 'Low'),
+               ('Other', 'Other Economic Event', 'Low')]
+USER_WEIGHTS = [0.6, 0.25, 0.1, 0.05]
+INSERT_CHUNK_SIZE = 10000
+
+
+def trading_days(start, end):
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            yield day
+        day += timedelta(days=1)
+
+
+def synthetic_users(conn, count=len(USER_WEIGHTS)):
+    user_ids = []
+    for n in range(count):
+        username = f'bench{n + 1}'
+        conn.execute('INSERT OR IGNORE INTO users (username, password, display_name) VALUES (?, ?, ?)',
+                     (username, username, f'Bench {n + 1}'))
+        user_ids.append(conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()[0])
+    conn.commit()
+    return user_ids
+
+
+def synthetic_trade(rng, user_id, day):
+    roll = rng.random()
+    if roll < 0.45:
+        outcome, pnl = 'Win', round(rng.lognormvariate(-0.2, 0.6), 2)
+    elif roll < 0.9:
+        outcome, pnl = 'Loss', -round(abs(rng.gauss(0.5, 0.3)) + 0.01, 2)
+    else:
+        outcome, pnl = 'Breakeven', 0.0
+    reasons, weights = CLOSE_REASONS[outcome]
+    created_at = datetime.combine(day, datetime.min.time()) + timedelta(seconds=rng.randrange(34200, 57600))
+    return (
+        user_id,
+        rng.choices(TICKERS, weights=[1 / (rank + 1) for rank in range(len(TICKERS))])[0],
+        'Long' if rng.random() < 0.6 else 'Short',
+        day.isoformat(),
+        outcome,
+        rng.choices(reasons, weights=weights)[0],
+        pnl,
+        'Followed the plan' if rng.random() < 0.3 else '',
+        created_at.strftime('%Y-%m-%d %H:%M:%S'),
+    )
+
+
+# Insert `trades` trades spread over `years` years of weekdays ending at
+# `end`.  Returns the user ids, heaviest user first.
+def generate_journal(conn, trades, years=5, end=None, seed=42):
+    rng = random.Random(seed)
+    end = end or date.today()
+    days = list(trading_days(end - timedelta(days=365 * years), end))
+    user_ids = synthetic_users(conn)
+
+    batch = []
+    for _ in range(trades):
+        user_id = rng.choices(user_ids, weights=USER_WEIGHTS)[0]
+        batch.append(synthetic_trade(rng, user_id, rng.choice(days)))
+        if len(batch) >= INSERT_CHUNK_SIZE:
+            insert_trades(conn, batch)
+            batch = []
+    if batch:
+        insert_trades(conn, batch)
+
+    events = []
+    for user_id in user_ids:
+        month = date(days[0].year, days[0].month, 1)
+        while month <= end:
+            for event_type, title, importance in EVENT_TYPES:
+                event_date = month + timedelta(days=rng.randrange(0, 28))
+                events.append((user_id, event_type, event_date.isoformat(), title, '', importance, ''))
+            month = (month + timedelta(days=32)).replace(day=1)
+    conn.executemany('''
+        INSERT INTO economic_events (user_id, event_type, event_date, title, description, importance, source_url)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', events)
+    conn.commit()
+    return user_ids
+
+
+def insert_trades(conn, batch):
+    conn.executemany('''
+        INSERT INTO trades (user_id, ticker, direction, date, outcome, close_reason, account_pnl, notes, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', batch)
+    conn.commit()
@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+from analytics import (load_user_stats, summary_stats, load_trade_columns, compute_advanced_stats,
+                       compute_streaks)
+from migrations import migrate
+from snapshots import SNAPSHOT_TABLES, full_query, read_snapshot, snapshot_path, update_snapshot
+
+# Benchmark the journal at several data sizes:
+#
+#   python -m benchmarks.run --sizes 1k 100k 1m --output results.json
+#   python -m benchmarks.run --sizes 100k --compare results.json
+#
+# Every size gets a fresh synthetic database.  Routes are timed through the
+# Flask test client, logged in as the heaviest user, with the stats cache
+# cleared before every request so the numbers reflect real work; the stats
+# computations are then timed on their own.
+DEFAULT_SIZES = ['1k', '100k']
+DEFAULT_REPEAT = 5
+
+
+def parse_size(value):
+    value = value.lower().replace('_', '')
+    multiplier = {'k': 1000, 'm': 1000000}.get(value[-1], 1)
+    return int(float(value.rstrip('km')) * multiplier)
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return {
+        'min_ms': round(samples[0] * 1000, 3),
+        'median_ms': round(statistics.median(samples) * 1000, 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3),
+        'repeat': repeat,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def route_benchmarks(A, client, user_id, repeat):
+    today = date.today()
+    first_page = client.get(f'/api/trades?user={user_id}').get_json()
+    cursor = first_page['next_cursor'] or ''
+    routes = {
+        'index': f'/?user={user_id}',
+        'trade_rows_page2': f'/trades?user={user_id}&cursor={cursor}',
+        'advanced_stats': f'/advanced_stats?user={user_id}',
+        'calendar': f'/calendar?year={today.year}&month={today.month}',
+        'heatmap': f'/heatmap?user={user_id}&year={today.year}',
+        'compare': '/compare',
+        'search_trades': '/search?q=plan',
+        'search_events': '/search?kind=events&q=FOMC',
+        'event_impact': '/event_impact?before=1&after=1',
+        'api_trades': f'/api/trades?user={user_id}',
+        'api_stats': f'/api/stats?user={user_id}',
+        'api_advanced_stats': f'/api/advanced_stats?user={user_id}',
+        'api_calendar': f'/api/calendar?year={today.year}&month={today.month}',
+        'api_event_impact': '/api/event_impact?before=1&after=1',
+        'export_trades_csv': '/export/trades',
+    }
+
+    results = {}
+    for name, url in routes.items():
+        def request():
+            A.stats_cache.clear()
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+            response.get_data()
+        results[name] = timed(request, repeat)
+    return results
+
+
+# What init_db() costs at startup once the schema is current: a fresh
+# connection and the migration version check
+def schema_check(A):
+    conn = A.connect(A.app.config['DATABASE'])
+    try:
+        migrate(conn, A.app.config)
+    finally:
+        conn.close()
+
+
+# Pulling every trade for offline analysis: a full read through SQLite
+# against loading the compacted Arrow snapshot, plus an update with nothing
+# to append
+def snapshot_benchmarks(A, conn, repeat):
+    path = snapshot_path(A.app.config['SNAPSHOT_FOLDER'])
+    update_snapshot(conn, path, full=True)
+    sql, params = full_query(*SNAPSHOT_TABLES['trades'])
+
+    def query():
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(sql, params).fetchall()
+    return {
+        'query_all_trades': timed(query, repeat),
+        'load_trade_snapshot': timed(lambda: read_snapshot(path, 'trades'), repeat),
+        'update_snapshot_unchanged': timed(lambda: update_snapshot(conn, path), repeat),
+    }
+
+
+def computation_benchmarks(A, user_id, repeat):
+    conn = A.connect(A.app.config['DATABASE'])
+    today = date.today()
+    columns = load_trade_columns(conn, user_id)
+    results = {
+        'load_user_stats': timed(lambda: summary_stats(load_user_stats(conn, user_id)), repeat),
+        'fetch_trade_page': timed(lambda: A.fetch_trade_page(conn, user_id, None, A.TRADE_PAGE_SIZE), repeat),
+        'load_trade_columns': timed(lambda: load_trade_columns(conn, user_id), repeat),
+        'compute_advanced_stats': timed(lambda: compute_advanced_stats(columns), repeat),
+        'compute_streaks': timed(lambda: compute_streaks(columns), repeat),
+        'load_calendar_month': timed(lambda: A.load_calendar_month(conn, user_id, today.year, today.month), repeat),
+        'schema_check': timed(lambda: schema_check(A), repeat),
+    }
+    if A.app.config['SNAPSHOTS_ENABLED']:
+        results.update(snapshot_benchmarks(A, conn, repeat))
+    conn.close()
+    return results
+
+
+def benchmark_size(rows, repeat, workdir):
+    import app as A
+    from benchmarks.generate import generate_journal
+
+    path = os.path.join(workdir, f'bench-{rows}.db')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    A.create_app({'DATABASE': path, 'TESTING': True, 'SNAPSHOT_FOLDER': os.path.join(workdir, f'snapshots-{rows}')})
+    A.init_db()
+    A.stats_cache.clear()
+
+    started = time.perf_counter()
+    conn = A.connect(path)
+    user_ids = generate_journal(conn, rows)
+    conn.close()
+    generate_seconds = time.perf_counter() - started
+    user_id = user_ids[0]
+    print(f'  generated {rows} trades in {generate_seconds:.1f}s', file=sys.stderr)
+
+    client = A.app.test_client()
+    client.post('/login', data={'username': 'bench1', 'password': 'bench1'})
+    user_trades = sqlite3.connect(path).execute('SELECT COUNT(*) FROM trades WHERE user_id = ?',
+                                                (user_id,)).fetchone()[0]
+    result = {
+        'rows': rows,
+        'user_trades': user_trades,
+        'generate_seconds': round(generate_seconds, 3),
+        'db_bytes': os.path.getsize(path),
+        'routes': route_benchmarks(A, client, user_id, repeat),
+        'computations': computation_benchmarks(A, user_id, repeat),
+    }
+    A.db_pool.close_all()
+    return result
+
+
+# Print median timings next to a previous results file
+def print_comparison(results, baseline):
+    previous = {entry['rows']: entry for entry in baseline['results']}
+    for entry in results['results']:
+        old = previous.get(entry['rows'])
+        if old is None:
+            continue
+        print(f"\n{entry['rows']} rows (vs {baseline['meta'].get('revision') or 'baseline'})")
+        for group in ('routes', 'computations'):
+            for name, timing in entry[group].items():
+                if name not in old[group]:
+                    continue
+                before, after = old[group][name]['median_ms'], timing['median_ms']
+                change = (after - before) / before * 100 if before else 0
+                print(f'  {name:<24} {before:>10.2f}ms -> {after:>10.2f}ms  {change:+6.1f}%')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the trading journal at several data sizes.')
+    parser.add_argument('--sizes', nargs='+', default=DEFAULT_SIZES, help='Trade counts, e.g. 1k 100k 1m')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='Timed runs per benchmark')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Previous results file to compare against')
+    parser.add_argument('--workdir', help='Directory for the generated databases (default: a temp dir)')
+    args = parser.parse_args(argv)
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+        },
+        'results': [],
+    }
+    with tempfile.TemporaryDirectory() as tempdir:
+        workdir = args.workdir or tempdir
+        for size in args.sizes:
+            rows = parse_size(size)
+            print(f'Benchmarking {rows} trades', file=sys.stderr)
+            results['results'].append(benchmark_size(rows, args.repeat, workdir))
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import sqlite3
+import threading
+from queue import LifoQueue, Empty, Full
+
+# Pragmas applied to every new connection.  WAL lets readers and the single
+# writer work side by side, busy_timeout makes SQLite wait for the write lock
+# instead of raising "database is locked", and the negative cache_size is in KiB.
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -20000',
+    'PRAGMA temp_store = MEMORY',
+)
+
+
+# Implicit transactions start with BEGIN IMMEDIATE, so a writer takes the
+# write lock (waiting up to busy_timeout) when its transaction starts instead
+# of failing with SQLITE_BUSY when a read transaction tries to upgrade while
+# another process is writing.
+def connect(path, factory=sqlite3.Connection):
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level='IMMEDIATE', factory=factory)
+    conn.row_factory = sqlite3.Row
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    # Keeps up to `size` idle connections around so requests reuse them
+    # instead of reopening the database file every time.
+
+    def __init__(self, path, size=8, factory=sqlite3.Connection):
+        self.path = path
+        self.size = size
+        self.factory = factory
+        # Callbacks run on every newly opened connection (tracing, instrumentation)
+        self.on_connect = []
+        self._idle = LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._stats = {'created': 0, 'reused': 0, 'released': 0, 'discarded': 0, 'in_use': 0}
+
+    def _count(self, key, delta=1):
+        with self._lock:
+            self._stats[key] += delta
+
+    def acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+            self._count('reused')
+        except Empty:
+            conn = connect(self.path, self.factory)
+            for callback in self.on_connect:
+                callback(conn)
+            self._count('created')
+        self._count('in_use')
+        return conn
+
+    def release(self, conn):
+        self._count('in_use', -1)
+        try:
+            # Never hand out a connection with a half-finished transaction
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put_nowait(conn)
+            self._count('released')
+        except (Full, sqlite3.Error):
+            conn.close()
+            self._count('discarded')
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except Empty:
+                break
+
+    def reset(self, path=None):
+        self.close_all()
+        if path is not None:
+            self.path = path
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['idle'] = self._idle.qsize()
+        stats['size'] = self.size
+        acquired = stats['created'] + stats['reused']
+        stats['reuse_rate'] = round(stats['reused'] / acquired * 100, 1) if acquired > 0 else 0
+        return stats
@@ -0,0 +1,122 @@
+import csv
+import heapq
+import json
+from itertools import islice
+from operator import itemgetter
+
+from database import connect
+
+# Streaming export of a user's trades and economic events.  Rows are read
+# with fetchmany on a dedicated connection inside one read transaction, so
+# the whole export comes from a single consistent snapshot (WAL keeps it
+# stable while other requests write) and memory use doesn't grow with the
+# number of rows.
+EXPORT_BATCH_SIZE = 500
+
+TRADE_EXPORT_COLUMNS = ('id', 'date', 'ticker', 'direction', 'outcome', 'close_reason',
+                        'account_pnl', 'notes', 'screenshot_filename', 'created_at')
+EVENT_TABLE_COLUMNS = ('id', 'event_date', 'event_type', 'title', 'description',
+                       'importance', 'source_url', 'created_at')
+# Occurrences of recurring events have no id of their own; they carry their
+# series and the date the rule produced instead (empty for one-off events)
+EVENT_EXPORT_COLUMNS = EVENT_TABLE_COLUMNS + ('series_id', 'occurrence_date')
+
+# A series without an end date never runs out, so its occurrences are
+# exported no further than this many days past today
+EXPORT_OCCURRENCE_DAYS = 5 * 365
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+# Build the trade export query; every filter is optional.  Rows come back in
+# index order (user_id, date, created_at, then rowid) so SQLite never has to sort.
+def trade_export_query(user_id, start=None, end=None, ticker=None, close_reason=None):
+    sql = f"SELECT {', '.join(TRADE_EXPORT_COLUMNS)} FROM trades WHERE user_id = ?"
+    params = [user_id]
+    if start:
+        sql += ' AND date >= ?'
+        params.append(start)
+    if end:
+        sql += ' AND date <= ?'
+        params.append(end)
+    if ticker:
+        sql += ' AND ticker = ?'
+        params.append(ticker.upper().strip())
+    if close_reason:
+        sql += ' AND close_reason = ?'
+        params.append(close_reason)
+    return sql + ' ORDER BY date, created_at, id', params
+
+
+def event_export_query(user_id, start=None, end=None):
+    sql = f"SELECT {', '.join(EVENT_TABLE_COLUMNS)}, NULL, NULL FROM economic_events WHERE user_id = ?"
+    params = [user_id]
+    if start:
+        sql += ' AND event_date >= ?'
+        params.append(start)
+    if end:
+        sql += ' AND event_date <= ?'
+        params.append(end)
+    return sql + ' ORDER BY event_date', params
+
+
+# Yield lists of row tuples from one snapshot of the database.  The
+# connection is only opened once the response starts streaming and is closed
+# when the generator finishes or the client goes away.
+def iter_row_batches(database, sql, params, batch_size=EXPORT_BATCH_SIZE):
+    conn = connect(database)
+    try:
+        conn.execute('BEGIN')
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+# Merge occurrence rows (in date order) into the event batches by
+# event_date.  On the same day one-off events come first, as on the calendar.
+def merge_occurrence_rows(batches, occurrence_rows, batch_size=EXPORT_BATCH_SIZE):
+    rows = heapq.merge((row for batch in batches for row in batch), occurrence_rows,
+                       key=itemgetter(EVENT_EXPORT_COLUMNS.index('event_date')))
+    try:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            yield batch
+    finally:
+        batches.close()
+
+
+class _LineBuffer:
+    # csv.writer target that hands back each formatted line instead of storing it
+    def write(self, line):
+        return line
+
+
+def csv_chunks(columns, batches):
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(columns)
+    for rows in batches:
+        yield ''.join(writer.writerow(row) for row in rows)
+
+
+def ndjson_chunks(columns, batches):
+    for rows in batches:
+        yield ''.join(json.dumps(dict(zip(columns, row)), separators=(',', ':')) + '\n' for row in rows)
+
+
+def export_chunks(fmt, columns, batches):
+    if fmt == 'csv':
+        return csv_chunks(columns, batches)
+    return ndjson_chunks(columns, batches)
@@ -0,0 +1,39 @@
+import multiprocessing
+import os
+import secrets
+
+# Production server settings: gunicorn -c gunicorn.conf.py wsgi:app
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+accesslog = '-'
+
+
+def on_starting(server):
+    # Every worker has to sign sessions with the same secret and stamp the
+    # same build into ETags, so fix both before any worker is forked
+    os.environ.setdefault('SECRET_KEY', secrets.token_hex(32))
+    os.environ.setdefault('BUILD_ID', secrets.token_hex(8))
+
+    # Create and migrate the schema and precompress the static assets once
+    # in the master process
+    from app import app, init_db
+    from assets import compress_assets
+    init_db()
+    compress_assets(app.static_folder)
+
+
+def post_fork(server, worker):
+    # SQLite connections (and the writer thread holding one) must never cross a fork
+    from app import db_pool, write_queue
+    db_pool.reset()
+    write_queue.reset()
+
+
+def worker_exit(server, worker):
+    from app import shutdown_app
+    shutdown_app()
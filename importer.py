@@ -0,0 +1,186 @@
+import csv
+import math
+import sqlite3
+import time
+from datetime import datetime
+
+# Bulk trade import from CSV exports.  Rows are parsed one at a time from the
+# stream and written with executemany in chunks, each chunk in its own
+# transaction, so memory stays flat no matter how long the file is and other
+# writers get a turn between chunks.  Chunks are handed to a write(fn, *args)
+# callable: the app's writer queue in requests, connection_writer() in the
+# CLI.
+IMPORT_FIELDS = ('ticker', 'direction', 'date', 'outcome', 'close_reason', 'account_pnl', 'notes')
+REQUIRED_FIELDS = ('ticker', 'direction', 'date', 'outcome', 'close_reason', 'account_pnl')
+IMPORT_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+
+# Common broker-statement column names mapped onto ours
+HEADER_ALIASES = {
+    'symbol': 'ticker',
+    'side': 'direction',
+    'trade_date': 'date',
+    'result': 'outcome',
+    'reason': 'close_reason',
+    'exit_reason': 'close_reason',
+    'pnl': 'account_pnl',
+    'pnl_%': 'account_pnl',
+    'comment': 'notes',
+}
+
+DIRECTIONS = {'long': 'Long', 'buy': 'Long', 'short': 'Short', 'sell': 'Short'}
+OUTCOMES = {'win': 'Win', 'loss': 'Loss', 'breakeven': 'Breakeven', 'be': 'Breakeven'}
+
+INSERT_TRADE_SQL = '''
+    INSERT INTO trades (user_id, ticker, direction, date, outcome, close_reason, account_pnl, notes)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.error_count = 0
+        self.errors = []  # (line number, message), capped at MAX_REPORTED_ERRORS
+        self.seconds = 0.0
+        # Database or CSV error that ended the import early; chunks before it are saved
+        self.stopped = None
+        # Trades in a chunk that was handed to the writer but not confirmed in
+        # time; it may still commit after the import gave up waiting
+        self.unconfirmed = 0
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    @property
+    def rows_per_second(self):
+        return round(self.rows / self.seconds) if self.seconds > 0 else 0
+
+
+def normalize_header(name):
+    name = (name or '').strip().lower().replace(' ', '_')
+    return HEADER_ALIASES.get(name, name)
+
+
+# Validate one CSV row the same way the add trade form does and return the
+# column values in INSERT order.  Raises ValueError with a readable message.
+def parse_trade_row(row):
+    missing = [field for field in REQUIRED_FIELDS if not (row.get(field) or '').strip()]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+
+    ticker = row['ticker'].upper().strip()
+
+    direction = DIRECTIONS.get(row['direction'].strip().lower())
+    if direction is None:
+        raise ValueError(f"direction must be Long or Short, got {row['direction']!r}")
+
+    date = row['date'].strip()
+    try:
+        date = datetime.strptime(date, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f'date must be YYYY-MM-DD, got {date!r}')
+
+    outcome = OUTCOMES.get(row['outcome'].strip().lower())
+    if outcome is None:
+        raise ValueError(f"outcome must be Win, Loss or Breakeven, got {row['outcome']!r}")
+
+    close_reason = row['close_reason'].strip()
+
+    try:
+        account_pnl = float(row['account_pnl'].strip().rstrip('%'))
+    except ValueError:
+        raise ValueError(f"account_pnl must be a number, got {row['account_pnl']!r}")
+    if not math.isfinite(account_pnl):
+        raise ValueError(f"account_pnl must be a finite number, got {row['account_pnl']!r}")
+
+    notes = (row.get('notes') or '').strip()
+    return ticker, direction, date, outcome, close_reason, account_pnl, notes
+
+
+def insert_trades(conn, batch):
+    conn.executemany(INSERT_TRADE_SQL, batch)
+    return len(batch)
+
+
+# write() for a plain connection: every call is its own transaction
+def connection_writer(conn):
+    def write(fn, *args):
+        try:
+            result = fn(conn, *args)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return result
+    return write
+
+
+# Stream trades from a text-mode CSV file into the journal of user_id.
+# on_chunk(report) is called after every committed chunk for progress output.
+# An unreadable header raises ValueError before anything is written.  After
+# that, a database error or a row the csv module can't read (a field over
+# csv.field_size_limit(), bytes that aren't UTF-8) stops the import and is
+# recorded in report.stopped, so the caller can still say how many trades
+# were saved.  A chunk write that times out stops it too, with the chunk
+# counted in report.unconfirmed.
+def import_trades(write, user_id, stream, chunk_size=IMPORT_CHUNK_SIZE, on_chunk=None):
+    report = ImportReport()
+    started = time.monotonic()
+
+    reader = csv.reader(stream)
+    try:
+        header = next(reader, None)
+    except (csv.Error, UnicodeDecodeError) as e:
+        raise ValueError(f'The header row could not be read: {e}')
+    if header is None:
+        raise ValueError('The file is empty.')
+    columns = [normalize_header(name) for name in header]
+    missing = [field for field in REQUIRED_FIELDS if field not in columns]
+    if missing:
+        raise ValueError(f"Missing required column(s): {', '.join(missing)}")
+
+    def flush(batch):
+        try:
+            report.imported += write(insert_trades, batch)
+        except sqlite3.Error as e:
+            report.stopped = str(e)
+            return False
+        except TimeoutError:
+            report.unconfirmed = len(batch)
+            return False
+        report.seconds = time.monotonic() - started
+        if on_chunk:
+            on_chunk(report)
+        return True
+
+    batch = []
+    while True:
+        try:
+            values = next(reader, None)
+        except (csv.Error, UnicodeDecodeError) as e:
+            report.stopped = f'line {reader.line_num} could not be read: {e}'
+            break
+        if values is None:
+            if batch:
+                flush(batch)
+            break
+        if not any(value.strip() for value in values):
+            continue
+        report.rows += 1
+        try:
+            trade = parse_trade_row(dict(zip(columns, values)))
+        except ValueError as e:
+            report.add_error(reader.line_num, str(e))
+            continue
+        batch.append((user_id,) + trade)
+        if len(batch) >= chunk_size:
+            if not flush(batch):
+                break
+            batch = []
+
+    report.seconds = time.monotonic() - started
+    return report
@@ -0,0 +1,213 @@
+import cProfile
+import io
+import pstats
+import sqlite3
+import threading
+import time
+
+# In-process request metrics rendered in the Prometheus text format.  Each
+# gunicorn worker keeps its own numbers; scrape the workers individually or
+# sum them in the query.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# SQL time, statement count and template time of the request being served
+# on this thread; see begin_request() and end_request()
+_current = threading.local()
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted(self._series.items())
+            series = [(labels, list(values)) for labels, values in series]
+        for label_values, values in series:
+            labels = format_labels(self.labels, label_values)
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'{self.name}_bucket{format_labels(self.labels + ("le",), label_values + (bound,))} {count}')
+            lines.append(f'{self.name}_bucket{format_labels(self.labels + ("le",), label_values + ("+Inf",))} {values[-1]}')
+            lines.append(f'{self.name}_sum{labels} {values[-2]:.6f}')
+            lines.append(f'{self.name}_count{labels} {values[-1]}')
+        return lines
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def render_gauges(name, help, values):
+    lines = [f'# HELP {name} {help}', f'# TYPE {name} gauge']
+    for key, value in values.items():
+        if isinstance(value, (int, float)):
+            lines.append(f'{name}{format_labels(("stat",), (key,))} {value}')
+    return lines
+
+
+class Metrics:
+    def __init__(self):
+        self.request_seconds = Histogram(
+            'journal_request_duration_seconds', 'Request latency by route.',
+            ('endpoint', 'method', 'status'))
+        self.sql_seconds = Histogram(
+            'journal_request_sql_seconds', 'Time spent in SQLite per request.', ('endpoint',))
+        self.sql_statements = Histogram(
+            'journal_request_sql_statements', 'SQL statements executed per request.', ('endpoint',),
+            buckets=COUNT_BUCKETS)
+        self.template_seconds = Histogram(
+            'journal_template_render_seconds', 'Jinja render time by template.', ('template',))
+        self.histograms = [self.request_seconds, self.sql_seconds, self.sql_statements, self.template_seconds]
+
+    def begin_request(self):
+        _current.started = time.perf_counter()
+        _current.sql_seconds = 0.0
+        _current.sql_statements = 0
+
+    def end_request(self, endpoint, method, status):
+        started = getattr(_current, 'started', None)
+        if started is None:
+            return
+        self.request_seconds.observe(time.perf_counter() - started, endpoint, method, status)
+        self.sql_seconds.observe(_current.sql_seconds, endpoint)
+        self.sql_statements.observe(_current.sql_statements, endpoint)
+        _current.started = None
+
+    # Template timing, driven by Flask's before_render_template and
+    # template_rendered signals
+    def template_started(self, sender, template, context, **extra):
+        _current.template_started = time.perf_counter()
+
+    def template_finished(self, sender, template, context, **extra):
+        started = getattr(_current, 'template_started', None)
+        if started is not None:
+            self.template_seconds.observe(time.perf_counter() - started, template.name or 'string')
+            _current.template_started = None
+
+    def render(self, gauges=None):
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.render())
+        for name, (help, values) in (gauges or {}).items():
+            lines.extend(render_gauges(name, help, values))
+        return '\n'.join(lines) + '\n'
+
+
+def record_sql(seconds, statements=0):
+    if getattr(_current, 'started', None) is not None:
+        _current.sql_seconds += seconds
+        _current.sql_statements += statements
+
+
+# The writer queue runs a request's SQL on its own thread: it keeps a running
+# tally there and hands each operation's share back to the waiting request
+def start_sql_tally():
+    _current.started = time.perf_counter()
+    _current.sql_seconds = 0.0
+    _current.sql_statements = 0
+
+
+def sql_tally():
+    return _current.sql_seconds, _current.sql_statements
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    # Times statement execution and row fetching for the current request
+
+    def execute(self, *args):
+        started = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            record_sql(time.perf_counter() - started, 1)
+
+    def executemany(self, *args):
+        started = time.perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            record_sql(time.perf_counter() - started, 1)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            record_sql(time.perf_counter() - started)
+
+    def fetchmany(self, *args):
+        started = time.perf_counter()
+        try:
+            return super().fetchmany(*args)
+        finally:
+            record_sql(time.perf_counter() - started)
+
+    def fetchall(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            record_sql(time.perf_counter() - started)
+
+    # Iterating the cursor steps the statement too
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            return super().__next__()
+        finally:
+            record_sql(time.perf_counter() - started)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    # Hands out instrumented cursors; execute() and executemany() are
+    # rerouted through them because the C implementations bypass cursor()
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+
+# Opt-in per-request profiler; the response is replaced by the pstats report
+class RequestProfiler:
+    def __init__(self, limit=40):
+        self.limit = limit
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def report(self, sort='cumulative'):
+        self.profile.disable()
+        out = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=out)
+        stats.strip_dirs().sort_stats(sort).print_stats(self.limit)
+        return out.getvalue()
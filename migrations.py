@@ -0,0 +1,606 @@
+import os
+import sqlite3
+import time
+
+from analytics import seed_user_stats, seed_daily_pnl
+
+# Versioned schema migrations.  PRAGMA user_version holds the number of steps
+# in MIGRATIONS already applied, so starting against a current database costs
+# one pragma read however many rows the tables hold.  Each step runs in its
+# own write transaction together with its version bump; the version is
+# checked again once the lock is held, so when several processes start at
+# once every step still runs exactly once, and an interrupted run picks up at
+# the step that failed.
+#
+# Steps are append-only: a released step is never edited or reordered, a
+# schema change is a new step at the end.  They are also idempotent (IF NOT
+# EXISTS everywhere), because databases created before versioning start at
+# version 0 with most of the schema already in place.
+
+DEFAULT_USERS = (
+    ('darren', 'darren', 'Darren'),
+    ('likith', 'likith', 'Likith'),
+    ('tanish', 'tanish', 'Tanish'),
+)
+
+
+def table_exists(conn, name):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+# executescript() would commit the migration's transaction before running, so
+# scripts are fed to execute() one complete statement at a time
+def run_script(conn, script):
+    statement = ''
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ''
+    if statement.strip():
+        conn.execute(statement)
+
+
+def create_base_tables(conn, config):
+    run_script(conn, '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            display_name TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS trades (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER DEFAULT 1,
+            ticker TEXT NOT NULL,
+            direction TEXT NOT NULL,
+            date TEXT NOT NULL,
+            outcome TEXT NOT NULL,
+            close_reason TEXT NOT NULL,
+            account_pnl REAL NOT NULL,
+            notes TEXT,
+            screenshot_filename TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        );
+
+        CREATE TABLE IF NOT EXISTS economic_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            event_type TEXT NOT NULL,
+            event_date DATE NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT,
+            importance TEXT DEFAULT 'Medium',
+            source_url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        );
+    ''')
+
+
+def create_default_users(conn, config):
+    conn.executemany('''
+        INSERT OR IGNORE INTO users (username, password, display_name)
+        VALUES (?, ?, ?)
+    ''', DEFAULT_USERS)
+
+
+# Journals from before multi-user support have no trades.user_id; their
+# trades all belong to Darren (user_id = 1)
+def backfill_trade_users(conn, config):
+    columns = [column[1] for column in conn.execute('PRAGMA table_info(trades)')]
+    if 'user_id' not in columns:
+        conn.execute('ALTER TABLE trades ADD COLUMN user_id INTEGER DEFAULT 1')
+    conn.execute('UPDATE trades SET user_id = 1 WHERE user_id IS NULL OR user_id = 0')
+
+
+# Secondary indexes for the per-user list and date range queries.  The trades
+# index also carries account_pnl so the calendar's daily P&L is covered by it.
+def create_indexes(conn, config):
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_trades_user_date
+        ON trades (user_id, date, created_at, account_pnl)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_events_user_date
+        ON economic_events (user_id, event_date)
+    ''')
+
+
+# Per-user summary counters kept exact by triggers on every trades insert,
+# update and delete, so the dashboard summary is a single-row lookup
+def create_user_stats(conn, config):
+    exists = table_exists(conn, 'user_stats')
+    run_script(conn, '''
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            total_trades INTEGER NOT NULL DEFAULT 0,
+            winning_trades INTEGER NOT NULL DEFAULT 0,
+            losing_trades INTEGER NOT NULL DEFAULT 0,
+            breakeven_trades INTEGER NOT NULL DEFAULT 0,
+            total_pnl REAL NOT NULL DEFAULT 0,
+            win_pnl REAL NOT NULL DEFAULT 0,
+            loss_pnl REAL NOT NULL DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        );
+
+        CREATE TRIGGER IF NOT EXISTS trades_stats_insert AFTER INSERT ON trades
+        BEGIN
+            INSERT OR IGNORE INTO user_stats (user_id) VALUES (NEW.user_id);
+            UPDATE user_stats SET
+                total_trades = total_trades + 1,
+                winning_trades = winning_trades + (NEW.account_pnl > 0),
+                losing_trades = losing_trades + (NEW.account_pnl < 0),
+                breakeven_trades = breakeven_trades + (NEW.account_pnl = 0),
+                total_pnl = total_pnl + NEW.account_pnl,
+                win_pnl = win_pnl + MAX(NEW.account_pnl, 0),
+                loss_pnl = loss_pnl + MIN(NEW.account_pnl, 0)
+            WHERE user_id = NEW.user_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trades_stats_delete AFTER DELETE ON trades
+        BEGIN
+            UPDATE user_stats SET
+                total_trades = total_trades - 1,
+                winning_trades = winning_trades - (OLD.account_pnl > 0),
+                losing_trades = losing_trades - (OLD.account_pnl < 0),
+                breakeven_trades = breakeven_trades - (OLD.account_pnl = 0),
+                total_pnl = total_pnl - OLD.account_pnl,
+                win_pnl = win_pnl - MAX(OLD.account_pnl, 0),
+                loss_pnl = loss_pnl - MIN(OLD.account_pnl, 0)
+            WHERE user_id = OLD.user_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trades_stats_update AFTER UPDATE OF user_id, account_pnl ON trades
+        BEGIN
+            UPDATE user_stats SET
+                total_trades = total_trades - 1,
+                winning_trades = winning_trades - (OLD.account_pnl > 0),
+                losing_trades = losing_trades - (OLD.account_pnl < 0),
+                breakeven_trades = breakeven_trades - (OLD.account_pnl = 0),
+                total_pnl = total_pnl - OLD.account_pnl,
+                win_pnl = win_pnl - MAX(OLD.account_pnl, 0),
+                loss_pnl = loss_pnl - MIN(OLD.account_pnl, 0)
+            WHERE user_id = OLD.user_id;
+            INSERT OR IGNORE INTO user_stats (user_id) VALUES (NEW.user_id);
+            UPDATE user_stats SET
+                total_trades = total_trades + 1,
+                winning_trades = winning_trades + (NEW.account_pnl > 0),
+                losing_trades = losing_trades + (NEW.account_pnl < 0),
+                breakeven_trades = breakeven_trades + (NEW.account_pnl = 0),
+                total_pnl = total_pnl + NEW.account_pnl,
+                win_pnl = win_pnl + MAX(NEW.account_pnl, 0),
+                loss_pnl = loss_pnl + MIN(NEW.account_pnl, 0)
+            WHERE user_id = NEW.user_id;
+        END;
+    ''')
+
+    # Seed the table from existing trades the first time it is created
+    if not exists:
+        seed_user_stats(conn)
+
+
+# Per-user, per-day P&L rollup maintained by triggers on trades (see
+# analytics.load_daily_pnl).  Days whose last trade is removed are deleted.
+def create_daily_pnl(conn, config):
+    exists = table_exists(conn, 'daily_pnl')
+    run_script(conn, '''
+        CREATE TABLE IF NOT EXISTS daily_pnl (
+            user_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            total_pnl REAL NOT NULL DEFAULT 0,
+            trade_count INTEGER NOT NULL DEFAULT 0,
+            winning_trades INTEGER NOT NULL DEFAULT 0,
+            losing_trades INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, date)
+        ) WITHOUT ROWID;
+
+        CREATE TRIGGER IF NOT EXISTS trades_daily_insert AFTER INSERT ON trades
+        BEGIN
+            INSERT OR IGNORE INTO daily_pnl (user_id, date) VALUES (NEW.user_id, NEW.date);
+            UPDATE daily_pnl SET
+                total_pnl = total_pnl + NEW.account_pnl,
+                trade_count = trade_count + 1,
+                winning_trades = winning_trades + (NEW.account_pnl > 0),
+                losing_trades = losing_trades + (NEW.account_pnl < 0)
+            WHERE user_id = NEW.user_id AND date = NEW.date;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trades_daily_delete AFTER DELETE ON trades
+        BEGIN
+            UPDATE daily_pnl SET
+                total_pnl = total_pnl - OLD.account_pnl,
+                trade_count = trade_count - 1,
+                winning_trades = winning_trades - (OLD.account_pnl > 0),
+                losing_trades = losing_trades - (OLD.account_pnl < 0)
+            WHERE user_id = OLD.user_id AND date = OLD.date;
+            DELETE FROM daily_pnl WHERE user_id = OLD.user_id AND date = OLD.date AND trade_count <= 0;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trades_daily_update AFTER UPDATE OF user_id, date, account_pnl ON trades
+        BEGIN
+            UPDATE daily_pnl SET
+                total_pnl = total_pnl - OLD.account_pnl,
+                trade_count = trade_count - 1,
+                winning_trades = winning_trades - (OLD.account_pnl > 0),
+                losing_trades = losing_trades - (OLD.account_pnl < 0)
+            WHERE user_id = OLD.user_id AND date = OLD.date;
+            DELETE FROM daily_pnl WHERE user_id = OLD.user_id AND date = OLD.date AND trade_count <= 0;
+            INSERT OR IGNORE INTO daily_pnl (user_id, date) VALUES (NEW.user_id, NEW.date);
+            UPDATE daily_pnl SET
+                total_pnl = total_pnl + NEW.account_pnl,
+                trade_count = trade_count + 1,
+                winning_trades = winning_trades + (NEW.account_pnl > 0),
+                losing_trades = losing_trades + (NEW.account_pnl < 0)
+            WHERE user_id = NEW.user_id AND date = NEW.date;
+        END;
+    ''')
+
+    # Seed the rollup from existing trades the first time it is created
+    if not exists:
+        seed_daily_pnl(conn)
+
+
+# Per-user data version, bumped by triggers on any change to that user's
+# trades.  Cached stats and page ETags are keyed on it.
+def create_data_versions(conn, config):
+    run_script(conn, '''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            user_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        );
+
+        CREATE TRIGGER IF NOT EXISTS trades_version_insert AFTER INSERT ON trades
+        BEGIN
+            INSERT OR IGNORE INTO data_versions (user_id) VALUES (NEW.user_id);
+            UPDATE data_versions SET version = version + 1 WHERE user_id = NEW.user_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trades_version_update AFTER UPDATE ON trades
+        BEGIN
+            INSERT OR IGNORE INTO data_versions (user_id) VALUES (NEW.user_id);
+            UPDATE data_versions SET version = version + 1 WHERE user_id IN (OLD.user_id, NEW.user_id);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trades_version_delete AFTER DELETE ON trades
+        BEGIN
+            UPDATE data_versions SET version = version + 1 WHERE user_id = OLD.user_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS events_version_insert AFTER INSERT ON economic_events
+        BEGIN
+            INSERT OR IGNORE INTO data_versions (user_id) VALUES (NEW.user_id);
+            UPDATE data_versions SET version = version + 1 WHERE user_id = NEW.user_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS events_version_update AFTER UPDATE ON economic_events
+        BEGIN
+            INSERT OR IGNORE INTO data_versions (user_id) VALUES (NEW.user_id);
+            UPDATE data_versions SET version = version + 1 WHERE user_id IN (OLD.user_id, NEW.user_id);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS events_version_delete AFTER DELETE ON economic_events
+        BEGIN
+            UPDATE data_versions SET version = version + 1 WHERE user_id = OLD.user_id;
+        END;
+    ''')
+
+
+# Reference-counted content-addressed screenshot blobs.  The triggers keep
+# ref_count equal to the number of trades pointing at each file.
+def create_screenshot_blobs(conn, config):
+    exists = table_exists(conn, 'screenshot_blobs')
+    run_script(conn, '''
+        CREATE TABLE IF NOT EXISTS screenshot_blobs (
+            filename TEXT PRIMARY KEY,
+            size_bytes INTEGER NOT NULL DEFAULT 0,
+            ref_count INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TRIGGER IF NOT EXISTS trades_blob_insert AFTER INSERT ON trades
+        WHEN NEW.screenshot_filename IS NOT NULL
+        BEGIN
+            UPDATE screenshot_blobs SET ref_count = ref_count + 1 WHERE filename = NEW.screenshot_filename;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trades_blob_delete AFTER DELETE ON trades
+        WHEN OLD.screenshot_filename IS NOT NULL
+        BEGIN
+            UPDATE screenshot_blobs SET ref_count = ref_count - 1 WHERE filename = OLD.screenshot_filename;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trades_blob_update AFTER UPDATE OF screenshot_filename ON trades
+        WHEN OLD.screenshot_filename IS NOT NEW.screenshot_filename
+        BEGIN
+            UPDATE screenshot_blobs SET ref_count = ref_count - 1 WHERE filename = OLD.screenshot_filename;
+            UPDATE screenshot_blobs SET ref_count = ref_count + 1 WHERE filename = NEW.screenshot_filename;
+        END;
+    ''')
+
+    # Existing screenshots (stored under their old per-upload names) become
+    # blobs with whatever number of trades already point at them
+    if not exists:
+        legacy = conn.execute('''
+            SELECT screenshot_filename, COUNT(*) FROM trades
+            WHERE screenshot_filename IS NOT NULL
+            GROUP BY screenshot_filename
+        ''').fetchall()
+        conn.executemany('''
+            INSERT INTO screenshot_blobs (filename, size_bytes, ref_count) VALUES (?, ?, ?)
+        ''', [(filename, file_size(os.path.join(config['UPLOAD_FOLDER'], filename)), count)
+              for filename, count in legacy])
+
+
+def file_size(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+# FTS5 indexes over trade tickers/notes and event titles/descriptions.  They
+# are external-content tables (the text lives only in trades and
+# economic_events) synced by triggers.  Builds of SQLite without FTS5 just
+# run without search; the step still counts as applied.
+def create_search_index(conn, config):
+    exists = table_exists(conn, 'trades_fts')
+    try:
+        run_script(conn, '''
+            CREATE VIRTUAL TABLE IF NOT EXISTS trades_fts USING fts5(
+                ticker, notes, content='trades', content_rowid='id', prefix='2 3'
+            );
+
+            CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(
+                title, description, content='economic_events', content_rowid='id', prefix='2 3'
+            );
+        ''')
+    except sqlite3.OperationalError as e:
+        print(f'Full-text search disabled: {e}')
+        return
+
+    run_script(conn, '''
+        CREATE TRIGGER IF NOT EXISTS trades_fts_insert AFTER INSERT ON trades
+        BEGIN
+            INSERT INTO trades_fts (rowid, ticker, notes) VALUES (NEW.id, NEW.ticker, NEW.notes);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trades_fts_delete AFTER DELETE ON trades
+        BEGIN
+            INSERT INTO trades_fts (trades_fts, rowid, ticker, notes) VALUES ('delete', OLD.id, OLD.ticker, OLD.notes);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trades_fts_update AFTER UPDATE OF ticker, notes ON trades
+        BEGIN
+            INSERT INTO trades_fts (trades_fts, rowid, ticker, notes) VALUES ('delete', OLD.id, OLD.ticker, OLD.notes);
+            INSERT INTO trades_fts (rowid, ticker, notes) VALUES (NEW.id, NEW.ticker, NEW.notes);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS events_fts_insert AFTER INSERT ON economic_events
+        BEGIN
+            INSERT INTO events_fts (rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS events_fts_delete AFTER DELETE ON economic_events
+        BEGIN
+            INSERT INTO events_fts (events_fts, rowid, title, description) VALUES ('delete', OLD.id, OLD.title, OLD.description);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS events_fts_update AFTER UPDATE OF title, description ON economic_events
+        BEGIN
+            INSERT INTO events_fts (events_fts, rowid, title, description) VALUES ('delete', OLD.id, OLD.title, OLD.description);
+            INSERT INTO events_fts (rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);
+        END;
+    ''')
+
+    # Index the existing rows the first time the tables are created
+    if not exists:
+        conn.execute("INSERT INTO trades_fts (trades_fts) VALUES ('rebuild')")
+        conn.execute("INSERT INTO events_fts (events_fts) VALUES ('rebuild')")
+
+
+# Recurring events (see recurrence.py): one event_series row per rule and an
+# event_exceptions row per cancelled or edited occurrence.  Changes to either
+# bump the owner's data version like economic_events changes do.
+def create_event_series(conn, config):
+    run_script(conn, '''
+        CREATE TABLE IF NOT EXISTS event_series (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            event_type TEXT NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT,
+            importance TEXT DEFAULT 'Medium',
+            source_url TEXT,
+            rule TEXT NOT NULL,
+            start_date TEXT NOT NULL,
+            end_date TEXT,
+            interval INTEGER NOT NULL DEFAULT 1,
+            week_of_month INTEGER,
+            dates TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_event_series_user ON event_series (user_id);
+
+        CREATE TABLE IF NOT EXISTS event_exceptions (
+            series_id INTEGER NOT NULL,
+            occurrence_date TEXT NOT NULL,
+            cancelled INTEGER NOT NULL DEFAULT 0,
+            event_date TEXT,
+            title TEXT,
+            description TEXT,
+            importance TEXT,
+            PRIMARY KEY (series_id, occurrence_date),
+            FOREIGN KEY (series_id) REFERENCES event_series (id)
+        ) WITHOUT ROWID;
+
+        CREATE INDEX IF NOT EXISTS idx_event_exceptions_moved ON event_exceptions (series_id, event_date);
+
+        CREATE TRIGGER IF NOT EXISTS event_series_delete AFTER DELETE ON event_series
+        BEGIN
+            DELETE FROM event_exceptions WHERE series_id = OLD.id;
+            UPDATE data_versions SET version = version + 1 WHERE user_id = OLD.user_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS event_series_version_insert AFTER INSERT ON event_series
+        BEGIN
+            INSERT OR IGNORE INTO data_versions (user_id) VALUES (NEW.user_id);
+            UPDATE data_versions SET version = version + 1 WHERE user_id = NEW.user_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS event_series_version_update AFTER UPDATE ON event_series
+        BEGIN
+            UPDATE data_versions SET version = version + 1 WHERE user_id IN (OLD.user_id, NEW.user_id);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS event_exceptions_version_insert AFTER INSERT ON event_exceptions
+        BEGIN
+            UPDATE data_versions SET version = version + 1
+            WHERE user_id = (SELECT user_id FROM event_series WHERE id = NEW.series_id);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS event_exceptions_version_update AFTER UPDATE ON event_exceptions
+        BEGIN
+            UPDATE data_versions SET version = version + 1
+            WHERE user_id = (SELECT user_id FROM event_series WHERE id = NEW.series_id);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS event_exceptions_version_delete AFTER DELETE ON event_exceptions
+        BEGIN
+            UPDATE data_versions SET version = version + 1
+            WHERE user_id = (SELECT user_id FROM event_series WHERE id = OLD.series_id);
+        END;
+    ''')
+
+
+# Which trades and economic_events rows changed and when, for incremental
+# columnar snapshots (see snapshots.py).  Every change moves the row's entry
+# to a new, higher seq, so the log holds one entry per row and owner however
+# often the row is edited, and "changed since the last snapshot" is a range
+# on seq.  A row whose owner changes is logged for both users so the old
+# owner's snapshot drops it.  The triggers delete and re-insert instead of
+# using INSERT OR REPLACE, which an outer INSERT OR IGNORE would turn into a
+# silent no-op.
+def create_change_log(conn, config):
+    run_script(conn, '''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            user_id INTEGER
+        );
+
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_change_log_row ON change_log (table_name, row_id, user_id);
+        CREATE INDEX IF NOT EXISTS idx_change_log_user ON change_log (user_id, table_name, seq);
+
+        CREATE TRIGGER IF NOT EXISTS trades_change_insert AFTER INSERT ON trades
+        BEGIN
+            DELETE FROM change_log WHERE table_name = 'trades' AND row_id = NEW.id AND user_id IS NEW.user_id;
+            INSERT INTO change_log (table_name, row_id, user_id) VALUES ('trades', NEW.id, NEW.user_id);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trades_change_update AFTER UPDATE ON trades
+        BEGIN
+            DELETE FROM change_log WHERE table_name = 'trades' AND row_id = NEW.id AND user_id IS NEW.user_id;
+            INSERT INTO change_log (table_name, row_id, user_id) VALUES ('trades', NEW.id, NEW.user_id);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trades_change_owner AFTER UPDATE OF user_id ON trades
+        WHEN OLD.user_id IS NOT NEW.user_id
+        BEGIN
+            DELETE FROM change_log WHERE table_name = 'trades' AND row_id = OLD.id AND user_id IS OLD.user_id;
+            INSERT INTO change_log (table_name, row_id, user_id) VALUES ('trades', OLD.id, OLD.user_id);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trades_change_delete AFTER DELETE ON trades
+        BEGIN
+            DELETE FROM change_log WHERE table_name = 'trades' AND row_id = OLD.id AND user_id IS OLD.user_id;
+            INSERT INTO change_log (table_name, row_id, user_id) VALUES ('trades', OLD.id, OLD.user_id);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS events_change_insert AFTER INSERT ON economic_events
+        BEGIN
+            DELETE FROM change_log WHERE table_name = 'economic_events' AND row_id = NEW.id AND user_id IS NEW.user_id;
+            INSERT INTO change_log (table_name, row_id, user_id) VALUES ('economic_events', NEW.id, NEW.user_id);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS events_change_update AFTER UPDATE ON economic_events
+        BEGIN
+            DELETE FROM change_log WHERE table_name = 'economic_events' AND row_id = NEW.id AND user_id IS NEW.user_id;
+            INSERT INTO change_log (table_name, row_id, user_id) VALUES ('economic_events', NEW.id, NEW.user_id);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS events_change_owner AFTER UPDATE OF user_id ON economic_events
+        WHEN OLD.user_id IS NOT NEW.user_id
+        BEGIN
+            DELETE FROM change_log WHERE table_name = 'economic_events' AND row_id = OLD.id AND user_id IS OLD.user_id;
+            INSERT INTO change_log (table_name, row_id, user_id) VALUES ('economic_events', OLD.id, OLD.user_id);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS events_change_delete AFTER DELETE ON economic_events
+        BEGIN
+            DELETE FROM change_log WHERE table_name = 'economic_events' AND row_id = OLD.id AND user_id IS OLD.user_id;
+            INSERT INTO change_log (table_name, row_id, user_id) VALUES ('economic_events', OLD.id, OLD.user_id);
+        END;
+    ''')
+
+
+# idx_trades_user_date first carried account_pnl after created_at for the
+# calendar, which reads daily_pnl now.  With it there the implicit rowid no
+# longer follows (date, created_at), so every (date, created_at, id) ordering
+# and the trade list's keyset seek needed a sort; rebuilt on the key alone.
+def rebuild_trade_date_index(conn, config):
+    conn.execute('DROP INDEX IF EXISTS idx_trades_user_date')
+    conn.execute('CREATE INDEX idx_trades_user_date ON trades (user_id, date, created_at)')
+
+
+# In order; the database's user_version is the number of these applied.
+# Indexes depend on trades.user_id, so they come after the backfill.
+MIGRATIONS = (
+    create_base_tables,
+    create_default_users,
+    backfill_trade_users,
+    create_indexes,
+    create_user_stats,
+    create_daily_pnl,
+    create_data_versions,
+    create_screenshot_blobs,
+    create_search_index,
+    create_event_series,
+    create_change_log,
+    rebuild_trade_date_index,
+)
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+# Bring the database up to SCHEMA_VERSION.  Returns the names of the steps
+# this call applied with how long each took in ms; the list is empty when
+# the schema was already current (or another process got there first).
+def migrate(conn, config, migrations=MIGRATIONS):
+    if schema_version(conn) >= len(migrations):
+        return []
+
+    applied = []
+    for version, step in enumerate(migrations, start=1):
+        started = time.perf_counter()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if schema_version(conn) < version:
+                step(conn, config)
+                conn.execute(f'PRAGMA user_version = {version}')
+                applied.append((step.__name__, (time.perf_counter() - started) * 1000))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return applied
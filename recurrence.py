@@ -0,0 +1,224 @@
+import bisect
+import calendar
+import re
+from datetime import date, timedelta
+
+# Recurring economic events.  A series is stored once in event_series and its
+# occurrences are computed only for the range being shown:
+#
+#   weekly   every `interval` weeks on the weekday of start_date
+#   monthly  the `week_of_month`-th weekday of start_date in every month,
+#            -1 meaning the last one (NFP is the first Friday)
+#   dates    an explicit list of dates (FOMC meetings, WASDE releases)
+#
+# Rows in event_exceptions are keyed by the date the rule produced and either
+# cancel that occurrence or override its date, title, description or
+# importance; NULL override columns fall back to the series.
+MAX_INTERVAL = 52
+MAX_SERIES_DATES = 500
+
+# Options of the Repeat select on the add event form
+REPEAT_OPTIONS = ('weekly', 'monthly', 'monthly_last', 'dates')
+
+OVERRIDE_COLUMNS = ('event_date', 'title', 'description', 'importance')
+
+
+def parse_date(value):
+    return date.fromisoformat(value)
+
+
+def month_range(year, month):
+    start = date(year, month, 1)
+    return start, start + timedelta(days=calendar.monthrange(year, month)[1])
+
+
+# (year, month) of every month overlapping start <= day < end
+def months_between(start, end):
+    year, month = start.year, start.month
+    while date(year, month, 1) < end:
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+# The nth (1-5, or -1 for the last) given weekday of a month, or None when
+# the month has no such day
+def nth_weekday(year, month, weekday, n):
+    days = calendar.monthrange(year, month)[1]
+    if n == -1:
+        last = date(year, month, days)
+        return last - timedelta(days=(last.weekday() - weekday) % 7)
+    first = date(year, month, 1)
+    day = 1 + (weekday - first.weekday()) % 7 + 7 * (n - 1)
+    return date(year, month, day) if day <= days else None
+
+
+# Everything expansion depends on.  Occurrence caches are keyed on it, so an
+# edited series never hits entries computed from its old rule.
+def series_key(series):
+    return (series['id'], series['rule'], series['start_date'], series['end_date'],
+            series['interval'], series['week_of_month'], series['dates'])
+
+
+# Dates the rule produces in start <= day < end.  The cost depends only on
+# the size of the range, never on how long ago the series started.
+def rule_dates(series, start, end):
+    first = parse_date(series['start_date'])
+    if series['end_date']:
+        end = min(end, parse_date(series['end_date']) + timedelta(days=1))
+    start = max(start, first)
+    if start >= end:
+        return []
+
+    rule = series['rule']
+    if rule == 'weekly':
+        step = 7 * series['interval']
+        current = first + timedelta(days=-(-(start - first).days // step) * step)
+        days = []
+        while current < end:
+            days.append(current)
+            current += timedelta(days=step)
+        return days
+    if rule == 'monthly':
+        days = (nth_weekday(year, month, first.weekday(), series['week_of_month'])
+                for year, month in months_between(start, end))
+        return [day for day in days if day is not None and start <= day < end]
+
+    dates = series['dates'].split(',')
+    return [parse_date(value) for value in
+            dates[bisect.bisect_left(dates, start.isoformat()):bisect.bisect_left(dates, end.isoformat())]]
+
+
+# ISO dates of a series' occurrences in one month, before exceptions; this
+# is the unit the app caches
+def month_dates(series, year, month):
+    return tuple(day.isoformat() for day in rule_dates(series, *month_range(year, month)))
+
+
+def is_occurrence(series, day):
+    return bool(rule_dates(series, day, day + timedelta(days=1)))
+
+
+# One occurrence as an event dict, shaped like an economic_events row
+def make_occurrence(series, occurrence_date, exception=None):
+    event = {
+        'id': None,
+        'series_id': series['id'],
+        'occurrence_date': occurrence_date,
+        'event_type': series['event_type'],
+        'event_date': occurrence_date,
+        'title': series['title'],
+        'description': series['description'],
+        'importance': series['importance'],
+        'source_url': series['source_url'],
+    }
+    if exception is not None:
+        for column in OVERRIDE_COLUMNS:
+            if exception[column] is not None:
+                event[column] = exception[column]
+    return event
+
+
+def load_series(conn, user_id):
+    return conn.execute('SELECT * FROM event_series WHERE user_id = ? ORDER BY id', (user_id,)).fetchall()
+
+
+# Exceptions of the user's series that touch start <= day < end, either
+# through the date the rule produced or the date an occurrence was moved to
+def load_exceptions(conn, user_id, start, end):
+    return conn.execute('''
+        SELECT event_exceptions.* FROM event_series
+        JOIN event_exceptions ON event_exceptions.series_id = event_series.id
+        WHERE event_series.user_id = ?
+          AND ((event_exceptions.occurrence_date >= ? AND event_exceptions.occurrence_date < ?)
+               OR (event_exceptions.event_date >= ? AND event_exceptions.event_date < ?))
+    ''', (user_id, start, end, start, end)).fetchall()
+
+
+# Occurrences of every series falling in start <= day < end (dates), with
+# exceptions applied, ordered by date.  expand(series, year, month) returns
+# the month's rule dates; pass a cached version of month_dates.
+def series_occurrences(series_rows, exceptions, start, end, expand=month_dates):
+    start_iso, end_iso = start.isoformat(), end.isoformat()
+    by_id = {series['id']: series for series in series_rows}
+    overrides = {(row['series_id'], row['occurrence_date']): row for row in exceptions}
+
+    occurrences = []
+    for series in series_rows:
+        if series['start_date'] >= end_iso or (series['end_date'] and series['end_date'] < start_iso):
+            continue
+        for year, month in months_between(start, end):
+            for day in expand(series, year, month):
+                if not start_iso <= day < end_iso:
+                    continue
+                exception = overrides.get((series['id'], day))
+                if exception is not None and (exception['cancelled'] or
+                                              not start_iso <= (exception['event_date'] or day) < end_iso):
+                    continue
+                occurrences.append(make_occurrence(series, day, exception))
+
+    # Occurrences moved into the range from a date outside it
+    for (series_id, day), exception in overrides.items():
+        if (not start_iso <= day < end_iso and not exception['cancelled'] and series_id in by_id
+                and exception['event_date'] and start_iso <= exception['event_date'] < end_iso):
+            occurrences.append(make_occurrence(by_id[series_id], day, exception))
+
+    occurrences.sort(key=lambda event: event['event_date'])
+    return occurrences
+
+
+# Rule columns of a new series from the add event form; raises ValueError
+# with a message for the user
+def build_series_rule(repeat, event_date, interval=None, until=None, dates_text=''):
+    if repeat not in REPEAT_OPTIONS:
+        raise ValueError('Unknown repeat option.')
+    start = parse_date(event_date)
+
+    if repeat == 'dates':
+        dates = sorted({start.isoformat(), *re.findall(r'\d{4}-\d{2}-\d{2}', dates_text or '')})
+        try:
+            for value in dates:
+                parse_date(value)
+        except ValueError:
+            raise ValueError('Dates must be valid YYYY-MM-DD dates.')
+        if len(dates) < 2:
+            raise ValueError('List at least one more date for the series.')
+        if len(dates) > MAX_SERIES_DATES:
+            raise ValueError(f'A series can list at most {MAX_SERIES_DATES} dates.')
+        return {'rule': 'dates', 'start_date': dates[0], 'end_date': dates[-1], 'interval': 1,
+                'week_of_month': None, 'dates': ','.join(dates)}
+
+    end_date = None
+    if until:
+        end_date = parse_date(until).isoformat()
+        if end_date < start.isoformat():
+            raise ValueError('The series must end on or after its first date.')
+
+    if repeat == 'weekly':
+        interval = int(interval or 1)
+        if not 1 <= interval <= MAX_INTERVAL:
+            raise ValueError(f'Repeat every 1 to {MAX_INTERVAL} weeks.')
+        return {'rule': 'weekly', 'start_date': start.isoformat(), 'end_date': end_date,
+                'interval': interval, 'week_of_month': None, 'dates': None}
+
+    if repeat == 'monthly_last' and (start + timedelta(days=7)).month == start.month:
+        raise ValueError(f'{start.isoformat()} is not the last {calendar.day_name[start.weekday()]} of its month.')
+    week_of_month = -1 if repeat == 'monthly_last' else (start.day - 1) // 7 + 1
+    return {'rule': 'monthly', 'start_date': start.isoformat(), 'end_date': end_date,
+            'interval': 1, 'week_of_month': week_of_month, 'dates': None}
+
+
+# Human-readable rule, e.g. "Every 2 weeks" or "Monthly on the first Friday"
+def describe_series(series):
+    first = parse_date(series['start_date'])
+    if series['rule'] == 'weekly':
+        text = 'Weekly' if series['interval'] == 1 else f"Every {series['interval']} weeks"
+        text += f' on {calendar.day_name[first.weekday()]}'
+    elif series['rule'] == 'monthly':
+        n = series['week_of_month']
+        ordinal = 'last' if n == -1 else ('first', 'second', 'third', 'fourth', 'fifth')[n - 1]
+        text = f'Monthly on the {ordinal} {calendar.day_name[first.weekday()]}'
+    else:
+        return f"On {len(series['dates'].split(','))} dates"
+    if series['end_date']:
+        text += f" until {series['end_date']}"
+    return text
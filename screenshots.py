@@ -0,0 +1,309 @@
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from database import connect
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional: without it the original upload is served everywhere
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Derived WebP versions of each screenshot: a small thumbnail for list rows
+# and a compressed display copy for detail views.  The original is only
+# loaded when a chart is opened full size.
+VARIANTS = {
+    'thumb': {'size': (240, 160), 'quality': 70},
+    'display': {'size': (1600, 1200), 'quality': 80},
+}
+
+
+def variant_filename(filename):
+    return os.path.splitext(filename)[0] + '.webp'
+
+
+def variant_path(folder, variant, filename):
+    return os.path.join(folder, variant, variant_filename(filename))
+
+
+def missing_variants(folder, filename):
+    return [variant for variant in VARIANTS if not os.path.exists(variant_path(folder, variant, filename))]
+
+
+# Write every missing variant of one screenshot (runs on a worker thread)
+def make_variants(folder, filename, force=False):
+    if Image is None:
+        return []
+    variants = list(VARIANTS) if force else missing_variants(folder, filename)
+    if not variants:
+        return []
+
+    with Image.open(os.path.join(folder, filename)) as image:
+        # GIFs and palette images are flattened to their first frame in RGB(A)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        for variant in variants:
+            options = VARIANTS[variant]
+            copy = image.copy()
+            copy.thumbnail(options['size'])
+
+            path = variant_path(folder, variant, filename)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp name first so a half-written file is never served
+            temp_path = f'{path}.{threading.get_ident()}.tmp'
+            copy.save(temp_path, 'WEBP', quality=options['quality'], method=4)
+            os.replace(temp_path, path)
+    return variants
+
+
+class ScreenshotProcessor:
+    # Thread pool for screenshot work that shouldn't hold up a request:
+    # producing variants after upload and deleting unreferenced blobs after commit
+
+    def __init__(self, folder, database, workers=2):
+        self.folder = folder
+        self.database = database
+        self.workers = workers
+        self._executor = None
+        # Filenames queued or being processed, so repeated requests don't pile up duplicate jobs
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return Image is not None
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='screenshots')
+        return self._executor
+
+    def submit(self, filename):
+        if not self.enabled or not filename:
+            return None
+        with self._lock:
+            if filename in self._pending:
+                return None
+            self._pending.add(filename)
+        future = self._pool().submit(make_variants, self.folder, filename)
+        future.add_done_callback(lambda f: self._done(f, filename))
+        return future
+
+    def _done(self, future, filename):
+        with self._lock:
+            self._pending.discard(filename)
+        if future.exception() is not None:
+            logger.error('Could not process screenshot %s: %s', filename, future.exception())
+
+    # Queue blobs whose reference was just dropped; the worker deletes the ones
+    # that are still unreferenced once it gets to them
+    def release(self, filenames):
+        filenames = [filename for filename in filenames if filename]
+        if not filenames:
+            return None
+        future = self._pool().submit(self._release, filenames)
+        future.add_done_callback(lambda f: self._released(f, filenames))
+        return future
+
+    def _release(self, filenames):
+        conn = connect(self.database)
+        try:
+            return release_screenshots(conn, self.folder, filenames)
+        finally:
+            conn.close()
+
+    def _released(self, future, filenames):
+        if future.exception() is not None:
+            logger.error('Could not release screenshots %s: %s', filenames, future.exception())
+        elif future.result():
+            logger.info('Released %s (%d bytes reclaimed)', filenames, future.result())
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+def original_screenshots(folder, extensions):
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.rsplit('.', 1)[-1].lower() in extensions:
+                yield entry.name
+
+
+# Content-addressed storage.  Uploads are stored once under the SHA-256 of
+# their bytes and screenshot_blobs.ref_count (maintained by triggers on
+# trades.screenshot_filename) tracks how many trades point at each blob.
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class StagedUpload:
+    def __init__(self, temp_path, digest, size, extension):
+        self.temp_path = temp_path
+        self.digest = digest
+        self.size = size
+        self.extension = extension
+
+    @property
+    def filename(self):
+        return f'{self.digest}.{self.extension}'
+
+    def discard(self):
+        if self.temp_path and os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+        self.temp_path = None
+
+
+# Stream an upload to a temp file in the upload folder, hashing it on the way
+def stage_upload(folder, stream, extension):
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=folder, prefix='.upload-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(HASH_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return StagedUpload(temp_path, digest.hexdigest(), size, extension.lower())
+
+
+# Register a staged upload inside the caller's write transaction and move it
+# into place unless an identical blob already exists.  The INSERT takes the
+# database write lock first, and blobs are only ever removed while holding
+# that lock too (release_screenshots), so a blob can't vanish in between.
+def commit_upload(conn, folder, staged):
+    conn.execute('''
+        INSERT OR IGNORE INTO screenshot_blobs (filename, size_bytes) VALUES (?, ?)
+    ''', (staged.filename, staged.size))
+
+    path = os.path.join(folder, staged.filename)
+    if os.path.exists(path):
+        staged.discard()
+    else:
+        os.replace(staged.temp_path, path)
+        staged.temp_path = None
+    return staged.filename
+
+
+def remove_screenshot_files(folder, filename):
+    reclaimed = 0
+    for path in [os.path.join(folder, filename)] + [variant_path(folder, v, filename) for v in VARIANTS]:
+        try:
+            reclaimed += os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return reclaimed
+
+
+# Delete blobs nobody references any more.  Call after the transaction that
+# dropped the references has committed.
+def release_screenshots(conn, folder, filenames):
+    reclaimed = 0
+    for filename in filenames:
+        if not filename:
+            continue
+        deleted = conn.execute(
+            'DELETE FROM screenshot_blobs WHERE filename = ? AND ref_count <= 0', (filename,)
+        ).rowcount
+        if deleted:
+            reclaimed += remove_screenshot_files(folder, filename)
+        conn.commit()
+    return reclaimed
+
+
+# Reconcile the upload folder with trades.screenshot_filename in bulk: delete
+# files no trade references (including stale temp uploads and variants of
+# deleted blobs), drop dead blob rows and correct drifted reference counts.
+# Files younger than the grace period are left alone because they may belong
+# to an upload whose transaction hasn't committed yet.
+def sweep_orphans(conn, folder, extensions, grace_seconds=3600, dry_run=False):
+    started = time.monotonic()
+    cutoff = time.time() - grace_seconds
+
+    # One directory listing per folder; scandir gives us the stat data cheaply
+    on_disk = set()
+    candidates = []  # (name used for matching, path, size)
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            on_disk.add(entry.name)
+            stat = entry.stat()
+            if stat.st_mtime > cutoff:
+                continue
+            if entry.name.startswith('.upload-') and entry.name.endswith('.tmp'):
+                candidates.append((None, entry.path, stat.st_size))
+            elif entry.name.rsplit('.', 1)[-1].lower() in extensions:
+                candidates.append((entry.name, entry.path, stat.st_size))
+
+    variant_candidates = []  # (stem, path, size)
+    for variant in VARIANTS:
+        variant_folder = os.path.join(folder, variant)
+        if not os.path.isdir(variant_folder):
+            continue
+        with os.scandir(variant_folder) as entries:
+            for entry in entries:
+                stat = entry.stat()
+                if entry.is_file() and stat.st_mtime <= cutoff:
+                    variant_candidates.append((entry.name.rsplit('.', 1)[0], entry.path, stat.st_size))
+
+    # Read the references under the write lock so nothing commits a new
+    # reference to a file between the check and the delete
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        references = Counter(name for (name,) in cursor.execute(
+            'SELECT screenshot_filename FROM trades WHERE screenshot_filename IS NOT NULL'))
+        live_stems = {os.path.splitext(name)[0] for name in references}
+
+        orphans = [(path, size) for name, path, size in candidates if name is None or name not in references]
+        orphans += [(path, size) for stem, path, size in variant_candidates if stem not in live_stems]
+
+        blobs = dict(cursor.execute('SELECT filename, ref_count FROM screenshot_blobs'))
+        dead_blobs = [(filename,) for filename in blobs if filename not in references]
+        corrected = [(references[filename], filename) for filename, count in blobs.items()
+                     if filename in references and count != references[filename]]
+
+        reclaimed = 0
+        if not dry_run:
+            conn.executemany('DELETE FROM screenshot_blobs WHERE filename = ?', dead_blobs)
+            conn.executemany('UPDATE screenshot_blobs SET ref_count = ? WHERE filename = ?', corrected)
+            for path, size in orphans:
+                try:
+                    os.remove(path)
+                    reclaimed += size
+                except FileNotFoundError:
+                    pass
+            conn.commit()
+        else:
+            reclaimed = sum(size for path, size in orphans)
+            conn.rollback()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    return {
+        'scanned': len(on_disk) + len(variant_candidates),
+        'orphans': len(orphans),
+        'reclaimed_bytes': reclaimed,
+        'dead_blobs': len(dead_blobs),
+        'corrected_counts': len(corrected),
+        'missing': sorted(name for name in references if name not in on_disk),
+        'dry_run': dry_run,
+        'seconds': round(time.monotonic() - started, 3)
+    }
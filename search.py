@@ -0,0 +1,166 @@
+import re
+
+from markupsafe import Markup, escape
+
+# Full-text search over trades (ticker, notes) and economic events (title,
+# description) through the external-content FTS5 tables trades_fts and
+# events_fts, which triggers keep in sync with their source tables.
+# Recurring events aren't rows there; their series are matched separately
+# by search_series().
+SEARCH_PAGE_SIZE = 20
+SNIPPET_TOKENS = 16
+MAX_QUERY_TERMS = 10
+
+# bm25 is by far the most expensive part of a query, so only the newest
+# SEARCH_RANK_POOL matches are ranked and counted.  FTS5 walks its doclists
+# in rowid order, so it can stop there, and a search that matches more than
+# this is too broad to page through anyway.
+SEARCH_RANK_POOL = 500
+
+# The CROSS JOINs pin the FTS table as the outer loop; otherwise the planner
+# may walk all of the user's rows through the user_id index and run the
+# full-text match once per row
+SEARCH_QUERIES = {
+    'trades': '''
+        SELECT trades.id, trades.ticker, trades.date, trades.direction, trades.outcome,
+               trades.account_pnl, trades.notes
+        FROM (
+            SELECT trades.id, bm25(trades_fts, 2.0, 1.0) AS score
+            FROM trades_fts
+            CROSS JOIN trades ON trades.id = trades_fts.rowid
+            WHERE trades_fts MATCH ? AND trades.user_id = ?
+            ORDER BY trades_fts.rowid DESC
+            LIMIT ?
+        ) AS ranked
+        CROSS JOIN trades ON trades.id = ranked.id
+        ORDER BY ranked.score, trades.id DESC
+        LIMIT ? OFFSET ?
+    ''',
+    'events': '''
+        SELECT economic_events.id, economic_events.title, economic_events.event_date,
+               economic_events.event_type, economic_events.importance, economic_events.description
+        FROM (
+            SELECT economic_events.id, bm25(events_fts, 2.0, 1.0) AS score
+            FROM events_fts
+            CROSS JOIN economic_events ON economic_events.id = events_fts.rowid
+            WHERE events_fts MATCH ? AND economic_events.user_id = ?
+            ORDER BY events_fts.rowid DESC
+            LIMIT ?
+        ) AS ranked
+        CROSS JOIN economic_events ON economic_events.id = ranked.id
+        ORDER BY ranked.score, economic_events.id DESC
+        LIMIT ? OFFSET ?
+    ''',
+}
+
+COUNT_QUERIES = {
+    'trades': '''
+        SELECT COUNT(*) FROM (
+            SELECT 1 FROM trades_fts CROSS JOIN trades ON trades.id = trades_fts.rowid
+            WHERE trades_fts MATCH ? AND trades.user_id = ?
+            LIMIT ?
+        )
+    ''',
+    'events': '''
+        SELECT COUNT(*) FROM (
+            SELECT 1 FROM events_fts CROSS JOIN economic_events ON economic_events.id = events_fts.rowid
+            WHERE events_fts MATCH ? AND economic_events.user_id = ?
+            LIMIT ?
+        )
+    ''',
+}
+
+# Column the snippet is cut from, and the one used when that is empty
+SNIPPET_COLUMNS = {
+    'trades': ('notes', 'ticker'),
+    'events': ('description', 'title'),
+}
+
+
+# Words of the search, lowercased; a trailing * marks a prefix term
+def query_terms(text):
+    return [term.lower() for term in re.findall(r'\w+\*?', text or '')][:MAX_QUERY_TERMS]
+
+
+# Turn the words of a search into a safe FTS5 query.  Every word is quoted,
+# so stray quotes or operators in the input can't produce a syntax error, and
+# all of them must match.  Prefix terms are opt-in: FTS5 has to merge the
+# whole doclist of every matching token before it can return a row.
+def fts_query(terms):
+    return ' '.join(f'"{term[:-1]}"*' if term.endswith('*') else f'"{term}"' for term in terms)
+
+
+def match_pattern(terms):
+    words = []
+    for term in terms:
+        if term.endswith('*'):
+            words.append(rf'\b{re.escape(term[:-1])}\w*')
+        else:
+            words.append(rf'\b{re.escape(term)}\b')
+    return re.compile(f"({'|'.join(words)})", re.IGNORECASE)
+
+
+# A window of about SNIPPET_TOKENS words around the first match, HTML
+# escaped with the matches wrapped in <mark>.  Built here for just the page
+# being shown; FTS5's snippet() would be evaluated for every ranked match.
+def make_snippet(text, pattern, tokens=SNIPPET_TOKENS):
+    words = (text or '').split()
+    if not words:
+        return Markup('')
+    first = next((i for i, word in enumerate(words) if pattern.search(word)), 0)
+    start = max(0, min(first - tokens // 4, len(words) - tokens))
+    end = start + tokens
+
+    parts = []
+    for word in words[start:end]:
+        pieces = pattern.split(word)
+        parts.append(''.join(
+            f'<mark>{escape(piece)}</mark>' if i % 2 else str(escape(piece))
+            for i, piece in enumerate(pieces)
+        ))
+    snippet = ' '.join(parts)
+    if start > 0:
+        snippet = '...' + snippet
+    if end < len(words):
+        snippet += '...'
+    return Markup(snippet)
+
+
+# One page of ranked hits plus the number of matches, which stops counting
+# at SEARCH_RANK_POOL
+def search_journal(conn, user_id, kind, text, page=1, page_size=SEARCH_PAGE_SIZE):
+    terms = query_terms(text)
+    if not terms:
+        return [], 0
+    query = fts_query(terms)
+    total = conn.execute(COUNT_QUERIES[kind], (query, user_id, SEARCH_RANK_POOL)).fetchone()[0]
+    rows = conn.execute(SEARCH_QUERIES[kind],
+                        (query, user_id, SEARCH_RANK_POOL, page_size, (page - 1) * page_size)).fetchall()
+
+    pattern = match_pattern(terms)
+    column, fallback = SNIPPET_COLUMNS[kind]
+    hits = []
+    for row in rows:
+        hit = dict(row)
+        hit['snippet'] = make_snippet(hit.pop(column) or row[fallback], pattern)
+        hits.append(hit)
+    return hits, total
+
+
+# The user's recurring series whose title or description contains every word
+# of the search.  Their occurrences have no rows to index, and a user has a
+# handful of series at most, so they are matched here instead of in FTS5.
+def search_series(conn, user_id, text):
+    terms = query_terms(text)
+    if not terms:
+        return []
+    term_patterns = [match_pattern([term]) for term in terms]
+    pattern = match_pattern(terms)
+    hits = []
+    for series in conn.execute('SELECT * FROM event_series WHERE user_id = ? ORDER BY id', (user_id,)):
+        searched = f"{series['title']} {series['description'] or ''}"
+        if all(term_pattern.search(searched) for term_pattern in term_patterns):
+            hit = dict(series)
+            hit['snippet'] = make_snippet(series['description'] or series['title'], pattern)
+            hits.append(hit)
+    return hits
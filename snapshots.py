@@ -0,0 +1,316 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, see snapshot_lock()
+    fcntl = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; without it snapshots are unavailable
+    pa = None
+
+# Columnar snapshots of trades and economic_events for offline analysis.
+# A snapshot lives in its own directory (one per user, or 'all' for the
+# whole journal) as Arrow IPC files with typed columns: dates as date32,
+# created_at as a timestamp, low-cardinality text as dictionary-encoded
+# categoricals and P&L as float64.  IPC files can be memory-mapped, so
+# loading one costs next to nothing however many rows it holds.
+#
+# The first run writes a base segment per table; later runs only append a
+# delta segment with the rows change_log says changed since the snapshot's
+# seq (see migrations.create_change_log), deleted rows included as
+# tombstones.  read_snapshot() lets the last version of each id win.  Once
+# a table has more than SNAPSHOT_MAX_SEGMENTS segments they are merged back
+# into a single base, which is what notebooks should map directly:
+#
+#   table = pyarrow.ipc.open_file(pyarrow.memory_map(path)).read_all()
+#
+# manifest.json lists the live segments and is replaced atomically after
+# they are written; writers hold an flock on the directory.
+#
+# The events table holds one-off economic_events rows only.  Occurrences of
+# recurring events are computed from rules that may never end, so they have
+# no rows for change_log to track; /export/events lists them for a range.
+SNAPSHOT_BATCH_SIZE = 65536
+SNAPSHOT_MAX_SEGMENTS = 8
+MANIFEST_NAME = 'manifest.json'
+
+TRADE_SNAPSHOT_COLUMNS = (
+    ('id', 'int'), ('user_id', 'int'), ('date', 'date'), ('ticker', 'category'),
+    ('direction', 'category'), ('outcome', 'category'), ('close_reason', 'category'),
+    ('account_pnl', 'float'), ('notes', 'text'), ('screenshot_filename', 'text'),
+    ('created_at', 'timestamp'),
+)
+EVENT_SNAPSHOT_COLUMNS = (
+    ('id', 'int'), ('user_id', 'int'), ('event_date', 'date'), ('event_type', 'category'),
+    ('title', 'text'), ('description', 'text'), ('importance', 'category'), ('source_url', 'text'),
+    ('created_at', 'timestamp'),
+)
+
+# Snapshot name -> (table, columns)
+SNAPSHOT_TABLES = {
+    'trades': ('trades', TRADE_SNAPSHOT_COLUMNS),
+    'events': ('economic_events', EVENT_SNAPSHOT_COLUMNS),
+}
+
+SNAPSHOT_FORMATS = {
+    'arrow': 'application/vnd.apache.arrow.file',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def snapshot_path(folder, user_id=None):
+    return os.path.join(folder, 'all' if user_id is None else f'user-{user_id}')
+
+
+def arrow_type(kind):
+    return {
+        'int': pa.int64(),
+        'float': pa.float64(),
+        'text': pa.string(),
+        'date': pa.date32(),
+        'timestamp': pa.timestamp('s'),
+        'category': pa.dictionary(pa.int32(), pa.string()),
+    }[kind]
+
+
+# Every segment carries a `deleted` flag; it is only ever set in deltas
+def snapshot_schema(columns):
+    return pa.schema([(name, arrow_type(kind)) for name, kind in columns] + [('deleted', pa.bool_())])
+
+
+class BatchBuilder:
+    # Turns row tuples (the snapshot columns followed by the deleted flag)
+    # into record batches.  Each categorical column keeps one dictionary for
+    # the whole segment that only ever grows, so the IPC writer emits it as
+    # deltas instead of repeating it in every batch.
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.schema = snapshot_schema(columns)
+        self._dictionaries = {name: {} for name, kind in columns if kind == 'category'}
+
+    def build(self, rows):
+        arrays = [self._array(name, kind, [row[i] for row in rows])
+                  for i, (name, kind) in enumerate(self.columns)]
+        arrays.append(pa.array([bool(row[-1]) for row in rows], pa.bool_()))
+        return pa.record_batch(arrays, schema=self.schema)
+
+    def _array(self, name, kind, values):
+        if kind == 'category':
+            dictionary = self._dictionaries[name]
+            indices = [None if value is None else dictionary.setdefault(value, len(dictionary)) for value in values]
+            return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), pa.array(list(dictionary), pa.string()))
+        # Dates are stored as text; anything that doesn't parse becomes null
+        if kind == 'date':
+            return pc.strptime(pa.array(values, pa.string()), format='%Y-%m-%d', unit='s',
+                               error_is_null=True).cast(pa.date32())
+        if kind == 'timestamp':
+            return pc.strptime(pa.array(values, pa.string()), format='%Y-%m-%d %H:%M:%S', unit='s',
+                               error_is_null=True)
+        return pa.array(values, arrow_type(kind))
+
+
+def full_query(table, columns, user_id=None):
+    sql = f"SELECT {', '.join(name for name, kind in columns)}, 0 FROM {table}"
+    if user_id is None:
+        return sql, []
+    return sql + ' WHERE user_id = ?', [user_id]
+
+
+# Current version of every row change_log recorded in since < seq <= until.
+# A row that no longer exists (or, in a user's snapshot, moved to another
+# user) comes back as a tombstone: its id with the deleted flag set.  The
+# unary + keeps SQLite on the seq (rowid) range for the whole journal rather
+# than walking the table's entire log through idx_change_log_row.
+def change_query(table, columns, since, until, user_id=None):
+    select = ', '.join('changed.row_id' if name == 'id' else f'{table}.{name}' for name, kind in columns)
+    changed = 'SELECT DISTINCT row_id FROM change_log WHERE +table_name = ? AND seq > ? AND seq <= ?'
+    join = f'{table}.id = changed.row_id'
+    params = [table, since, until]
+    if user_id is not None:
+        changed = 'SELECT DISTINCT row_id FROM change_log WHERE user_id = ? AND table_name = ? AND seq > ? AND seq <= ?'
+        join += f' AND {table}.user_id = ?'
+        params = [user_id, table, since, until, user_id]
+    return f'''
+        SELECT {select}, {table}.id IS NULL FROM ({changed}) AS changed
+        LEFT JOIN {table} ON {join}
+    ''', params
+
+
+def load_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'seq': 0, 'tables': {}}
+
+
+def save_manifest(path, manifest):
+    temp_path = os.path.join(path, MANIFEST_NAME + '.tmp')
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_path, os.path.join(path, MANIFEST_NAME))
+
+
+_local_lock = threading.Lock()
+
+
+# Serialize snapshot writers across threads and worker processes.  Without
+# flock (Windows dev servers, which run a single process) a process-wide
+# lock is enough.
+@contextmanager
+def snapshot_lock(path):
+    os.makedirs(path, exist_ok=True)
+    if fcntl is None:
+        with _local_lock:
+            yield
+        return
+    with open(os.path.join(path, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def ipc_options():
+    return pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+
+
+# Stream a query's rows into a new segment file.  An empty delta isn't
+# written at all (returns 0); a base is written even when empty so the
+# table's schema is always there.
+def write_segment(path, filename, builder, cursor, keep_empty=False):
+    temp_path = os.path.join(path, filename + '.tmp')
+    rows = 0
+    with pa.ipc.new_file(temp_path, builder.schema, options=ipc_options()) as writer:
+        while True:
+            batch = cursor.fetchmany(SNAPSHOT_BATCH_SIZE)
+            if not batch:
+                break
+            writer.write_batch(builder.build(batch))
+            rows += len(batch)
+    if rows == 0 and not keep_empty:
+        os.remove(temp_path)
+        return 0
+    os.replace(temp_path, os.path.join(path, filename))
+    return rows
+
+
+def write_table(path, filename, table):
+    temp_path = os.path.join(path, filename + '.tmp')
+    with pa.ipc.new_file(temp_path, table.schema, options=ipc_options()) as writer:
+        writer.write_table(table.unify_dictionaries())
+    os.replace(temp_path, os.path.join(path, filename))
+
+
+def read_segments(path, segments):
+    return [pa.ipc.open_file(pa.memory_map(os.path.join(path, segment['file']))).read_all()
+            for segment in segments]
+
+
+# One table from a base and its deltas: rows superseded by a later segment
+# and tombstones are dropped.  A lone base is returned as mapped, without
+# copying.
+def merge_segments(tables):
+    if len(tables) == 1:
+        return tables[0].drop_columns(['deleted'])
+    kept = []
+    later_ids = None
+    for table in reversed(tables):
+        if later_ids is not None:
+            table = table.filter(pc.invert(pc.is_in(table['id'], value_set=later_ids)))
+        kept.append(table)
+        ids = table['id'].combine_chunks()
+        later_ids = ids if later_ids is None else pa.concat_arrays([later_ids, ids])
+    table = pa.concat_tables(reversed(kept)).unify_dictionaries()
+    return table.filter(pc.invert(table['deleted'])).drop_columns(['deleted'])
+
+
+def read_snapshot(path, name):
+    segments = load_manifest(path)['tables'].get(name)
+    if not segments:
+        raise FileNotFoundError(f'No {name} snapshot in {path}')
+    return merge_segments(read_segments(path, segments))
+
+
+# Bring the snapshot in `path` up to date from one consistent read of the
+# database.  full rebuilds every table from scratch; compact merges each
+# table's segments into one base even below SNAPSHOT_MAX_SEGMENTS.  Call
+# with snapshot_lock(path) held.  Returns {name: rows written}.
+def update_snapshot(conn, path, user_id=None, full=False, compact=False, max_segments=SNAPSHOT_MAX_SEGMENTS):
+    os.makedirs(path, exist_ok=True)
+    manifest = load_manifest(path)
+    tables = dict(manifest['tables'])
+    written = {}
+    # Every segment file this run wrote; a delta can be merged away by the
+    # compaction that follows it
+    created = set()
+
+    conn.execute('BEGIN')
+    try:
+        seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM change_log').fetchone()[0]
+        for name, (table, columns) in SNAPSHOT_TABLES.items():
+            segments = tables.get(name, [])
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            written[name] = 0
+            if full or not segments:
+                cursor.execute(*full_query(table, columns, user_id))
+                filename = f'{name}-{seq:012d}-base.arrow'
+                written[name] = write_segment(path, filename, BatchBuilder(columns), cursor, keep_empty=True)
+                created.add(filename)
+                segments = [{'file': filename, 'rows': written[name]}]
+            elif seq > manifest['seq']:
+                cursor.execute(*change_query(table, columns, manifest['seq'], seq, user_id))
+                filename = f'{name}-{seq:012d}-delta.arrow'
+                written[name] = write_segment(path, filename, BatchBuilder(columns), cursor)
+                if written[name]:
+                    created.add(filename)
+                    segments = segments + [{'file': filename, 'rows': written[name]}]
+            cursor.close()
+
+            if len(segments) > max_segments or (compact and len(segments) > 1):
+                merged = merge_segments(read_segments(path, segments))
+                merged = merged.append_column('deleted', pa.repeat(False, len(merged)))
+                filename = f'{name}-{seq:012d}-base.arrow'
+                write_table(path, filename, merged)
+                segments = [{'file': filename, 'rows': len(merged)}]
+            tables[name] = segments
+    finally:
+        conn.rollback()
+
+    # Files the new manifest no longer lists go only once it is in place
+    live = {segment['file'] for segments in tables.values() for segment in segments}
+    old = {segment['file'] for segments in manifest['tables'].values() for segment in segments}
+    save_manifest(path, {'seq': seq, 'tables': tables})
+    for filename in (old | created) - live:
+        try:
+            os.remove(os.path.join(path, filename))
+        except FileNotFoundError:
+            pass
+    return written
+
+
+# Write a merged snapshot table as a single Arrow IPC or Parquet file; sink
+# is a path or a pyarrow output stream
+def export_snapshot_table(table, fmt, sink):
+    if fmt == 'parquet':
+        pq.write_table(table, sink)
+    else:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table.unify_dictionaries())
+
+
+def snapshot_bytes(table, fmt):
+    sink = pa.BufferOutputStream()
+    export_snapshot_table(table, fmt, sink)
+    return sink.getvalue().to_pybytes()
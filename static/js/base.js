@@ -0,0 +1,90 @@
+function showFullChart(filename) {
+    document.getElementById('fullChartImage').src = `/static/screenshots/${filename}`;
+    new bootstrap.Modal(document.getElementById('chartModal')).show();
+}
+
+// Enhanced file upload with modern animations
+function setupFileUpload() {
+    const fileInput = document.getElementById('screenshot');
+    const uploadArea = document.querySelector('.file-upload-area');
+
+    if (!fileInput || !uploadArea) return;
+
+    ['dragenter', 'dragover', 'dragleave', 'drop'].forEach(eventName => {
+        uploadArea.addEventListener(eventName, preventDefaults, false);
+    });
+
+    function preventDefaults(e) {
+        e.preventDefault();
+        e.stopPropagation();
+    }
+
+    ['dragenter', 'dragover'].forEach(eventName => {
+        uploadArea.addEventListener(eventName, () => {
+            uploadArea.classList.add('dragover');
+        }, false);
+    });
+
+    ['dragleave', 'drop'].forEach(eventName => {
+        uploadArea.addEventListener(eventName, () => {
+            uploadArea.classList.remove('dragover');
+        }, false);
+    });
+
+    uploadArea.addEventListener('drop', function(e) {
+        const dt = e.dataTransfer;
+        const files = dt.files;
+        fileInput.files = files;
+        updateFileLabel(files[0]);
+        animateSuccess();
+    });
+
+    fileInput.addEventListener('change', function() {
+        updateFileLabel(this.files[0]);
+        animateSuccess();
+    });
+
+    function updateFileLabel(file) {
+        const label = document.querySelector('.file-upload-text');
+        if (file && label) {
+            label.innerHTML = `<i class="fas fa-check-circle text-success me-2"></i>Selected: ${file.name}`;
+        }
+    }
+
+    function animateSuccess() {
+        uploadArea.style.transform = 'scale(1.05)';
+        setTimeout(() => {
+            uploadArea.style.transform = 'scale(1)';
+        }, 200);
+    }
+}
+
+// Loading animations
+function addLoadingState(button) {
+    const originalText = button.innerHTML;
+    button.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i>Processing...';
+    button.disabled = true;
+
+    setTimeout(() => {
+        button.innerHTML = originalText;
+        button.disabled = false;
+    }, 2000);
+}
+
+// Add smooth scroll behavior
+document.documentElement.style.scrollBehavior = 'smooth';
+
+document.addEventListener('DOMContentLoaded', function() {
+    setupFileUpload();
+
+    // Add hover effects to cards
+    document.querySelectorAll('.card').forEach(card => {
+        card.addEventListener('mouseenter', function() {
+            this.style.transform = 'translateY(-2px)';
+        });
+
+        card.addEventListener('mouseleave', function() {
+            this.style.transform = 'translateY(0)';
+        });
+    });
+});
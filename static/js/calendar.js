@@ -0,0 +1,72 @@
+// seriesUrl deletes the whole series and is empty for one-off events
+function showEventDetails(editUrl, deleteUrl, seriesUrl, title, type, date, description, importance, sourceUrl) {
+    document.getElementById('modalEventTitle').textContent = title;
+    document.getElementById('modalEventDate').textContent = new Date(date).toLocaleDateString();
+    document.getElementById('modalEventDescription').textContent = description || 'No description provided';
+
+    // Set event type badge
+    const typeBadge = document.getElementById('modalEventType');
+    typeBadge.textContent = type;
+    typeBadge.className = `badge bg-${getEventTypeColor(type)}`;
+
+    // Set importance badge
+    const importanceBadge = document.getElementById('modalEventImportance');
+    importanceBadge.textContent = importance;
+    importanceBadge.className = `badge bg-${getImportanceColor(importance)}`;
+
+    // Set source URL
+    const sourceLink = document.getElementById('modalEventSource');
+    if (sourceUrl) {
+        sourceLink.href = sourceUrl;
+        sourceLink.style.display = 'inline-block';
+    } else {
+        sourceLink.style.display = 'none';
+    }
+
+    // Set edit and delete URLs
+    document.getElementById('editEventBtn').href = editUrl;
+    document.getElementById('deleteEventBtn').href = deleteUrl;
+    const seriesButton = document.getElementById('deleteSeriesBtn');
+    seriesButton.href = seriesUrl || '#';
+    seriesButton.style.display = seriesUrl ? 'inline-block' : 'none';
+}
+
+function getEventTypeColor(type) {
+    const colors = {
+        'FOMC': 'warning',
+        'NFP': 'success',
+        'Petroleum': 'info',
+        'WASDE': 'primary',
+        'Other': 'secondary'
+    };
+    return colors[type] || 'secondary';
+}
+
+function getImportanceColor(importance) {
+    const colors = {
+        'High': 'danger',
+        'Medium': 'warning',
+        'Low': 'success'
+    };
+    return colors[importance] || 'secondary';
+}
+
+function updateCalendar() {
+    // Show a message about manually updating from sources
+    const modal = new bootstrap.Modal(document.getElementById('updateModal'));
+    modal.show();
+}
+
+// Add click handlers for calendar navigation
+document.addEventListener('DOMContentLoaded', function() {
+    // Add smooth animations to calendar interactions
+    document.querySelectorAll('.event-item').forEach(item => {
+        item.addEventListener('mouseenter', function() {
+            this.style.transform = 'translateX(4px) scale(1.02)';
+        });
+
+        item.addEventListener('mouseleave', function() {
+            this.style.transform = 'translateX(0) scale(1)';
+        });
+    });
+});
@@ -0,0 +1,91 @@
+function toggleTradeDetails(tradeId) {
+    const detailsElement = document.getElementById('details-' + tradeId);
+    const expandIndicator = document.querySelector(`[data-trade-id="${tradeId}"] .expand-indicator i`);
+
+    if (detailsElement.style.display === 'none' || detailsElement.style.display === '') {
+        // Fetch the detail panel the first time the trade is opened
+        if (!detailsElement.dataset.loaded) {
+            if (detailsElement.dataset.loading) return;
+            detailsElement.dataset.loading = 'true';
+            fetch(detailsElement.dataset.url)
+                .then(response => response.text())
+                .then(html => {
+                    detailsElement.innerHTML = html;
+                    detailsElement.dataset.loaded = 'true';
+                    delete detailsElement.dataset.loading;
+                    toggleTradeDetails(tradeId);
+                });
+            return;
+        }
+
+        // Expand
+        detailsElement.style.display = 'block';
+        expandIndicator.classList.remove('fa-chevron-down');
+        expandIndicator.classList.add('fa-chevron-up');
+        expandIndicator.parentElement.classList.add('expanded');
+
+        // Smooth animation
+        detailsElement.style.maxHeight = '0px';
+        detailsElement.style.opacity = '0';
+        setTimeout(() => {
+            detailsElement.style.maxHeight = '1000px';
+            detailsElement.style.opacity = '1';
+        }, 10);
+    } else {
+        // Collapse
+        detailsElement.style.maxHeight = '0px';
+        detailsElement.style.opacity = '0';
+        expandIndicator.classList.remove('fa-chevron-up');
+        expandIndicator.classList.add('fa-chevron-down');
+        expandIndicator.parentElement.classList.remove('expanded');
+
+        setTimeout(() => {
+            detailsElement.style.display = 'none';
+        }, 400);
+    }
+}
+
+// Append the next page of trades (keyset cursor comes from the previous page)
+function loadMoreTrades() {
+    const list = document.querySelector('.trades-list');
+    const cursor = list.dataset.nextCursor;
+    if (!cursor || list.dataset.loading) return;
+
+    list.dataset.loading = 'true';
+    fetch(`${list.dataset.url}&cursor=${encodeURIComponent(cursor)}`)
+        .then(response => {
+            list.dataset.nextCursor = response.headers.get('X-Next-Cursor') || '';
+            return response.text();
+        })
+        .then(html => {
+            list.insertAdjacentHTML('beforeend', html);
+            delete list.dataset.loading;
+            if (!list.dataset.nextCursor) {
+                document.querySelector('.trades-more').remove();
+            }
+        });
+}
+
+// Infinite scroll: load the next page as soon as the "Load More" button comes into view
+document.addEventListener('DOMContentLoaded', function() {
+    const more = document.querySelector('.trades-more');
+    if (more && 'IntersectionObserver' in window) {
+        new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadMoreTrades();
+            }
+        }).observe(more);
+    }
+});
+
+// Close all expanded details when clicking outside
+document.addEventListener('click', function(event) {
+    if (!event.target.closest('.trade-entry')) {
+        document.querySelectorAll('.trade-details').forEach(details => {
+            if (details.style.display !== 'none') {
+                const tradeId = details.id.replace('details-', '');
+                toggleTradeDetails(tradeId);
+            }
+        });
+    }
+});
@@ -0,0 +1,82 @@
+import pytest
+
+from database import connect
+from migrations import migrate
+from recurrence import build_series_rule
+
+
+# A fresh, fully migrated database per test.  It is the same file the app
+# fixtures below serve, so a test can seed rows here and request pages there.
+@pytest.fixture
+def db(tmp_path):
+    conn = connect(str(tmp_path / 'journal.db'))
+    migrate(conn, {'UPLOAD_FOLDER': str(tmp_path)})
+    yield conn
+    conn.close()
+
+
+# The app module pointed at that database, with empty caches
+@pytest.fixture
+def journal(tmp_path):
+    import app as journal
+    journal.create_app({
+        'DATABASE': str(tmp_path / 'journal.db'),
+        'UPLOAD_FOLDER': str(tmp_path),
+        'SNAPSHOT_FOLDER': str(tmp_path / 'snapshots'),
+        'TESTING': True,
+    })
+    journal.init_db()
+    journal.stats_cache.clear()
+    journal.occurrence_cache.clear()
+    yield journal
+    journal.shutdown_app()
+
+
+# Test clients logged in as a given user.  Following the login redirect
+# renders the welcome flash, which would otherwise switch off the next
+# page's ETag.
+@pytest.fixture
+def login(journal):
+    def login(username):
+        client = journal.app.test_client()
+        client.post('/login', data={'username': username, 'password': username}, follow_redirects=True)
+        return client
+    return login
+
+
+# Logged in as darren (user 1)
+@pytest.fixture
+def client(login):
+    return login('darren')
+
+
+# Insert and commit one trade in the test database; returns its id
+@pytest.fixture
+def add_trade(db):
+    def add_trade(user_id=1, date='2024-03-01', account_pnl=1.0, created_at='2024-03-01 10:00:00', **columns):
+        values = {'user_id': user_id, 'ticker': 'SPY', 'direction': 'Long', 'date': date, 'outcome': 'Win',
+                  'close_reason': 'TP', 'account_pnl': account_pnl, 'created_at': created_at, **columns}
+        placeholders = ', '.join('?' * len(values))
+        trade_id = db.execute(f'INSERT INTO trades ({", ".join(values)}) VALUES ({placeholders})',
+                              tuple(values.values())).lastrowid
+        db.commit()
+        return trade_id
+    return add_trade
+
+
+# A recurring event series; repeat and the rule arguments go through
+# build_series_rule as on the add event form
+@pytest.fixture
+def add_series(db):
+    def add_series(repeat='weekly', event_date='2024-03-01', user_id=1, title='Jobless Claims', event_type='Other',
+                   description='', importance='Medium', **rule_args):
+        rule = build_series_rule(repeat, event_date, **rule_args)
+        series_id = db.execute('''
+            INSERT INTO event_series (user_id, event_type, title, description, importance, rule, start_date,
+                                      end_date, interval, week_of_month, dates)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, event_type, title, description, importance, rule['rule'], rule['start_date'],
+              rule['end_date'], rule['interval'], rule['week_of_month'], rule['dates'])).lastrowid
+        db.commit()
+        return series_id
+    return add_series
@@ -0,0 +1,138 @@
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import load_advanced_stats
+
+REASONS = ('TP', 'Stop Loss', 'No Momentum', 'Earnings Fail', 'Other')
+
+
+# The advanced_stats computation as it was before the columnar engine: every
+# trade as a row, regrouped and re-filtered per breakdown.  Kept verbatim
+# apart from taking the rows as an argument.
+def baseline_advanced_stats(trades):
+    exit_reasons = {}
+    for trade in trades:
+        reason = trade['close_reason']
+        if reason not in exit_reasons:
+            exit_reasons[reason] = {'trades': [], 'total_pnl': 0, 'count': 0}
+        exit_reasons[reason]['trades'].append(trade)
+        exit_reasons[reason]['total_pnl'] += trade['account_pnl']
+        exit_reasons[reason]['count'] += 1
+
+    exit_stats = {}
+    for reason, data in exit_reasons.items():
+        wins = len([t for t in data['trades'] if t['account_pnl'] > 0])
+        losses = len([t for t in data['trades'] if t['account_pnl'] < 0])
+        breakevens = len([t for t in data['trades'] if t['account_pnl'] == 0])
+        exit_stats[reason] = {
+            'avg_return': round(data['total_pnl'] / data['count'], 2),
+            'win_rate': round((wins / data['count']) * 100, 1),
+            'frequency': round((data['count'] / len(trades)) * 100, 1),
+            'count': data['count'],
+            'wins': wins,
+            'losses': losses,
+            'breakevens': breakevens,
+            'total_pnl': round(data['total_pnl'], 2)
+        }
+
+    monthly_stats = {}
+    daily_stats = {'Monday': [], 'Tuesday': [], 'Wednesday': [], 'Thursday': [], 'Friday': [], 'Saturday': [], 'Sunday': []}
+    for trade in trades:
+        trade_date = datetime.strptime(trade['date'], '%Y-%m-%d')
+        month_key = trade_date.strftime('%Y-%m')
+        if month_key not in monthly_stats:
+            monthly_stats[month_key] = {'trades': [], 'month_name': trade_date.strftime('%B %Y')}
+        monthly_stats[month_key]['trades'].append(trade)
+        daily_stats[trade_date.strftime('%A')].append(trade)
+
+    monthly_performance = {}
+    for month_key, data in monthly_stats.items():
+        trades_list = data['trades']
+        wins = len([t for t in trades_list if t['account_pnl'] > 0])
+        total_pnl = sum([t['account_pnl'] for t in trades_list])
+        monthly_performance[month_key] = {
+            'month_name': data['month_name'],
+            'total_trades': len(trades_list),
+            'win_rate': round((wins / len(trades_list)) * 100, 1) if trades_list else 0,
+            'total_pnl': round(total_pnl, 2),
+            'avg_trade': round(total_pnl / len(trades_list), 2) if trades_list else 0
+        }
+
+    daily_performance = {}
+    for day, trades_list in daily_stats.items():
+        if trades_list:
+            wins = len([t for t in trades_list if t['account_pnl'] > 0])
+            total_pnl = sum([t['account_pnl'] for t in trades_list])
+            daily_performance[day] = {
+                'total_trades': len(trades_list),
+                'win_rate': round((wins / len(trades_list)) * 100, 1),
+                'total_pnl': round(total_pnl, 2),
+                'avg_trade': round(total_pnl / len(trades_list), 2)
+            }
+        else:
+            daily_performance[day] = {'total_trades': 0, 'win_rate': 0, 'total_pnl': 0, 'avg_trade': 0}
+
+    current_streak = 0
+    longest_win_streak = 0
+    longest_loss_streak = 0
+    temp_win_streak = 0
+    temp_loss_streak = 0
+    sorted_trades = sorted(trades, key=lambda x: x['date'])
+    for trade in sorted_trades:
+        if trade['account_pnl'] > 0:
+            temp_win_streak += 1
+            temp_loss_streak = 0
+            longest_win_streak = max(longest_win_streak, temp_win_streak)
+        elif trade['account_pnl'] < 0:
+            temp_loss_streak += 1
+            temp_win_streak = 0
+            longest_loss_streak = max(longest_loss_streak, temp_loss_streak)
+    if sorted_trades:
+        if sorted_trades[-1]['account_pnl'] > 0:
+            current_streak = temp_win_streak
+        elif sorted_trades[-1]['account_pnl'] < 0:
+            current_streak = -temp_loss_streak
+
+    return len(trades), exit_stats, {
+        'monthly': dict(sorted(monthly_performance.items(), reverse=True)),
+        'daily': daily_performance,
+        'streaks': {'current': current_streak, 'longest_win': longest_win_streak,
+                    'longest_loss': longest_loss_streak}
+    }
+
+
+# A random journal over a few months, with several trades on most days and
+# some that tie on created_at.  P&L values are multiples of 0.25 so sums are
+# exact whatever order they are added in, and the comparison can be equality.
+def random_journal(conn, rng):
+    start = date(2024, 1, 1)
+    for user_id in (1, 2):
+        for _ in range(rng.randint(0, 250)):
+            day = start + timedelta(days=rng.randrange(120))
+            created_at = f'{day} {rng.choice(("09:30", "10:00", "14:15"))}:00'
+            pnl = rng.choice((0.0, rng.randint(-40, 40) / 4))
+            conn.execute('''
+                INSERT INTO trades (user_id, ticker, direction, date, outcome, close_reason, account_pnl, created_at)
+                VALUES (?, 'SPY', 'Long', ?, 'Win', ?, ?, ?)
+            ''', (user_id, day.isoformat(), rng.choice(REASONS), pnl, created_at))
+    conn.commit()
+
+
+# The baseline read trades newest first and its streaks sorted them by date
+# alone, so same-day trades ran newest first.  Streaks now follow the equity
+# curve's (date, created_at, id) order; feeding the baseline rows in that
+# order makes its stable sort produce it.  The dicts compare regardless of
+# key order, so the other breakdowns are unaffected.
+BASELINE_ORDER = 'date, created_at, id'
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_matches_the_baseline_computation(db, seed):
+    random_journal(db, random.Random(seed))
+    for user_id in (1, 2):
+        trades = db.execute(f'SELECT * FROM trades WHERE user_id = ? ORDER BY {BASELINE_ORDER}',
+                            (user_id,)).fetchall()
+        expected = baseline_advanced_stats(trades) if trades else (0, {}, {})
+        assert load_advanced_stats(db, user_id) == expected
@@ -0,0 +1,83 @@
+import pytest
+
+API_URLS = ['/api/trades', '/api/stats', '/api/advanced_stats', '/api/calendar', '/api/event_impact']
+
+
+@pytest.mark.parametrize('url', API_URLS)
+def test_login_required_is_a_json_401(journal, url):
+    response = journal.app.test_client().get(url)
+    assert response.status_code == 401
+    assert response.get_json() == {'error': 'Login required'}
+
+
+# The API is read-only
+@pytest.mark.parametrize('url', API_URLS)
+def test_writes_are_not_allowed(client, url):
+    assert client.post(url).status_code == 405
+
+
+def test_trades_are_newest_first(client, add_trade):
+    older = add_trade(date='2024-03-01', ticker='QQQ')
+    newer = add_trade(date='2024-03-04')
+    add_trade(user_id=2)
+    body = client.get('/api/trades').get_json()
+    assert [trade['id'] for trade in body['trades']] == [newer, older]
+    assert body['trades'][1]['ticker'] == 'QQQ'
+    assert body['next_cursor'] is None
+
+
+# Other journals can be viewed, as on the dashboard, but not unknown ones
+def test_user_parameter(client, add_trade):
+    theirs = add_trade(user_id=2)
+    assert [trade['id'] for trade in client.get('/api/trades?user=2').get_json()['trades']] == [theirs]
+    assert client.get('/api/stats?user=2').get_json()['total_trades'] == 1
+    assert client.get('/api/trades?user=999').status_code == 404
+
+
+def test_stats(client, add_trade):
+    add_trade(account_pnl=2.0)
+    add_trade(account_pnl=-1.0)
+    add_trade(account_pnl=0.0)
+    stats = client.get('/api/stats').get_json()
+    assert stats['total_trades'] == 3
+    assert (stats['winning_trades'], stats['losing_trades'], stats['breakeven_trades']) == (1, 1, 1)
+    assert stats['total_pnl'] == 1.0
+    assert stats['risk_reward_ratio'] == 2.0
+
+
+def test_advanced_stats_with_an_equity_window(client, add_trade):
+    add_trade(date='2024-03-01', account_pnl=2.0)
+    add_trade(date='2024-03-04', account_pnl=-1.5, close_reason='Stop Loss')
+    add_trade(date='2024-03-05', account_pnl=1.0)
+    body = client.get('/api/advanced_stats').get_json()
+    assert body['trade_count'] == 3
+    assert set(body['exit_stats']) == {'TP', 'Stop Loss'}
+    assert body['monthly']['2024-03']['total_trades'] == 3
+    assert body['equity']['total_pnl'] == 1.5
+    assert body['equity']['max_drawdown'] == 1.5
+
+    window = client.get('/api/advanced_stats?start=2024-03-04&end=2024-03-05').get_json()['equity']
+    assert (window['total_trades'], window['total_pnl'], window['first_day']) == (2, -0.5, '2024-03-04')
+    assert client.get('/api/advanced_stats?start=March').status_code == 400
+
+
+def test_calendar_month(client, add_trade, db):
+    add_trade(date='2024-03-04', account_pnl=1.0)
+    add_trade(date='2024-03-04', account_pnl=-0.5)
+    add_trade(date='2024-04-01')
+    db.execute('''
+        INSERT INTO economic_events (user_id, event_type, event_date, title, importance)
+        VALUES (1, 'NFP', '2024-03-08', 'March NFP', 'High')
+    ''')
+    db.commit()
+    body = client.get('/api/calendar?year=2024&month=3').get_json()
+    assert (body['year'], body['month']) == (2024, 3)
+    assert body['days'] == {'2024-03-04': {'pnl': 0.5, 'count': 2}}
+    assert [event['title'] for event in body['events']['2024-03-08']] == ['March NFP']
+
+
+# Month navigation past either end of the year wraps into the next or previous year
+@pytest.mark.parametrize('query, expected', [('year=2024&month=13', (2025, 1)), ('year=2024&month=0', (2023, 12))])
+def test_calendar_month_wraps(client, query, expected):
+    body = client.get(f'/api/calendar?{query}').get_json()
+    assert (body['year'], body['month']) == expected
@@ -0,0 +1,69 @@
+import gzip
+import os
+import shutil
+
+import pytest
+
+import assets
+from assets import AssetManifest, compress_assets
+
+STATIC = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static')
+
+
+@pytest.fixture
+def static(tmp_path):
+    for directory in ('css', 'js'):
+        shutil.copytree(os.path.join(STATIC, directory), tmp_path / directory)
+    return tmp_path
+
+
+def test_compress_assets_writes_each_variant_once(static):
+    sources = len(list(static.glob('*/*.css')) + list(static.glob('*/*.js')))
+    encodings = 2 if assets.brotli else 1
+    assert compress_assets(str(static)) == (sources * encodings, 0)
+    assert compress_assets(str(static)) == (0, sources * encodings)
+    source = static / 'css' / 'base.css'
+    assert gzip.decompress((static / 'css' / 'base.css.gz').read_bytes()) == source.read_bytes()
+
+
+def test_brotli_copies(static):
+    brotli = pytest.importorskip('brotli')
+    compress_assets(str(static))
+    source = static / 'js' / 'base.js'
+    assert brotli.decompress((static / 'js' / 'base.js.br').read_bytes()) == source.read_bytes()
+
+
+@pytest.fixture
+def served(journal, static, monkeypatch):
+    compress_assets(str(static))
+    monkeypatch.setattr(journal.app, 'static_folder', str(static))
+    monkeypatch.setattr(journal, 'asset_manifest', AssetManifest(str(static)))
+    return journal.app.test_client()
+
+
+def test_best_accepted_variant_is_served(served, static):
+    response = served.get('/static/css/base.css', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == ('br' if assets.brotli else 'gzip')
+    assert response.mimetype == 'text/css'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    gzipped = served.get('/static/css/base.css', headers={'Accept-Encoding': 'gzip'})
+    assert gzip.decompress(gzipped.get_data()) == (static / 'css' / 'base.css').read_bytes()
+    plain = served.get('/static/css/base.css')
+    assert 'Content-Encoding' not in plain.headers
+
+
+# A copy older than its source is never served
+def test_stale_variant_is_ignored(served, static):
+    source = static / 'css' / 'base.css'
+    source.write_bytes(source.read_bytes() + b'\n/* edited */\n')
+    stat = os.stat(static / 'css' / 'base.css.gz')
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    response = served.get('/static/css/base.css', headers={'Accept-Encoding': 'gzip, br'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_data().endswith(b'/* edited */\n')
+
+
+def test_current_fingerprint_is_immutable(served, journal):
+    fingerprint = journal.asset_manifest.fingerprint('js/base.js')
+    assert 'immutable' in served.get(f'/static/js/base.js?v={fingerprint}').headers['Cache-Control']
+    assert 'immutable' not in served.get('/static/js/base.js?v=000000000000').headers.get('Cache-Control', '')
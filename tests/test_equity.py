@@ -0,0 +1,78 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from analytics import EquitySeries, load_equity_series
+
+DAYS = [(date(2024, 3, 1) + timedelta(days=n)).isoformat() for n in range(12)]
+
+
+def random_rows(rng):
+    days = sorted(rng.choice(DAYS) for _ in range(rng.randint(0, 60)))
+    return [(day, rng.choice((0.0, rng.randint(-12, 12) / 4))) for day in days]
+
+
+# Largest fall from an earlier (or the same) point to a later one, by trying every pair
+def brute_drawdown(values):
+    return max([values[i] - values[j] for i in range(len(values)) for j in range(i, len(values))], default=0.0)
+
+
+def brute_window(rows, start, end):
+    inside = [pnl for day, pnl in rows if (not start or day >= start) and (not end or day <= end)]
+    days = [day for day, _ in rows if (not start or day >= start) and (not end or day <= end)]
+    equity = [0.0]
+    for pnl in inside:
+        equity.append(equity[-1] + pnl)
+    wins = sum(pnl > 0 for pnl in inside)
+    return {
+        'trading_days': len(set(days)),
+        'total_trades': len(inside),
+        'winning_trades': wins,
+        'losing_trades': sum(pnl < 0 for pnl in inside),
+        'win_rate': round(wins / len(inside) * 100, 1) if inside else 0,
+        'total_pnl': round(equity[-1], 2),
+        'max_drawdown': round(brute_drawdown(equity), 2),
+        'first_day': days[0] if days else None,
+        'last_day': days[-1] if days else None,
+    }
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_max_drawdown_matches_every_pair(seed):
+    rng = random.Random(seed)
+    series = EquitySeries(random_rows(rng))
+    for _ in range(40):
+        lo = rng.randint(0, len(series))
+        hi = rng.randint(lo, len(series))
+        assert series.max_drawdown(lo, hi) == pytest.approx(brute_drawdown(series.equity[lo:hi + 1]))
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_window_matches_a_recompute(seed):
+    rng = random.Random(seed)
+    rows = random_rows(rng)
+    series = EquitySeries(rows)
+    bounds = [None, '2024-02-01', '2024-04-01'] + DAYS
+    for _ in range(40):
+        start, end = rng.choice(bounds), rng.choice(bounds)
+        assert series.window(start, end) == brute_window(rows, start, end)
+
+
+# The peak must come before the trough: a rise after a fall is not a drawdown
+def test_drawdown_needs_the_peak_first():
+    series = EquitySeries([('2024-03-01', -2.0), ('2024-03-02', 5.0), ('2024-03-03', -1.0)])
+    assert series.window()['max_drawdown'] == 2.0
+    assert series.window('2024-03-02')['max_drawdown'] == 1.0
+    assert series.window('2024-03-04') == brute_window([], None, None)
+
+
+# Same-day trades run in (created_at, id) order, so an intraday dip shows
+def test_loaded_series_runs_same_day_trades_in_order(db, add_trade):
+    add_trade(date='2024-03-01', account_pnl=-1.0, created_at='2024-03-01 15:00:00')
+    add_trade(date='2024-03-01', account_pnl=3.0, created_at='2024-03-01 09:30:00')
+    add_trade(date='2024-03-01', account_pnl=-2.0, created_at='2024-03-01 09:30:00')
+    series = load_equity_series(db, 1)
+    assert list(series.equity) == [0.0, 3.0, 1.0, 0.0]
+    assert series.window()['max_drawdown'] == 3.0
+    assert [value for _, value, _ in series.curve()] == [3.0, 1.0, 0.0]
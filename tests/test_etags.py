@@ -0,0 +1,63 @@
+import pytest
+
+PAGES = ['/', '/advanced_stats', '/api/stats', '/api/advanced_stats']
+
+
+@pytest.mark.parametrize('url', PAGES)
+def test_unchanged_page_answers_304(client, add_trade, url):
+    add_trade()
+    first = client.get(url)
+    assert first.status_code == 200
+    assert first.headers['ETag'].startswith('W/')
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+
+    again = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert again.get_data() == b''
+    assert again.headers['ETag'] == first.headers['ETag']
+
+
+@pytest.mark.parametrize('url', PAGES)
+def test_own_trade_change_invalidates(client, add_trade, url):
+    add_trade()
+    etag = client.get(url).headers['ETag']
+    add_trade(account_pnl=-2.0)
+    changed = client.get(url, headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+
+@pytest.mark.parametrize('url', PAGES)
+def test_other_users_trades_leave_the_page_cached(client, add_trade, url):
+    add_trade()
+    etag = client.get(url).headers['ETag']
+    add_trade(user_id=2)
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+
+# The ETag covers the URL and the logged-in user, not just the data version
+def test_etag_depends_on_query_and_user(client, login, add_trade):
+    add_trade()
+    etag = client.get('/').headers['ETag']
+    assert client.get('/?user=1').headers['ETag'] != etag
+    assert login('likith').get('/?user=1', headers={'If-None-Match': etag}).status_code == 200
+
+
+# A page with a flash message pending is rendered fresh and never cached
+def test_pending_flash_disables_the_etag(client, add_trade):
+    add_trade()
+    etag = client.get('/').headers['ETag']
+    client.get('/?user=999')  # flashes "User not found" and redirects
+    response = client.get('/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+    assert b'User not found' in response.get_data()
+
+
+# Cached summary stats are keyed on the data version, so they follow writes
+def test_cached_stats_follow_new_trades(client, add_trade):
+    add_trade(account_pnl=1.5)
+    assert client.get('/api/stats').get_json()['total_trades'] == 1
+    add_trade(account_pnl=-0.5)
+    stats = client.get('/api/stats').get_json()
+    assert (stats['total_trades'], stats['total_pnl']) == (2, 1.0)
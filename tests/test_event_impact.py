@@ -0,0 +1,135 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from analytics import EVENT_TYPE_ORDER, EVENT_WINDOW_MAX, IMPORTANCE_ORDER, impact_stats, sort_position
+from recurrence import is_occurrence, load_series
+
+REASONS = ('TP', 'Stop Loss', 'Other')
+TYPES = ('FOMC', 'NFP', 'Other')
+IMPORTANCES = ('High', 'Low')
+
+
+def day(n):
+    return date(2024, 3, 1) + timedelta(days=n)
+
+
+# Trades over two months, one-off events, and a weekly series with a
+# cancelled occurrence.  P&L values are multiples of 0.25 so sums are exact.
+def random_journal(db, add_series, rng):
+    for _ in range(rng.randint(0, 60)):
+        db.execute('''
+            INSERT INTO trades (user_id, ticker, direction, date, outcome, close_reason, account_pnl)
+            VALUES (?, 'SPY', 'Long', ?, 'Win', ?, ?)
+        ''', (rng.choice((1, 1, 2)), day(rng.randrange(60)).isoformat(), rng.choice(REASONS),
+              rng.choice((0.0, rng.randint(-8, 8) / 4))))
+    for _ in range(rng.randint(0, 8)):
+        db.execute('''
+            INSERT INTO economic_events (user_id, event_type, event_date, title, importance) VALUES (?, ?, ?, 'E', ?)
+        ''', (rng.choice((1, 1, 2)), rng.choice(TYPES), day(rng.randrange(-15, 75)).isoformat(),
+              rng.choice(IMPORTANCES)))
+    db.commit()
+    if rng.random() < 0.7:
+        first, interval = day(rng.randrange(-20, 40)), rng.randint(1, 3)
+        series_id = add_series('weekly', first.isoformat(), event_type=rng.choice(TYPES),
+                               importance=rng.choice(IMPORTANCES), interval=interval)
+        cancelled = first + timedelta(weeks=interval * rng.randrange(4))
+        db.execute('INSERT INTO event_exceptions (series_id, occurrence_date, cancelled) VALUES (?, ?, 1)',
+                   (series_id, cancelled.isoformat()))
+        db.commit()
+
+
+# Every trade checked against every event window, one day at a time
+def recompute(db, user_id, before, after, start, end):
+    trades = db.execute('SELECT * FROM trades WHERE user_id = ? AND date >= ? AND date <= ?',
+                        (user_id, start or '0000', end or '9999')).fetchall()
+    first = db.execute('SELECT MIN(date), MAX(date) FROM trades WHERE user_id = ?', (user_id,)).fetchone()
+    if first[0] is None:
+        span = []
+    else:
+        events_from = date.fromisoformat(start or first[0]) - timedelta(days=after)
+        events_to = date.fromisoformat(end or first[1]) + timedelta(days=before)
+        span = [events_from + timedelta(days=n) for n in range((events_to - events_from).days + 1)]
+    in_span = {d.isoformat() for d in span}
+    events = [(row['event_date'], row['event_type'], row['importance'])
+              for row in db.execute('SELECT * FROM economic_events WHERE user_id = ?', (user_id,))
+              if row['event_date'] in in_span]
+    for series in load_series(db, user_id):
+        cancelled = {row[0] for row in db.execute(
+            'SELECT occurrence_date FROM event_exceptions WHERE series_id = ? AND cancelled', (series['id'],))}
+        events += [(d.isoformat(), series['event_type'], series['importance']) for d in span
+                   if is_occurrence(series, d) and d.isoformat() not in cancelled]
+
+    def rows(group):
+        by_reason = {}
+        for trade in group:
+            row = by_reason.setdefault(trade['close_reason'], {'close_reason': trade['close_reason'], 'trades': 0,
+                                                               'wins': 0, 'total_pnl': 0.0})
+            row['trades'] += 1
+            row['wins'] += trade['account_pnl'] > 0
+            row['total_pnl'] += trade['account_pnl']
+        return list(by_reason.values())
+
+    def near(trade, event_date):
+        event_day = date.fromisoformat(event_date)
+        return event_day - timedelta(days=before) <= date.fromisoformat(trade['date']) <= event_day + timedelta(days=after)
+
+    near_ids = {trade['id'] for trade in trades if any(near(trade, event[0]) for event in events)}
+    normal = impact_stats(rows([trade for trade in trades if trade['id'] not in near_ids]))
+    groups = []
+    for event_type, importance in sorted({event[1:] for event in events}):
+        dates = [event[0] for event in events if event[1:] == (event_type, importance)]
+        stats = impact_stats(rows([trade for trade in trades if any(near(trade, d) for d in dates)]))
+        stats.update({
+            'event_type': event_type,
+            'importance': importance,
+            'events': len(dates),
+            'win_rate_change': round(stats['win_rate'] - normal['win_rate'], 1) if stats['trades'] else None,
+            'avg_pnl_change': round(stats['avg_pnl'] - normal['avg_pnl'], 2) if stats['trades'] else None,
+        })
+        groups.append(stats)
+    groups.sort(key=lambda group: (sort_position(EVENT_TYPE_ORDER, group['event_type']),
+                                   sort_position(IMPORTANCE_ORDER, group['importance'])))
+    return {
+        'event_days': impact_stats(rows([trade for trade in trades if trade['id'] in near_ids])),
+        'normal_days': normal,
+        'groups': groups,
+    }
+
+
+@pytest.mark.parametrize('seed', range(25))
+def test_matches_a_recompute(journal, db, add_series, seed):
+    rng = random.Random(seed)
+    random_journal(db, add_series, rng)
+    for before, after, start, end in [(0, 0, None, None), (1, 2, None, None), (3, 0, '2024-03-10', None),
+                                      (0, 4, None, '2024-04-05'), (2, 2, '2024-03-20', '2024-03-25')]:
+        assert journal.load_user_event_impact(db, 1, before, after, start, end) == \
+            recompute(db, 1, before, after, start, end)
+
+
+# Occurrences of a recurring event count like one-off events, minus the
+# cancelled ones
+def test_recurring_events_have_windows(journal, client, db, add_trade, add_series):
+    add_trade(date='2024-03-01', account_pnl=2.0)
+    add_trade(date='2024-03-02', account_pnl=-1.0)
+    add_trade(date='2024-03-16', account_pnl=0.5)
+    add_trade(date='2024-03-20', account_pnl=0.5)
+    series_id = add_series('weekly', '2024-03-01', event_type='NFP', importance='High')
+    db.execute("INSERT INTO event_exceptions (series_id, occurrence_date, cancelled) VALUES (?, '2024-03-15', 1)",
+               (series_id,))
+    db.commit()
+    impact = journal.load_user_event_impact(db, 1, 0, 1, None, None)
+    assert [(group['event_type'], group['events'], group['trades']) for group in impact['groups']] == \
+        [('NFP', 2, 2)]
+    assert (impact['event_days']['trades'], impact['normal_days']['trades']) == (2, 2)
+    assert impact['groups'][0]['win_rate_change'] == -50.0
+
+    response = client.get('/event_impact?after=1')
+    assert response.status_code == 200
+    assert 'NFP' in response.get_data(as_text=True)
+
+
+@pytest.mark.parametrize('query', [f'before={EVENT_WINDOW_MAX + 1}', 'after=-1', 'start=March'])
+def test_bad_arguments_are_rejected(client, query):
+    assert client.get(f'/event_impact?{query}').status_code == 400
@@ -0,0 +1,117 @@
+import csv
+import io
+import json
+from datetime import date, timedelta
+
+import pytest
+
+from exporter import EXPORT_OCCURRENCE_DAYS, TRADE_EXPORT_COLUMNS, iter_row_batches, trade_export_query
+
+
+def seed_trades(add_trade):
+    return [
+        add_trade(date='2024-03-04', ticker='QQQ', close_reason='Stop Loss', account_pnl=-1.0),
+        add_trade(date='2024-03-01', notes='scaled out, "early"\nthen re-entered'),
+        add_trade(date='2024-03-05', created_at='2024-03-05 09:00:00'),
+        add_trade(user_id=2, date='2024-03-02'),
+    ]
+
+
+def test_csv_export_streams_own_trades_in_date_order(client, add_trade):
+    ids = seed_trades(add_trade)
+    response = client.get('/export/trades')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'].startswith('attachment; filename=trades-')
+    assert response.headers['Cache-Control'] == 'no-store'
+
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert tuple(rows[0]) == TRADE_EXPORT_COLUMNS
+    assert [int(row[0]) for row in rows[1:]] == [ids[1], ids[0], ids[2]]
+    # Commas, quotes and newlines in notes survive the round trip
+    assert rows[1][TRADE_EXPORT_COLUMNS.index('notes')] == 'scaled out, "early"\nthen re-entered'
+
+
+def test_ndjson_export_is_one_object_per_line(client, add_trade):
+    ids = seed_trades(add_trade)
+    response = client.get('/export/trades?format=ndjson')
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    trades = [json.loads(line) for line in lines]
+    assert [trade['id'] for trade in trades] == [ids[1], ids[0], ids[2]]
+    assert trades[1]['account_pnl'] == -1.0 and trades[1]['ticker'] == 'QQQ'
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('start=2024-03-02', [0, 2]),
+    ('end=2024-03-04', [1, 0]),
+    ('start=2024-03-02&end=2024-03-04', [0]),
+    ('ticker=qqq', [0]),
+    ('close_reason=TP', [1, 2]),
+])
+def test_trade_export_filters(client, add_trade, query, expected):
+    ids = seed_trades(add_trade)
+    response = client.get(f'/export/trades?format=ndjson&{query}')
+    assert [json.loads(line)['id'] for line in response.get_data(as_text=True).splitlines()] == \
+        [ids[i] for i in expected]
+
+
+def test_event_export(client, db):
+    db.executemany('''
+        INSERT INTO economic_events (user_id, event_type, event_date, title) VALUES (?, 'NFP', ?, ?)
+    ''', [(1, '2024-03-08', 'March NFP'), (1, '2024-02-02', 'February NFP'), (2, '2024-03-08', 'Not mine')])
+    db.commit()
+    rows = list(csv.DictReader(io.StringIO(client.get('/export/events').get_data(as_text=True))))
+    assert [row['title'] for row in rows] == ['February NFP', 'March NFP']
+
+
+@pytest.mark.parametrize('query', ['format=xml', 'start=yesterday', 'end=2024-13-01'])
+def test_bad_export_arguments_are_rejected(client, query):
+    assert client.get(f'/export/trades?{query}').status_code == 400
+
+
+# The export reads one snapshot: rows written after streaming started don't
+# show up halfway through
+def test_batches_come_from_one_snapshot(db, add_trade):
+    for day in range(1, 6):
+        add_trade(date=f'2024-03-0{day}')
+    sql, params = trade_export_query(1)
+    batches = iter_row_batches(db.execute('PRAGMA database_list').fetchone()['file'], sql, params, batch_size=2)
+    first = next(batches)
+    add_trade(date='2024-03-09')
+    rest = [row for batch in batches for row in batch]
+    assert len(first) == 2
+    assert len(first) + len(rest) == 5
+
+
+# Recurring events are exported as their occurrences, merged into date order
+# after the one-off events of the same day
+def test_event_export_expands_recurring_events(client, db, add_series):
+    series_id = add_series('weekly', '2024-03-01', until='2024-03-31')
+    db.execute('''
+        INSERT INTO economic_events (user_id, event_type, event_date, title) VALUES (1, 'NFP', '2024-03-08', 'March NFP')
+    ''')
+    db.execute('''
+        INSERT INTO event_exceptions (series_id, occurrence_date, cancelled) VALUES (?, '2024-03-22', 1)
+    ''', (series_id,))
+    db.commit()
+    rows = list(csv.DictReader(io.StringIO(client.get('/export/events').get_data(as_text=True))))
+    assert [(row['event_date'], row['title'], row['series_id']) for row in rows] == [
+        ('2024-03-01', 'Jobless Claims', str(series_id)), ('2024-03-08', 'March NFP', ''),
+        ('2024-03-08', 'Jobless Claims', str(series_id)), ('2024-03-15', 'Jobless Claims', str(series_id)),
+        ('2024-03-29', 'Jobless Claims', str(series_id))]
+    assert rows[0]['id'] == '' and rows[1]['id'] != ''
+
+    response = client.get('/export/events?format=ndjson&start=2024-03-09&end=2024-03-20')
+    events = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [(event['event_date'], event['occurrence_date']) for event in events] == [('2024-03-15', '2024-03-15')]
+
+
+# A series with no end date is only listed up to EXPORT_OCCURRENCE_DAYS ahead
+def test_open_ended_series_stops_at_the_horizon(journal, add_series):
+    add_series('weekly', '2024-03-01')
+    with journal.app.app_context():
+        events = journal.load_export_occurrences(journal.get_db_connection(), 1, '2024-03-01', None)
+    last = date.fromisoformat(events[-1]['event_date'])
+    assert date.today() + timedelta(days=EXPORT_OCCURRENCE_DAYS - 7) <= last
+    assert last < date.today() + timedelta(days=EXPORT_OCCURRENCE_DAYS)
@@ -0,0 +1,32 @@
+import pytest
+
+from analytics import HEATMAP_MAX_DAYS
+
+
+def test_year_heatmap(client, add_trade):
+    add_trade(date='2024-03-04', account_pnl=2.0)
+    add_trade(date='2024-03-05', account_pnl=-1.0)
+    response = client.get('/heatmap?year=2024')
+    assert response.status_code == 200
+    assert b'2025' in response.get_data()
+
+
+@pytest.mark.parametrize('query', ['year=0', 'year=9999', 'year=-5', 'year=abc', 'start=2024-03-05&end=2024-03-01',
+                                   'start=9999-12-31', 'start=March'])
+def test_bad_ranges_are_rejected(client, query):
+    assert client.get(f'/heatmap?{query}').status_code == 400
+
+
+# A long ?start=&end= range is cut to HEATMAP_MAX_DAYS rather than drawn in full
+def test_long_range_is_clamped(journal, client, monkeypatch):
+    grids = []
+    cached_heatmap = journal.cached_heatmap
+
+    def recording_heatmap(conn, user_id, version, start, end):
+        grids.append((start, end))
+        return cached_heatmap(conn, user_id, version, start, end)
+
+    monkeypatch.setattr(journal, 'cached_heatmap', recording_heatmap)
+    assert client.get('/heatmap?start=2000-01-01&end=2090-12-31').status_code == 200
+    start, end = grids[0]
+    assert (end - start).days == HEATMAP_MAX_DAYS
@@ -0,0 +1,137 @@
+import csv
+import io
+import sqlite3
+
+import pytest
+
+from importer import connection_writer, import_trades, parse_trade_row
+
+HEADER = 'ticker,direction,date,outcome,close_reason,account_pnl,notes\n'
+
+
+def trade_lines(count, start=0):
+    return ''.join(f'T{n},Long,2024-03-01,Win,TP,{n}.5,row {n}\n' for n in range(start, start + count))
+
+
+def imported_tickers(db, user_id=1):
+    return [row[0] for row in db.execute('SELECT ticker FROM trades WHERE user_id = ? ORDER BY id', (user_id,))]
+
+
+def test_parse_trade_row_normalizes_values():
+    row = {'ticker': ' spy ', 'direction': 'SELL', 'date': '2024-3-1', 'outcome': 'be',
+           'close_reason': ' TP ', 'account_pnl': '-1.25%'}
+    assert parse_trade_row(row) == ('SPY', 'Short', '2024-03-01', 'Breakeven', 'TP', -1.25, '')
+
+
+@pytest.mark.parametrize('field, value, message', [
+    ('direction', 'sideways', 'direction must be Long or Short'),
+    ('date', '03/01/2024', 'date must be YYYY-MM-DD'),
+    ('outcome', 'maybe', 'outcome must be Win, Loss or Breakeven'),
+    ('account_pnl', 'lots', 'account_pnl must be a number'),
+    ('account_pnl', 'nan', 'account_pnl must be a finite number'),
+    ('ticker', ' ', 'missing ticker'),
+])
+def test_parse_trade_row_rejects_bad_values(field, value, message):
+    row = {'ticker': 'SPY', 'direction': 'Long', 'date': '2024-03-01', 'outcome': 'Win',
+           'close_reason': 'TP', 'account_pnl': '1', field: value}
+    with pytest.raises(ValueError, match=message):
+        parse_trade_row(row)
+
+
+def test_imports_in_chunks_and_reports_bad_rows(db):
+    text = HEADER + trade_lines(3) + 'BAD,Long,not-a-date,Win,TP,1,\n\n' + trade_lines(2, start=3)
+    chunks = []
+    report = import_trades(connection_writer(db), 1, io.StringIO(text), chunk_size=2,
+                           on_chunk=lambda report: chunks.append(report.imported))
+    assert (report.rows, report.imported, report.error_count) == (6, 5, 1)
+    assert report.errors == [(5, "date must be YYYY-MM-DD, got 'not-a-date'")]
+    assert chunks == [2, 4, 5]
+    assert imported_tickers(db) == ['T0', 'T1', 'T2', 'T3', 'T4']
+    assert report.stopped is None and report.unconfirmed == 0
+
+
+def test_broker_header_aliases(db):
+    text = 'Symbol,Side,Trade Date,Result,Exit Reason,PnL %,Comment\nqqq,buy,2024-03-01,loss,Stop Loss,-2%,late\n'
+    report = import_trades(connection_writer(db), 1, io.StringIO(text))
+    assert report.imported == 1
+    row = db.execute('SELECT ticker, direction, outcome, account_pnl, notes FROM trades').fetchone()
+    assert tuple(row) == ('QQQ', 'Long', 'Loss', -2.0, 'late')
+
+
+@pytest.mark.parametrize('text, message', [
+    ('', 'The file is empty'),
+    ('ticker,direction,date\nSPY,Long,2024-03-01\n', 'Missing required column'),
+    ('x' * (csv.field_size_limit() + 1) + '\n', 'header row could not be read'),
+])
+def test_unusable_files_raise_before_writing(db, text, message):
+    with pytest.raises(ValueError, match=message):
+        import_trades(connection_writer(db), 1, io.StringIO(text))
+    assert imported_tickers(db) == []
+
+
+# A row the csv module can't read stops the import; chunks before it stay
+def test_unreadable_row_stops_after_saved_chunks(db):
+    text = HEADER + trade_lines(4) + 'T9,Long,2024-03-01,Win,TP,1,' + 'x' * (csv.field_size_limit() + 1) + '\n'
+    report = import_trades(connection_writer(db), 1, io.StringIO(text), chunk_size=2)
+    assert report.imported == 4
+    assert report.stopped.startswith('line 6 could not be read')
+    assert imported_tickers(db) == ['T0', 'T1', 'T2', 'T3']
+
+
+def test_database_error_stops_after_saved_chunks(db):
+    write = connection_writer(db)
+    calls = []
+
+    def failing_write(fn, *args):
+        calls.append(fn)
+        if len(calls) == 3:
+            raise sqlite3.OperationalError('disk I/O error')
+        return write(fn, *args)
+
+    report = import_trades(failing_write, 1, io.StringIO(HEADER + trade_lines(7)), chunk_size=2)
+    assert (report.imported, report.stopped) == (4, 'disk I/O error')
+    assert len(calls) == 3
+    assert imported_tickers(db) == ['T0', 'T1', 'T2', 'T3']
+
+
+def test_write_timeout_leaves_the_chunk_unconfirmed(db):
+    def slow_write(fn, *args):
+        raise TimeoutError()
+
+    report = import_trades(slow_write, 1, io.StringIO(HEADER + trade_lines(3)), chunk_size=2)
+    assert (report.imported, report.unconfirmed, report.stopped) == (0, 2, None)
+
+
+def upload(client, text, filename='trades.csv'):
+    return client.post('/import_trades', data={'file': (io.BytesIO(text.encode()), filename)},
+                       content_type='multipart/form-data')
+
+
+def test_upload_imports_through_the_writer_queue(client, db):
+    response = upload(client, HEADER + trade_lines(3))
+    assert response.status_code == 200
+    assert b'Imported 3 trades from trades.csv.' in response.get_data()
+    assert imported_tickers(db) == ['T0', 'T1', 'T2']
+
+
+def test_unreadable_header_is_reported_not_a_500(client, db):
+    response = upload(client, 'x' * (csv.field_size_limit() + 1) + '\n')
+    assert response.status_code == 200
+    assert b'Could not import trades.csv' in response.get_data()
+
+
+def test_oversized_upload_points_to_the_cli(journal, client, monkeypatch):
+    monkeypatch.setitem(journal.app.config, 'MAX_CONTENT_LENGTH', 1024)
+    response = upload(client, HEADER + trade_lines(100))
+    assert response.status_code == 413
+    assert b'import-trades command' in response.get_data()
+
+
+def test_upload_timeout_is_reported_as_unconfirmed(journal, client, db, monkeypatch):
+    def timeout(fn, *args, **kwargs):
+        raise TimeoutError()
+
+    monkeypatch.setattr(journal.write_queue, 'execute', timeout)
+    response = upload(client, HEADER + trade_lines(3))
+    assert response.status_code == 200
+    assert b'The last 3 may still be being written' in response.get_data()
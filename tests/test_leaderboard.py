@@ -0,0 +1,102 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from analytics import LEADERBOARD_SORTS, load_leaderboard, summary_stats
+
+
+# Several trades on most days, some tying on created_at, so streaks depend
+# on the (date, created_at, id) order.  P&L values are multiples of 0.25 so
+# sums are exact.
+def random_journal(conn, rng):
+    for user_id in (1, 2):
+        for _ in range(rng.randint(0, 80)):
+            day = date(2024, 3, 1) + timedelta(days=rng.randrange(20))
+            conn.execute('''
+                INSERT INTO trades (user_id, ticker, direction, date, outcome, close_reason, account_pnl, created_at)
+                VALUES (?, 'SPY', 'Long', ?, 'Win', 'TP', ?, ?)
+            ''', (user_id, day.isoformat(), rng.choice((0.0, rng.randint(-8, 8) / 4)),
+                  f'{day} {rng.choice(("09:30", "14:15"))}:00'))
+    conn.commit()
+
+
+# The leaderboard row for one user, from their trades in chronological order
+def recompute(conn, user, start, end):
+    rows = conn.execute('''
+        SELECT account_pnl FROM trades
+        WHERE user_id = ? AND date >= ? AND date <= ?
+        ORDER BY date, created_at, id
+    ''', (user['id'], start or '0000-00-00', end or '9999-99-99')).fetchall()
+    pnl = [row[0] for row in rows]
+    streak = longest_win = longest_loss = 0
+    for value in pnl:
+        if value > 0:
+            streak = streak + 1 if streak > 0 else 1
+        elif value < 0:
+            streak = streak - 1 if streak < 0 else -1
+        longest_win = max(longest_win, streak)
+        longest_loss = max(longest_loss, -streak)
+    stats = summary_stats({
+        'total_trades': len(pnl),
+        'winning_trades': sum(value > 0 for value in pnl),
+        'losing_trades': sum(value < 0 for value in pnl),
+        'breakeven_trades': sum(value == 0 for value in pnl),
+        'total_pnl': sum(pnl),
+        'win_pnl': sum(value for value in pnl if value > 0),
+        'loss_pnl': sum(value for value in pnl if value < 0),
+    } if pnl else None)
+    stats.update({
+        'user_id': user['id'],
+        'username': user['username'],
+        'display_name': user['display_name'],
+        # A breakeven last trade has no current streak
+        'current_streak': streak if pnl and pnl[-1] != 0 else 0,
+        'longest_win': longest_win,
+        'longest_loss': longest_loss,
+    })
+    return stats
+
+
+@pytest.mark.parametrize('seed', range(25))
+def test_matches_a_recompute(journal, db, seed):
+    rng = random.Random(seed)
+    random_journal(db, rng)
+    users = db.execute('SELECT id, username, display_name FROM users ORDER BY display_name').fetchall()
+    for start, end in [(None, None), ('2024-03-05', None), (None, '2024-03-12'), ('2024-03-08', '2024-03-08')]:
+        assert load_leaderboard(db, start, end) == [recompute(db, user, start, end) for user in users]
+
+
+# Display names in the order the table rows show them
+def board_names(client, url):
+    table = client.get(url).get_data(as_text=True).split('<tbody>')[1].split('</tbody>')[0]
+    return sorted(('Darren', 'Likith', 'Tanish'), key=table.index)
+
+
+def test_compare_page_sorts(client, add_trade):
+    add_trade(user_id=1, account_pnl=1.0)
+    add_trade(user_id=2, account_pnl=3.0)
+    add_trade(user_id=2, account_pnl=-1.0)
+    add_trade(user_id=3, account_pnl=0.5, date='2024-03-02')
+    add_trade(user_id=3, account_pnl=0.5, date='2024-03-03')
+    assert board_names(client, '/compare') == ['Likith', 'Darren', 'Tanish']
+    assert board_names(client, '/compare?sort=current_streak') == ['Tanish', 'Darren', 'Likith']
+
+
+@pytest.mark.parametrize('sort', LEADERBOARD_SORTS)
+def test_every_sort_renders(client, add_trade, sort):
+    add_trade()
+    assert client.get(f'/compare?sort={sort}&start=2024-03-01').status_code == 200
+
+
+@pytest.mark.parametrize('query', ['sort=username', 'start=March'])
+def test_bad_arguments_are_rejected(client, query):
+    assert client.get(f'/compare?{query}').status_code == 400
+
+
+# The leaderboard covers every journal, so anyone's trade changes its ETag
+def test_any_users_trade_invalidates(client, add_trade):
+    add_trade()
+    etag = client.get('/compare').headers['ETag']
+    add_trade(user_id=3)
+    assert client.get('/compare', headers={'If-None-Match': etag}).status_code == 200
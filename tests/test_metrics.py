@@ -0,0 +1,54 @@
+import pytest
+
+import metrics
+from metrics import InstrumentedConnection, Metrics
+from writer import WriteQueue
+
+
+def test_metrics_are_hidden_without_a_token(client, journal, monkeypatch):
+    monkeypatch.setitem(journal.app.config, 'METRICS_TOKEN', None)
+    assert client.get('/metrics').status_code == 404
+
+
+@pytest.mark.parametrize('authorization', [None, 'Bearer wrong', 'secret', 'Basic secret'])
+def test_metrics_need_the_bearer_token(journal, monkeypatch, authorization):
+    monkeypatch.setitem(journal.app.config, 'METRICS_TOKEN', 'secret')
+    headers = {'Authorization': authorization} if authorization else {}
+    response = journal.app.test_client().get('/metrics', headers=headers)
+    assert response.status_code == 401
+    assert response.headers['WWW-Authenticate'].startswith('Bearer')
+
+
+def test_metrics_report_requests_and_sql(client, journal, add_trade, monkeypatch):
+    monkeypatch.setitem(journal.app.config, 'METRICS_TOKEN', 'secret')
+    add_trade()
+    client.get('/')
+    response = journal.app.test_client().get('/metrics', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    assert 'journal_request_duration_seconds_count{endpoint="index",method="GET",status="200"}' in body
+    assert 'journal_request_sql_statements_count{endpoint="index"}' in body
+    assert 'journal_write_queue{stat="depth"}' in body
+
+
+def insert_trade(conn, pnl):
+    return conn.execute('''
+        INSERT INTO trades (user_id, ticker, direction, date, outcome, close_reason, account_pnl)
+        VALUES (1, 'SPY', 'Long', '2024-03-01', 'Win', 'TP', ?)
+    ''', (pnl,)).lastrowid
+
+
+# Writes run on the writer thread's connection but count toward the request
+# that waited on them
+def test_writer_sql_counts_toward_the_waiting_request(db):
+    queue = WriteQueue(db.execute('PRAGMA database_list').fetchone()['file'], factory=InstrumentedConnection)
+    recorder = Metrics()
+    recorder.begin_request()
+    try:
+        queue.execute(insert_trade, 1.0)
+        # BEGIN, SAVEPOINT, the INSERT, RELEASE and COMMIT
+        assert metrics._current.sql_statements == 5
+        assert metrics._current.sql_seconds > 0
+    finally:
+        recorder.end_request('test', 'POST', 200)
+        queue.shutdown()
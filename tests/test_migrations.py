@@ -0,0 +1,66 @@
+import pytest
+
+from analytics import daily_pnl_drift, user_stats_drift
+from database import connect
+from migrations import MIGRATIONS, SCHEMA_VERSION, migrate, schema_version
+
+
+def test_migrate_is_a_no_op_once_current(db):
+    assert schema_version(db) == SCHEMA_VERSION
+    assert migrate(db, {}) == []
+
+
+# A journal from before the rollups existed: the steps that add them seed
+# them from the trades already there
+def test_new_steps_seed_from_existing_trades(tmp_path):
+    (tmp_path / 'legacy.png').write_bytes(b'x' * 10)
+    conn = connect(str(tmp_path / 'journal.db'))
+    config = {'UPLOAD_FOLDER': str(tmp_path)}
+    migrate(conn, config, MIGRATIONS[:4])
+    conn.executemany('''
+        INSERT INTO trades (user_id, ticker, direction, date, outcome, close_reason, account_pnl, screenshot_filename)
+        VALUES (?, 'SPY', 'Long', ?, 'Win', 'TP', ?, ?)
+    ''', [(1, '2024-03-01', 1.5, 'legacy.png'), (1, '2024-03-01', -0.5, None),
+          (2, '2024-03-04', 0.0, 'legacy.png'), (2, '2024-03-05', 2.25, None)])
+    conn.commit()
+
+    applied = [name for name, ms in migrate(conn, config)]
+    assert applied == [step.__name__ for step in MIGRATIONS[4:]]
+    assert user_stats_drift(conn) == []
+    assert daily_pnl_drift(conn) == []
+    assert conn.execute('SELECT COUNT(*) FROM daily_pnl').fetchone()[0] == 3
+    assert tuple(conn.execute('SELECT size_bytes, ref_count FROM screenshot_blobs').fetchone()) == (10, 2)
+    conn.close()
+
+
+# A step that fails leaves the database at the last good version, and the
+# next run picks up from there
+def test_failed_step_is_rolled_back_and_retried(tmp_path):
+    conn = connect(str(tmp_path / 'journal.db'))
+
+    def broken_step(conn, config):
+        conn.execute('CREATE TABLE half_done (id INTEGER)')
+        raise RuntimeError('interrupted')
+
+    with pytest.raises(RuntimeError):
+        migrate(conn, {}, MIGRATIONS[:2] + (broken_step,))
+    assert schema_version(conn) == 2
+    assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'half_done'").fetchone()[0] == 0
+
+    applied = [name for name, ms in migrate(conn, {'UPLOAD_FOLDER': str(tmp_path)})]
+    assert applied == [step.__name__ for step in MIGRATIONS[2:]]
+    conn.close()
+
+
+# Each step re-checks the version under the write lock, so a second process
+# starting against the same file applies only what the first hasn't
+def test_second_process_skips_steps_already_applied(tmp_path):
+    path = str(tmp_path / 'journal.db')
+    config = {'UPLOAD_FOLDER': str(tmp_path)}
+    first, second = connect(path), connect(path)
+    migrate(first, config, MIGRATIONS[:6])
+    applied = [name for name, ms in migrate(second, config)]
+    assert applied == [step.__name__ for step in MIGRATIONS[6:]]
+    assert migrate(first, config) == []
+    first.close()
+    second.close()
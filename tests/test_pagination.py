@@ -0,0 +1,62 @@
+import pytest
+
+from app import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trips():
+    trade = {'date': '2024-03-01', 'created_at': '2024-03-01 10:00:00', 'id': 42}
+    cursor = encode_cursor(trade)
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == ('2024-03-01', '2024-03-01 10:00:00', 42)
+    assert decode_cursor('') is None
+    assert decode_cursor(None) is None
+
+
+# 'YWJj' is valid base64 for "abc"; the last one has a date that isn't one
+@pytest.mark.parametrize('cursor', ['garbage!!', 'YWJj', encode_cursor({'date': 'x', 'created_at': 'y', 'id': 1})])
+@pytest.mark.parametrize('url', ['/', '/trades', '/api/trades'])
+def test_invalid_cursor_is_rejected(client, url, cursor):
+    assert client.get(url, query_string={'cursor': cursor}).status_code == 400
+
+
+@pytest.mark.parametrize('limit', ['0', '-1', 'abc', '201'])
+@pytest.mark.parametrize('url', ['/', '/trades', '/api/trades'])
+def test_invalid_limit_is_rejected(client, url, limit):
+    assert client.get(url, query_string={'limit': limit}).status_code == 400
+
+
+def test_largest_limit_is_allowed(client):
+    assert client.get('/api/trades?limit=200').status_code == 200
+
+
+# Trades that tie on (date, created_at) are told apart by id, so pages split
+# inside a tie neither repeat nor skip a trade
+@pytest.mark.parametrize('limit', [1, 2, 3, 7])
+def test_pages_cover_ties_exactly_once(client, add_trade, limit):
+    ids = [add_trade(date='2024-03-04', created_at='2024-03-04 10:00:00') for _ in range(5)]
+    ids += [add_trade(date='2024-03-01', created_at=f'2024-03-01 1{n}:00:00') for n in range(3)]
+    ids += [add_trade(date='2024-03-05', created_at='2024-03-05 09:30:00') for _ in range(2)]
+    add_trade(user_id=2, date='2024-03-04', created_at='2024-03-04 10:00:00')
+    expected = ids[8:10][::-1] + ids[:5][::-1] + ids[5:8][::-1]
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        query = {'limit': limit, **({'cursor': cursor} if cursor else {})}
+        page = client.get('/api/trades', query_string=query).get_json()
+        assert len(page['trades']) <= limit
+        seen += [trade['id'] for trade in page['trades']]
+        pages += 1
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert seen == expected
+    assert pages == -(-len(expected) // limit)
+
+
+def test_row_fragments_follow_the_cursor_header(client, add_trade):
+    ids = [add_trade(date='2024-03-04', created_at='2024-03-04 10:00:00') for _ in range(3)]
+    first = client.get('/trades?limit=2')
+    assert first.headers['X-Next-Cursor']
+    last = client.get('/trades', query_string={'limit': 2, 'cursor': first.headers['X-Next-Cursor']})
+    assert last.headers['X-Next-Cursor'] == ''
+    assert f'data-trade-id="{ids[0]}"' in last.get_data(as_text=True)
@@ -0,0 +1,36 @@
+import pytest
+
+from analytics import load_equity_series, load_trade_columns
+from app import encode_cursor, decode_cursor, fetch_trade_page
+
+
+CURSOR_TRADE = {'date': '2024-03-01', 'created_at': '2024-03-01 10:00:00', 'id': 5}
+
+
+# Plans of every SELECT that fn(conn) runs
+def query_plans(conn, fn):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        fn(conn)
+    finally:
+        conn.set_trace_callback(None)
+    return {sql: [row['detail'] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql)]
+            for sql in statements if sql.lstrip().upper().startswith('SELECT')}
+
+
+# The trade list, the equity curve and the columnar load all want trades in
+# (date, created_at, id) order; idx_trades_user_date has to deliver it without
+# a sort, including past a keyset cursor
+@pytest.mark.parametrize('load', [
+    lambda conn: fetch_trade_page(conn, 1, None, 20),
+    lambda conn: fetch_trade_page(conn, 1, decode_cursor(encode_cursor(CURSOR_TRADE)), 20),
+    lambda conn: load_equity_series(conn, 1),
+    lambda conn: load_trade_columns(conn, 1),
+])
+def test_trade_order_comes_from_the_index(db, load):
+    plans = query_plans(db, load)
+    assert plans
+    for sql, plan in plans.items():
+        assert any('idx_trades_user_date' in detail for detail in plan), (sql, plan)
+        assert not any('TEMP B-TREE' in detail for detail in plan), (sql, plan)
@@ -0,0 +1,85 @@
+from datetime import date
+
+import pytest
+
+from recurrence import (build_series_rule, describe_series, is_occurrence, load_exceptions, load_series,
+                        series_occurrences)
+
+
+def occurrences(db, start, end, user_id=1):
+    return [(event['event_date'], event['title']) for event in series_occurrences(
+        load_series(db, user_id), load_exceptions(db, user_id, start.isoformat(), end.isoformat()), start, end)]
+
+
+@pytest.mark.parametrize('args, expected', [
+    (('weekly', '2024-03-01'), {'rule': 'weekly', 'start_date': '2024-03-01', 'end_date': None, 'interval': 1,
+                                'week_of_month': None, 'dates': None}),
+    (('monthly', '2024-03-15'), {'rule': 'monthly', 'start_date': '2024-03-15', 'end_date': None, 'interval': 1,
+                                 'week_of_month': 3, 'dates': None}),
+    (('monthly_last', '2024-03-27'), {'rule': 'monthly', 'start_date': '2024-03-27', 'end_date': None,
+                                      'interval': 1, 'week_of_month': -1, 'dates': None}),
+    (('dates', '2024-03-20', None, None, '2024-05-01, 2024-01-31'),
+     {'rule': 'dates', 'start_date': '2024-01-31', 'end_date': '2024-05-01', 'interval': 1,
+      'week_of_month': None, 'dates': '2024-01-31,2024-03-20,2024-05-01'}),
+])
+def test_build_series_rule(args, expected):
+    assert build_series_rule(*args) == expected
+
+
+@pytest.mark.parametrize('args, message', [
+    (('daily', '2024-03-01'), 'Unknown repeat option'),
+    (('weekly', '2024-03-01', 53), 'Repeat every 1 to 52 weeks'),
+    (('weekly', '2024-03-01', 1, '2024-02-01'), 'must end on or after'),
+    (('monthly_last', '2024-03-20'), 'is not the last Wednesday'),
+    (('dates', '2024-03-01', None, None, ''), 'at least one more date'),
+    (('dates', '2024-03-01', None, None, '2024-02-30'), 'valid YYYY-MM-DD'),
+])
+def test_build_series_rule_rejects(args, message):
+    with pytest.raises(ValueError, match=message):
+        build_series_rule(*args)
+
+
+def test_each_rule_expands_within_the_range(db, add_series):
+    add_series('weekly', '2024-03-01', interval=2, until='2024-04-30')
+    add_series('monthly', '2024-01-05', title='NFP', event_type='NFP')
+    add_series('monthly_last', '2024-01-31', title='Month end')
+    add_series('dates', '2024-03-20', title='FOMC', dates_text='2024-01-31 2024-05-01')
+    add_series('weekly', '2024-03-01', user_id=2, title='Not mine')
+    assert occurrences(db, date(2024, 3, 1), date(2024, 5, 1)) == [
+        ('2024-03-01', 'Jobless Claims'), ('2024-03-01', 'NFP'), ('2024-03-15', 'Jobless Claims'),
+        ('2024-03-20', 'FOMC'), ('2024-03-27', 'Month end'), ('2024-03-29', 'Jobless Claims'),
+        ('2024-04-05', 'NFP'), ('2024-04-12', 'Jobless Claims'), ('2024-04-24', 'Month end'),
+        ('2024-04-26', 'Jobless Claims'),
+    ]
+
+
+# Expanding a range years after the start costs the same as the first month
+def test_expansion_starts_at_the_range(db, add_series):
+    add_series('weekly', '2000-01-07')
+    assert occurrences(db, date(2024, 3, 1), date(2024, 3, 15)) == [
+        ('2024-03-01', 'Jobless Claims'), ('2024-03-08', 'Jobless Claims')]
+
+
+def test_exceptions_cancel_override_and_move(db, add_series):
+    series_id = add_series('weekly', '2024-03-01')
+    db.executemany('''
+        INSERT INTO event_exceptions (series_id, occurrence_date, cancelled, event_date, title)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [(series_id, '2024-03-08', 1, None, None),
+          (series_id, '2024-03-15', 0, None, 'Claims (revised)'),
+          (series_id, '2024-03-22', 0, '2024-04-02', None),   # moved out of the range
+          (series_id, '2024-02-23', 0, '2024-03-27', None)])  # moved into it
+    db.commit()
+    assert occurrences(db, date(2024, 3, 1), date(2024, 4, 1)) == [
+        ('2024-03-01', 'Jobless Claims'), ('2024-03-15', 'Claims (revised)'),
+        ('2024-03-27', 'Jobless Claims'), ('2024-03-29', 'Jobless Claims')]
+    assert ('2024-04-02', 'Jobless Claims') in occurrences(db, date(2024, 4, 1), date(2024, 4, 8))
+
+
+def test_is_occurrence_and_description():
+    series = {'rule': 'monthly', 'start_date': '2024-01-05', 'end_date': '2024-12-31', 'interval': 1,
+              'week_of_month': 1, 'dates': None}
+    assert is_occurrence(series, date(2024, 3, 1))
+    assert not is_occurrence(series, date(2024, 3, 8))
+    assert not is_occurrence(series, date(2025, 1, 3))
+    assert describe_series(series) == 'Monthly on the first Friday until 2024-12-31'
@@ -0,0 +1,78 @@
+import pytest
+
+from migrations import table_exists
+from search import fts_query, make_snippet, match_pattern, query_terms, search_journal
+
+
+@pytest.fixture(autouse=True)
+def fts(db):
+    if not table_exists(db, 'trades_fts'):
+        pytest.skip('SQLite was built without FTS5')
+
+
+def test_query_terms_are_quoted_words():
+    terms = query_terms('Gap AND "fade" OR earn* -NEAR(')
+    assert terms == ['gap', 'and', 'fade', 'or', 'earn*', 'near']
+    assert fts_query(terms) == '"gap" "and" "fade" "or" "earn"* "near"'
+    assert query_terms('  ?! ') == []
+
+
+def test_snippet_marks_matches_and_escapes():
+    pattern = match_pattern(['gap', 'earn*'])
+    snippet = make_snippet('<b>gap</b> up into earnings, faded the gaps', pattern)
+    assert str(snippet) == '&lt;b&gt;<mark>gap</mark>&lt;/b&gt; up into <mark>earnings</mark>, faded the gaps'
+    long = make_snippet(' '.join(['filler'] * 30 + ['gap'] + ['filler'] * 30), pattern, tokens=8)
+    assert str(long) == '...filler filler <mark>gap</mark> filler filler filler filler filler...'
+
+
+def test_only_own_matches_ranked_best_first(db, add_trade):
+    mine = add_trade(notes='gap fill')
+    better = add_trade(ticker='GAP', notes='gap and go on the gap')
+    add_trade(user_id=2, notes='gap fill')
+    add_trade(notes='opening range')
+    hits, total = search_journal(db, 1, 'trades', 'gap')
+    assert total == 2
+    assert [hit['id'] for hit in hits] == [better, mine]
+
+
+def test_edits_and_deletes_reach_the_index(db, add_trade):
+    trade = add_trade(notes='gap fill')
+    db.execute("UPDATE trades SET notes = 'opening range' WHERE id = ?", (trade,))
+    db.commit()
+    assert search_journal(db, 1, 'trades', 'gap') == ([], 0)
+    assert search_journal(db, 1, 'trades', 'open*')[1] == 1
+    db.execute('DELETE FROM trades WHERE id = ?', (trade,))
+    db.commit()
+    assert search_journal(db, 1, 'trades', 'opening') == ([], 0)
+
+
+def test_event_search(db):
+    db.executemany('''
+        INSERT INTO economic_events (user_id, event_type, event_date, title, description) VALUES (?, 'CPI', ?, ?, ?)
+    ''', [(1, '2024-03-12', 'CPI release', 'hot print'), (2, '2024-03-12', 'CPI release', '')])
+    db.commit()
+    hits, total = search_journal(db, 1, 'events', 'cpi')
+    assert total == 1
+    assert hits[0]['title'] == 'CPI release' and str(hits[0]['snippet']) == 'hot print'
+
+
+def test_search_page(client, add_trade):
+    add_trade(notes='faded the gap')
+    response = client.get('/search?q=gap')
+    assert response.status_code == 200
+    assert b'<mark>gap</mark>' in response.get_data()
+    # Operators and stray quotes are searched as words, never a syntax error
+    assert client.get('/search?q=%22gap+OR+NEAR(').status_code == 200
+    assert client.get('/search?q=gap&kind=users').status_code == 400
+
+
+# Recurring events aren't in events_fts; their series are matched on every word
+def test_event_search_lists_matching_series(client, add_series):
+    add_series('monthly', '2024-03-01', title='Nonfarm Payrolls', description='first Friday jobs report')
+    add_series('weekly', '2024-03-07', title='Jobless Claims')
+    body = client.get('/search?kind=events&q=jobs+report').get_data(as_text=True)
+    assert 'Nonfarm Payrolls' in body and 'Jobless Claims' not in body
+    assert 'Monthly on the first Friday' in body
+    assert '<mark>jobs</mark>' in body
+    assert 'Nonfarm Payrolls' not in client.get('/search?kind=events&q=jobs+weekly').get_data(as_text=True)
+    assert 'Nonfarm Payrolls' not in client.get('/search?kind=trades&q=jobs').get_data(as_text=True)
@@ -0,0 +1,70 @@
+import pytest
+
+from snapshots import read_snapshot, snapshot_lock, snapshot_path, update_snapshot
+
+pa = pytest.importorskip('pyarrow')
+
+
+def snapshot_rows(path, name='trades'):
+    table = read_snapshot(path, name)
+    return sorted(zip(table['id'].to_pylist(), table['account_pnl'].to_pylist()))
+
+
+def trade_rows(db, user_id=None):
+    sql = 'SELECT id, account_pnl FROM trades' + ('' if user_id is None else ' WHERE user_id = ?')
+    return sorted(tuple(row) for row in db.execute(sql, () if user_id is None else (user_id,)))
+
+
+def update(db, path, **options):
+    with snapshot_lock(path):
+        return update_snapshot(db, path, **options)
+
+
+def test_deltas_carry_changes_and_tombstones(db, add_trade, tmp_path):
+    path = snapshot_path(str(tmp_path / 'snapshots'))
+    first, second = add_trade(account_pnl=1.0), add_trade(account_pnl=-1.0)
+    assert update(db, path) == {'trades': 2, 'events': 0}
+
+    add_trade(account_pnl=2.5)
+    db.execute('UPDATE trades SET account_pnl = 4.0 WHERE id = ?', (first,))
+    db.execute('DELETE FROM trades WHERE id = ?', (second,))
+    db.commit()
+    assert update(db, path)['trades'] == 3
+    assert snapshot_rows(path) == trade_rows(db)
+    # Nothing changed: no new segment
+    assert update(db, path) == {'trades': 0, 'events': 0}
+
+    update(db, path, compact=True)
+    assert snapshot_rows(path) == trade_rows(db)
+    assert read_snapshot(path, 'trades').schema.field('date').type == pa.date32()
+
+
+# A trade moved to another user leaves the old owner's snapshot
+def test_user_snapshot_follows_ownership(db, add_trade, tmp_path):
+    path = snapshot_path(str(tmp_path / 'snapshots'), 1)
+    moved = add_trade()
+    add_trade()
+    update(db, path, user_id=1)
+    db.execute('UPDATE trades SET user_id = 2 WHERE id = ?', (moved,))
+    db.commit()
+    update(db, path, user_id=1)
+    assert snapshot_rows(path) == trade_rows(db, 1)
+
+
+def test_segments_are_merged_past_the_limit(db, add_trade, tmp_path):
+    path = snapshot_path(str(tmp_path / 'snapshots'))
+    for n in range(4):
+        add_trade(account_pnl=float(n))
+        update(db, path, max_segments=2)
+    segments = (tmp_path / 'snapshots' / 'all').glob('trades-*.arrow')
+    assert len(list(segments)) <= 2
+    assert snapshot_rows(path) == trade_rows(db)
+
+
+def test_snapshot_download(client, add_trade):
+    add_trade()
+    response = client.get('/export/snapshot/trades?format=arrow')
+    assert response.status_code == 200
+    table = pa.ipc.open_file(pa.py_buffer(response.get_data())).read_all()
+    assert table.num_rows == 1
+    assert client.get('/export/snapshot/trades?format=xlsx').status_code == 400
@@ -0,0 +1,183 @@
+import random
+
+import pytest
+
+from analytics import daily_pnl_drift, user_stats_drift
+from migrations import table_exists
+
+# Random trade and event writes, checked against a full recompute of each
+# table the triggers on trades and economic_events maintain
+USERS = (1, 2, 3)
+DAYS = ('2024-03-01', '2024-03-04', '2024-03-05', '2024-03-06', '2024-03-07')
+SCREENSHOTS = (None, 'a.png', 'b.png', 'c.png')
+TICKERS = ('SPY', 'QQQ', 'NVDA', 'TSLA')
+SEEDS = range(5)
+
+
+class Journal:
+    # Applies random operations and remembers, per (table, row, owner), the
+    # step at which it was last written by a committed transaction
+    def __init__(self, conn, rng):
+        self.conn = conn
+        self.rng = rng
+        self.step = 0
+        self.written = {}
+        self.pending = {}
+
+    def pnl(self):
+        return self.rng.choice((0.0, round(self.rng.uniform(-3, 3), 2), round(self.rng.uniform(-3, 3), 2)))
+
+    def pick(self, table):
+        row = self.conn.execute(f'SELECT id, user_id FROM {table} ORDER BY RANDOM() LIMIT 1').fetchone()
+        return (row['id'], row['user_id']) if row else (None, None)
+
+    def touch(self, table, row_id, *user_ids):
+        for user_id in user_ids:
+            self.pending[(table, row_id, user_id)] = self.step
+
+    def insert_trade(self):
+        user_id = self.rng.choice(USERS)
+        cursor = self.conn.execute('''
+            INSERT INTO trades (user_id, ticker, direction, date, outcome, close_reason, account_pnl, notes,
+                                screenshot_filename)
+            VALUES (?, ?, 'Long', ?, 'Win', 'TP', ?, ?, ?)
+        ''', (user_id, self.rng.choice(TICKERS), self.rng.choice(DAYS), self.pnl(),
+              self.rng.choice(('', 'followed the plan', 'chased the open')), self.rng.choice(SCREENSHOTS)))
+        self.touch('trades', cursor.lastrowid, user_id)
+
+    def update_trade(self):
+        trade_id, old_user = self.pick('trades')
+        if trade_id is None:
+            return
+        changes = {}
+        if self.rng.random() < 0.4:
+            changes['user_id'] = self.rng.choice(USERS)
+        if self.rng.random() < 0.5:
+            changes['date'] = self.rng.choice(DAYS)
+        if self.rng.random() < 0.6:
+            changes['account_pnl'] = self.pnl()
+        if self.rng.random() < 0.4:
+            changes['screenshot_filename'] = self.rng.choice(SCREENSHOTS)
+        if self.rng.random() < 0.3 or not changes:
+            changes['notes'] = self.rng.choice(('', 'late entry', 'sized down'))
+        assignments = ', '.join(f'{column} = ?' for column in changes)
+        self.conn.execute(f'UPDATE trades SET {assignments} WHERE id = ?', (*changes.values(), trade_id))
+        self.touch('trades', trade_id, old_user, changes.get('user_id', old_user))
+
+    def delete_trade(self):
+        trade_id, user_id = self.pick('trades')
+        if trade_id is not None:
+            self.conn.execute('DELETE FROM trades WHERE id = ?', (trade_id,))
+            self.touch('trades', trade_id, user_id)
+
+    def insert_event(self):
+        user_id = self.rng.choice(USERS)
+        cursor = self.conn.execute('''
+            INSERT INTO economic_events (user_id, event_type, event_date, title, description)
+            VALUES (?, 'FOMC', ?, 'FOMC Meeting', ?)
+        ''', (user_id, self.rng.choice(DAYS), self.rng.choice(('', 'rate decision'))))
+        self.touch('economic_events', cursor.lastrowid, user_id)
+
+    def update_event(self):
+        event_id, old_user = self.pick('economic_events')
+        if event_id is None:
+            return
+        new_user = self.rng.choice(USERS) if self.rng.random() < 0.4 else old_user
+        self.conn.execute('UPDATE economic_events SET user_id = ?, event_date = ?, description = ? WHERE id = ?',
+                          (new_user, self.rng.choice(DAYS), self.rng.choice(('', 'press conference')), event_id))
+        self.touch('economic_events', event_id, old_user, new_user)
+
+    def delete_event(self):
+        event_id, user_id = self.pick('economic_events')
+        if event_id is not None:
+            self.conn.execute('DELETE FROM economic_events WHERE id = ?', (event_id,))
+            self.touch('economic_events', event_id, user_id)
+
+    # One transaction of a few operations; about one in six is rolled back
+    # and must leave no trace in any derived table
+    def transaction(self):
+        operations = (self.insert_trade, self.insert_trade, self.update_trade, self.update_trade,
+                      self.delete_trade, self.insert_event, self.update_event, self.delete_event)
+        for _ in range(self.rng.randint(1, 4)):
+            self.step += 1
+            self.rng.choice(operations)()
+        if self.rng.random() < 1 / 6:
+            self.conn.rollback()
+        else:
+            self.conn.commit()
+            self.written.update(self.pending)
+        self.pending = {}
+
+
+# Run 300 random transactions, calling check(journal) every 50 and at the end
+def run_journal(conn, seed, check, transactions=300):
+    journal = Journal(conn, random.Random(seed))
+    for n in range(transactions):
+        journal.transaction()
+        if n % 50 == 49:
+            check(journal)
+    check(journal)
+    return journal
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_user_stats_match_a_recompute(db, seed):
+    def check(journal):
+        assert user_stats_drift(journal.conn) == []
+
+    run_journal(db, seed, check)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_screenshot_ref_counts_match_references(db, seed):
+    db.executemany('INSERT INTO screenshot_blobs (filename, size_bytes) VALUES (?, 100)',
+                   [(filename,) for filename in SCREENSHOTS if filename])
+    db.commit()
+
+    def check(journal):
+        refs = dict(db.execute('''
+            SELECT screenshot_filename, COUNT(*) FROM trades
+            WHERE screenshot_filename IS NOT NULL GROUP BY screenshot_filename
+        ''').fetchall())
+        blobs = dict(db.execute('SELECT filename, ref_count FROM screenshot_blobs').fetchall())
+        assert blobs == {filename: refs.get(filename, 0) for filename in SCREENSHOTS if filename}
+
+    run_journal(db, seed, check)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_daily_pnl_matches_a_recompute(db, seed):
+    def check(journal):
+        assert daily_pnl_drift(journal.conn) == []
+        # Days whose last trade moved away are deleted, not left at zero
+        assert db.execute('SELECT COUNT(*) FROM daily_pnl WHERE trade_count <= 0').fetchone()[0] == 0
+
+    run_journal(db, seed, check)
+
+
+# With rank = 1, FTS5's integrity-check compares the index against the
+# content tables, so any write the triggers missed shows up as corruption
+@pytest.mark.parametrize('seed', SEEDS)
+def test_search_index_matches_its_content(db, seed):
+    if not table_exists(db, 'trades_fts'):
+        pytest.skip('SQLite was built without FTS5')
+
+    def check(journal):
+        db.execute("INSERT INTO trades_fts (trades_fts, rank) VALUES ('integrity-check', 1)")
+        db.execute("INSERT INTO events_fts (events_fts, rank) VALUES ('integrity-check', 1)")
+
+    run_journal(db, seed, check)
+
+
+# change_log keeps one row per (table, row, owner) at the seq of its last
+# write, so in seq order it lists exactly what committed transactions wrote,
+# least recently written first
+@pytest.mark.parametrize('seed', SEEDS)
+def test_change_log_follows_committed_writes(db, seed):
+    def check(journal):
+        logged = [tuple(row) for row in db.execute('SELECT table_name, row_id, user_id FROM change_log ORDER BY seq')]
+        assert sorted(logged) == sorted(journal.written)
+        steps = [journal.written[key] for key in logged]
+        assert steps == sorted(steps)
+
+    run_journal(db, seed, check)
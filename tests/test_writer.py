@@ -0,0 +1,96 @@
+import threading
+
+import pytest
+
+from metrics import InstrumentedConnection
+from writer import WriteQueue
+
+
+@pytest.fixture
+def database(db):
+    return db.execute('PRAGMA database_list').fetchone()['file']
+
+
+@pytest.fixture
+def write_queue(database):
+    queue = WriteQueue(database, factory=InstrumentedConnection)
+    yield queue
+    queue.shutdown()
+
+
+def insert_trade(conn, pnl):
+    return conn.execute('''
+        INSERT INTO trades (user_id, ticker, direction, date, outcome, close_reason, account_pnl)
+        VALUES (1, 'SPY', 'Long', '2024-03-01', 'Win', 'TP', ?)
+    ''', (pnl,)).lastrowid
+
+
+def insert_then_fail(conn, pnl):
+    insert_trade(conn, pnl)
+    raise ValueError('rejected')
+
+
+def stored_pnl(db):
+    db.rollback()
+    return [row[0] for row in db.execute('SELECT account_pnl FROM trades ORDER BY id')]
+
+
+# Hold the writer on a first operation so whatever is submitted next queues
+# up behind it; returns the function that lets it go
+def hold_writer(queue):
+    running, release = threading.Event(), threading.Event()
+
+    def block(conn):
+        running.set()
+        release.wait(5)
+
+    blocker = queue.submit(block)
+    running.wait(5)
+
+    def let_go():
+        release.set()
+        blocker.result(5)
+    return let_go
+
+
+def test_failed_operation_does_not_undo_its_batch(db, write_queue):
+    let_go = hold_writer(write_queue)
+    futures = [write_queue.submit(insert_trade, 1.0), write_queue.submit(insert_then_fail, 2.0),
+               write_queue.submit(insert_trade, 3.0)]
+    let_go()
+
+    assert futures[0].result(5) and futures[2].result(5)
+    with pytest.raises(ValueError):
+        futures[1].result(5)
+    assert stored_pnl(db) == [1.0, 3.0]
+    stats = write_queue.stats()
+    assert (stats['committed'], stats['failed']) == (3, 1)
+    assert stats['largest_batch'] == 3
+
+
+def test_batches_stop_at_batch_size(db, database):
+    queue = WriteQueue(database, batch_size=2)
+    try:
+        let_go = hold_writer(queue)
+        futures = [queue.submit(insert_trade, float(n)) for n in range(5)]
+        let_go()
+        for future in futures:
+            future.result(5)
+        stats = queue.stats()
+        assert stats['largest_batch'] == 2
+        assert stats['batches'] == 4  # the blocker, then 2 + 2 + 1
+    finally:
+        queue.shutdown()
+    assert stored_pnl(db) == [0.0, 1.0, 2.0, 3.0, 4.0]
+
+
+# Shutdown lets everything already queued finish, and the next write starts
+# a new writer thread
+def test_shutdown_drains_then_restarts(db, write_queue):
+    let_go = hold_writer(write_queue)
+    futures = [write_queue.submit(insert_trade, float(n)) for n in range(3)]
+    threading.Timer(0.05, let_go).start()
+    write_queue.shutdown()
+    assert all(future.done() for future in futures)
+    write_queue.execute(insert_trade, 9.0)
+    assert stored_pnl(db) == [0.0, 1.0, 2.0, 9.0]
@@ -0,0 +1,176 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from database import connect
+from metrics import record_sql, start_sql_tally, sql_tally
+
+logger = logging.getLogger(__name__)
+
+WRITE_BATCH_SIZE = 64
+WRITE_QUEUE_SIZE = 1000
+WRITE_TIMEOUT = 30
+
+
+class WriteQueue:
+    # Funnels a process's writes through one thread and connection.  Request
+    # threads queue an operation, fn(conn, *args), and wait for its result;
+    # the writer applies everything that queued up meanwhile in a single
+    # transaction, so concurrent submissions share one lock acquisition and
+    # one commit instead of fighting over SQLite's write lock.  Each operation
+    # runs in its own savepoint: one that raises is rolled back and gets the
+    # exception without failing the rest of its batch.  Operations must not
+    # commit themselves.  Reads don't go through here; with WAL they run on
+    # pooled connections alongside the writer.  With an instrumented connection
+    # factory, the SQL time of each operation (plus its batch's BEGIN and
+    # COMMIT) is added to the request that waited on it.
+
+    def __init__(self, database, batch_size=WRITE_BATCH_SIZE, maxsize=WRITE_QUEUE_SIZE, factory=sqlite3.Connection):
+        self.database = database
+        self.factory = factory
+        self.batch_size = batch_size
+        self.maxsize = maxsize
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {'submitted': 0, 'committed': 0, 'failed': 0, 'batches': 0,
+                       'max_depth': 0, 'largest_batch': 0, 'wait_seconds': 0.0, 'commit_seconds': 0.0}
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, fn, *args):
+        self._ensure_started()
+        future = Future()
+        # Blocks once maxsize writes are waiting, pushing back on the requests
+        # instead of letting the backlog grow without bound
+        self._queue.put((fn, args, future, time.perf_counter()))
+        with self._lock:
+            self._stats['submitted'] += 1
+            self._stats['max_depth'] = max(self._stats['max_depth'], self._queue.qsize())
+        return future
+
+    # Queue an operation and wait for what it returned (or raise what it raised)
+    def execute(self, fn, *args, timeout=WRITE_TIMEOUT):
+        future = self.submit(fn, *args)
+        try:
+            return future.result(timeout)
+        finally:
+            sql = getattr(future, 'sql', None)
+            if sql is not None:
+                record_sql(*sql)
+
+    def _run(self):
+        conn = connect(self.database, self.factory)
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                batch = [item]
+                stop = False
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                        break
+                    batch.append(item)
+                self._apply(conn, batch)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _apply(self, conn, batch):
+        started = time.perf_counter()
+        start_sql_tally()
+        results = []
+        op_sql = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for fn, args, future, queued in batch:
+                before = sql_tally()
+                conn.execute('SAVEPOINT write_op')
+                try:
+                    results.append((future, fn(conn, *args), None))
+                    conn.execute('RELEASE write_op')
+                except Exception as e:
+                    conn.execute('ROLLBACK TO write_op')
+                    conn.execute('RELEASE write_op')
+                    results.append((future, None, e))
+                after = sql_tally()
+                op_sql.append((after[0] - before[0], after[1] - before[1]))
+            # commit() doesn't go through a cursor, so time it here
+            committing = time.perf_counter()
+            try:
+                conn.commit()
+            finally:
+                record_sql(time.perf_counter() - committing, 1)
+        except Exception as e:
+            # Couldn't take the lock or commit: nothing in the batch was written
+            logger.error('Write batch of %d failed: %s', len(batch), e)
+            if conn.in_transaction:
+                conn.rollback()
+            results = [(future, None, e) for fn, args, future, queued in batch]
+            op_sql = []
+
+        # Every operation waited on the batch's BEGIN and COMMIT, so each
+        # request is charged for them on top of its own statements
+        total = sql_tally()
+        shared = (total[0] - sum(s for s, n in op_sql), total[1] - sum(n for s, n in op_sql))
+        for (future, result, error), (seconds, statements) in zip(results, op_sql or [(0.0, 0)] * len(results)):
+            future.sql = (seconds + shared[0], statements + shared[1])
+
+        finished = time.perf_counter()
+        failed = sum(1 for future, result, error in results if error is not None)
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['committed'] += len(results) - failed
+            self._stats['failed'] += failed
+            self._stats['largest_batch'] = max(self._stats['largest_batch'], len(batch))
+            self._stats['wait_seconds'] += sum(finished - queued for fn, args, future, queued in batch)
+            self._stats['commit_seconds'] += finished - started
+
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            if wait:
+                thread.join()
+
+    # Forget a writer thread inherited across a fork; the child starts its own
+    def reset(self, database=None):
+        with self._lock:
+            self._thread = None
+            self._queue = queue.Queue(maxsize=self.maxsize)
+        if database is not None:
+            self.database = database
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['depth'] = self._queue.qsize()
+        stats['batch_size'] = self.batch_size
+        done = stats['committed'] + stats['failed']
+        stats['avg_batch'] = round(done / stats['batches'], 2) if stats['batches'] > 0 else 0
+        stats['avg_wait_ms'] = round(stats.pop('wait_seconds') / done * 1000, 2) if done > 0 else 0
+        commit_seconds = stats.pop('commit_seconds')
+        stats['avg_commit_ms'] = round(commit_seconds / stats['batches'] * 1000, 2) if stats['batches'] > 0 else 0
+        stats['writes_per_second'] = round(done / commit_seconds, 1) if commit_seconds > 0 else 0
+        return stats